@@ -0,0 +1,185 @@
+"""
+Admission control for the API
+Bounds how much work the server takes on at once. A request either gets a
+slot, waits briefly in a short FIFO queue, or is turned away straight away
+with a Retry-After estimate, so that under overload the admitted requests
+still finish in time instead of every request slowing down until it times
+out. A client deadline (X-Request-Timeout) travels with the request, and
+work whose deadline has passed is dropped before it reaches the LLM.
+"""
+
+import asyncio
+import contextlib
+import math
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional
+
+# Absolute time.monotonic() deadline of the request being served, if any
+request_deadline = ContextVar("request_deadline", default=None)
+
+MAX_AGENT_CALLS = int(os.getenv("ADMISSION_MAX_AGENT_CALLS", "64"))
+AGENT_CALL_QUEUE = int(os.getenv("ADMISSION_AGENT_QUEUE", "64"))
+MAX_WORKFLOWS = int(os.getenv("ADMISSION_MAX_WORKFLOWS", "8"))
+WORKFLOW_QUEUE = int(os.getenv("ADMISSION_WORKFLOW_QUEUE", "16"))
+MAX_QUEUE_WAIT = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT", "5"))
+
+# Weight of the newest sample in the average service time
+SERVICE_TIME_ALPHA = 0.2
+MAX_RETRY_AFTER = 120
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed; carries a Retry-After estimate in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when work is about to start after the request's deadline"""
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one"""
+    deadline = request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def use_deadline(timeout: Optional[float]):
+    """Set the request deadline `timeout` seconds from now, keeping an earlier one"""
+    if timeout is None:
+        yield
+        return
+    deadline = time.monotonic() + timeout
+    current = request_deadline.get()
+    token = request_deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+class AdmissionController:
+    """At most `max_in_flight` holders of a slot, with up to `max_queued` waiting in FIFO order"""
+
+    def __init__(self, name: str, max_in_flight: int, max_queued: int = 0,
+                 max_queue_wait: float = MAX_QUEUE_WAIT):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_queue_wait = max_queue_wait
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.service_time: Optional[float] = None
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.completed = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Whole seconds until a slot is likely to be free for a new request"""
+        if self.service_time is None or not self.max_in_flight:
+            return 1
+        backlog = (self.queued + 1) / self.max_in_flight
+        return min(max(math.ceil(backlog * self.service_time), 1), MAX_RETRY_AFTER)
+
+    def expected_wait(self) -> float:
+        """Rough seconds a request queued now would wait for its slot"""
+        if self.service_time is None or not self.max_in_flight:
+            return 0.0
+        return self.queued / self.max_in_flight * self.service_time
+
+    def _shed(self, reason: str) -> OverloadedError:
+        self.rejected += 1
+        return OverloadedError(f"Server busy: {reason}", self.retry_after())
+
+    def check(self):
+        """Shed now if a request arriving this moment could neither start nor queue"""
+        if self.max_in_flight and self.in_flight >= self.max_in_flight and self.queued >= self.max_queued:
+            raise self._shed(f"{self.in_flight} {self.name} running and {self.queued} queued")
+
+    async def acquire(self):
+        if not self.max_in_flight or (self.in_flight < self.max_in_flight and not self._waiters):
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.max_queued:
+            raise self._shed(f"{self.in_flight} {self.name} running and {self.queued} queued")
+        remaining = remaining_time()
+        if remaining is not None and remaining <= self.expected_wait():
+            raise self._shed(f"{self.name} would not start before the request deadline")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        wait = self.max_queue_wait if remaining is None else min(self.max_queue_wait, remaining)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), wait)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self._waiters.remove(waiter)
+                raise self._shed(f"no {self.name} slot within {wait:.1f}s")
+        except asyncio.CancelledError:
+            if waiter.done():
+                # The slot was handed over just as we were cancelled
+                self._hand_on()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        self.admitted += 1
+        # The deadline may have passed while waiting; hand the slot on unused
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            self.expired += 1
+            self._hand_on()
+            raise DeadlineExceededError(f"Request deadline passed while queued for a {self.name} slot")
+
+    def release(self, elapsed: Optional[float] = None):
+        """Give back a slot from acquire(), recording how long it was held"""
+        if elapsed is not None:
+            self.service_time = elapsed if self.service_time is None else (
+                SERVICE_TIME_ALPHA * elapsed + (1 - SERVICE_TIME_ALPHA) * self.service_time
+            )
+        self.completed += 1
+        self._hand_on()
+
+    def _hand_on(self):
+        # Pass the slot straight to the oldest waiter so in_flight never dips
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the body of the block, recording how long it took"""
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "service_time_seconds": round(self.service_time, 4) if self.service_time is not None else None,
+            "retry_after_seconds": self.retry_after(),
+        }
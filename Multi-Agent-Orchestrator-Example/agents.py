@@ -1,105 +1,101 @@
 """
-Cricket Team Agents using Alith framework
+Cricket Team Agents
+Each agent only holds its model and preamble; completions go through the
+shared LLM layer in llm.py. Agents are built on first use (LazyAgents), so
+importing this module and starting a worker stay cheap.
 """
 
-from alith import Agent
-import asyncio
-from dotenv import load_dotenv
 import os
-load_dotenv()
-
-Groq_key=os.getenv("GROQ_API_KEY")
-class HeadCoachAgent:
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from llm import llm_executor
+from routing import AGENT_ENDPOINTS, AGENT_MODELS, check_endpoint
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+
+class BaseAgent:
+    """Common plumbing for agents: a model, a preamble and the shared LLM client"""
+    model = DEFAULT_MODEL
+    # Named endpoint from LLM_ENDPOINTS; None is LLM_BASE_URL
+    endpoint: Optional[str] = None
+    agent_id: Optional[str] = None
+    preamble = ""
+
+    def __init__(self, agent_id: Optional[str] = None, model: Optional[str] = None,
+                 endpoint: Optional[str] = None):
+        """Model and endpoint: the arguments, else LLM_AGENT_MODELS/LLM_AGENT_ENDPOINTS for agent_id"""
+        self.agent_id = agent_id
+        self.model = model or AGENT_MODELS.get(agent_id) or DEFAULT_MODEL
+        self.endpoint = endpoint or AGENT_ENDPOINTS.get(agent_id)
+        check_endpoint(self.endpoint)
+
+    async def complete(self, prompt: str) -> str:
+        return await llm_executor.prompt(self, prompt)
+
+class HeadCoachAgent(BaseAgent):
     """Plans strategies, analyzes opponents, guides the team"""
-    def __init__(self):
-        self.agent = Agent(
-            model="llama-3.3-70b-versatile",
-            base_url="https://api.groq.com/openai/v1",
-            api_key=Groq_key,
-            preamble="""You are the Head Coach of a cricket team. Your role is to:
+    preamble = """You are the Head Coach of a cricket team. Your role is to:
             - Plan strategies for matches
             - Analyze opponent teams
             - Guide and motivate players
             - Provide comprehensive game plans"""
-        )
 
     async def plan_strategy(self, match_info: str) -> str:
         prompt = f"Plan a strategy for this match: {match_info}"
-        return self.agent.prompt(prompt)
+        return await self.complete(prompt)
 
-class BattingCoachAgent:
+class BattingCoachAgent(BaseAgent):
     """Improves batting performance and provides training routines"""
-    def __init__(self):
-        self.agent = Agent(
-            model="llama-3.3-70b-versatile",
-            base_url="https://api.groq.com/openai/v1",
-            api_key=Groq_key,
-            preamble="""You are the Batting Coach. Your role is to:
+    preamble = """You are the Batting Coach. Your role is to:
             - Improve batting techniques
             - Suggest training drills
             - Analyze batting weaknesses and strengths"""
-        )
 
     async def train_batting(self, player_name: str) -> str:
         prompt = f"Provide batting training and improvement tips for: {player_name}"
-        return self.agent.prompt(prompt)
+        return await self.complete(prompt)
 
 
-class BowlingCoachAgent:
+class BowlingCoachAgent(BaseAgent):
     """Analyzes bowling performance and provides coaching"""
-    def __init__(self):
-        self.agent = Agent(
-            model="llama-3.3-70b-versatile",
-            base_url="https://api.groq.com/openai/v1",
-            api_key=Groq_key,
-            preamble="""You are the Bowling Coach. Your role is to:
+    preamble = """You are the Bowling Coach. Your role is to:
             - Analyze bowling performance
             - Suggest improvement drills
             - Develop bowling strategies"""
-        )
 
     async def train_bowling(self, player_name: str) -> str:
         prompt = f"Provide bowling training and improvement tips for: {player_name}"
-        return self.agent.prompt(prompt)
+        return await self.complete(prompt)
 
 
-class HeadPhysioAgent:
+class HeadPhysioAgent(BaseAgent):
     """Monitors fitness, recovery and injury prevention"""
-    def __init__(self):
-        self.agent = Agent(
-            model="llama-3.3-70b-versatile",
-            base_url="https://api.groq.com/openai/v1",
-            api_key=Groq_key,
-            preamble="""You are the Head Physio. Your role is to:
+    preamble = """You are the Head Physio. Your role is to:
             - Assess player fitness
             - Suggest injury prevention and recovery plans
             - Monitor health status of players"""
-        )
 
     async def provide_fitness_plan(self, player_name: str) -> str:
         prompt = f"Provide fitness, recovery, and injury prevention plan for: {player_name}"
-        return self.agent.prompt(prompt)
+        return await self.complete(prompt)
 
-class PlayerAgent:
+class PlayerAgent(BaseAgent):
     """Executes skills and reports performance"""
-    def __init__(self):
-        self.agent = Agent(
-            model="llama-3.3-70b-versatile",
-            base_url="https://api.groq.com/openai/v1",
-            api_key=Groq_key,
-            preamble="""You are a cricket player. Your role is to:
+    preamble = """You are a cricket player. Your role is to:
             - Execute batting, bowling, and fielding skills
             - Report personal performance
             - Provide feedback on training"""
-        )
 
     async def report_performance(self, player_name: str) -> str:
         prompt = f"Report performance, improvements, and feedback for: {player_name}"
-        return self.agent.prompt(prompt)
+        return await self.complete(prompt)
 
-class GenericAgent:
+class GenericAgent(BaseAgent):
     """Generic agent for custom user-created agents"""
-    def __init__(self, name: str, role: str, description: str, capabilities: list):
+    def __init__(self, name: str, role: str, description: str, capabilities: list,
+                 agent_id: Optional[str] = None, model: Optional[str] = None, endpoint: Optional[str] = None):
+        super().__init__(agent_id, model, endpoint)
         self.name = name
         self.role = role
         self.description = description
@@ -107,7 +103,7 @@ class GenericAgent:
         
         # Create preamble from agent details
         capabilities_text = "\n".join([f"- {cap}" for cap in capabilities])
-        preamble = f"""You are {name}, a {role}. 
+        self.preamble = f"""You are {name}, a {role}. 
         
 Description: {description}
 
@@ -115,17 +111,10 @@ Your capabilities include:
 {capabilities_text}
 
 Respond to user queries based on your role and capabilities."""
-        
-        self.agent = Agent(
-            model="llama-3.3-70b-versatile",
-            base_url="https://api.groq.com/openai/v1",
-            api_key=Groq_key,
-            preamble=preamble
-        )
     
     async def execute(self, input_data: str) -> str:
         """Generic execution method for any input"""
-        return self.agent.prompt(input_data)
+        return await self.complete(input_data)
 
 # Registry for orchestrator
 AGENT_REGISTRY = {
@@ -135,3 +124,58 @@ AGENT_REGISTRY = {
     "head_physio": HeadPhysioAgent,
     "player": PlayerAgent
 }
+
+class LazyAgents:
+    """Agent instances by type, each built through AGENT_REGISTRY on first use.
+
+    Every type in the registry counts as present whether or not it has been
+    built yet. Building happens once per type under a lock, so threads and
+    tasks racing for the same agent share one instance. A failed build is
+    raised to that caller and tried again on the next use.
+    """
+
+    def __init__(self, registry: Optional[Dict[str, type]] = None):
+        self.registry = AGENT_REGISTRY if registry is None else registry
+        self._agents: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, agent_type: str) -> bool:
+        return agent_type in self._agents or agent_type in self.registry
+
+    def __getitem__(self, agent_type: str) -> Any:
+        agent = self._agents.get(agent_type)
+        if agent is not None:
+            return agent
+        if agent_type not in self.registry:
+            raise KeyError(agent_type)
+        with self._lock:
+            agent = self._agents.get(agent_type)
+            if agent is None:
+                agent = self._agents[agent_type] = self.registry[agent_type](agent_type)
+        return agent
+
+    def __setitem__(self, agent_type: str, agent: Any):
+        with self._lock:
+            self._agents[agent_type] = agent
+
+    def get(self, agent_type: str, default: Any = None) -> Any:
+        return self[agent_type] if agent_type in self else default
+
+    def keys(self) -> List[str]:
+        return list(self.registry) + [agent_type for agent_type in self._agents if agent_type not in self.registry]
+
+    def loaded(self) -> List[str]:
+        """Types built so far"""
+        return list(self._agents)
+
+    def prewarm(self, agent_types: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Build agents ahead of their first use; returns the error for each one that failed"""
+        failures = {}
+        for agent_type in (self.registry if agent_types is None else agent_types):
+            try:
+                self[agent_type]
+            except KeyError:
+                failures[agent_type] = "Unknown agent type"
+            except Exception as e:
+                failures[agent_type] = f"{type(e).__name__}: {e}"
+        return failures
@@ -2,13 +2,35 @@
 FastAPI Backend for Cricket Team Multi-Agent System
 """
 
-from fastapi import FastAPI, HTTPException
+from dotenv import load_dotenv
+
+# Every module reads its settings on import, so .env is loaded before any of them
+load_dotenv()
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, FrozenSet, Optional, List, Tuple
 import asyncio
-from orchestrator import MultiAgentOrchestrator, WorkflowType
+import json
+import os
+from datetime import datetime
+from orchestrator import MultiAgentOrchestrator, TaskStatus, WorkflowType
+from policy import TaskPolicy
+from admission import (AGENT_CALL_QUEUE, MAX_AGENT_CALLS, MAX_WORKFLOWS, WORKFLOW_QUEUE, AdmissionController,
+                       DeadlineExceededError, OverloadedError, remaining_time, use_deadline)
 from agents import GenericAgent
+from catalog import BASE_AGENT_IDS, AgentCatalog, etag_matches
+from llm import llm_executor, use_token_sink
+from cache import cache_mode_for, use_cache_mode
+from jobs import QueueFullError, WorkflowJobRunner
+from memo import create_result_cache
+from metrics import registry
+from responses import json_response
+from routing import ENDPOINTS, route_mode_for, use_route_mode
+from scheduler import Priority, lower_priority, use_call_class
+from store import create_agent_store, create_store
 
 app = FastAPI(title="Cricket Team Multi-Agent API")
 
@@ -22,20 +44,112 @@ app.add_middleware(
 )
 
 # Initialize orchestrator
-orchestrator = MultiAgentOrchestrator()
+max_concurrency = os.getenv("ORCHESTRATOR_MAX_CONCURRENCY")
+orchestrator = MultiAgentOrchestrator(
+    max_concurrency=int(max_concurrency) if max_concurrency else None,
+    store=create_store(),
+    result_cache=create_result_cache()
+)
+
+# Admission control: work beyond these limits waits briefly, then is turned away with 503
+agent_admission = AdmissionController("agent calls", MAX_AGENT_CALLS, AGENT_CALL_QUEUE)
+workflow_admission = AdmissionController("workflows", MAX_WORKFLOWS, WORKFLOW_QUEUE)
+
+# Background runner for submitted workflows; its runs hold workflow slots too
+job_runner = WorkflowJobRunner(orchestrator, admission=workflow_admission)
+
+# Scheduler state, read at scrape time
+registry.callback("agent_calls_in_flight", "Distinct agent calls in flight",
+                  lambda: orchestrator.inflight.in_flight)
+registry.callback("agent_calls_coalesced_total", "Agent calls that joined an identical call in flight",
+                  lambda: orchestrator.inflight.coalesced, kind="counter")
+registry.callback("workflow_jobs_queued", "Submitted workflows waiting for a worker",
+                  lambda: job_runner.stats()["queued"])
+registry.callback("workflow_jobs_running", "Submitted workflows being executed",
+                  lambda: job_runner.stats()["running"])
+
+# Admission state, read at scrape time
+for _prefix, _controller in (("admission_agent_calls", agent_admission), ("admission_workflows", workflow_admission)):
+    registry.callback(f"{_prefix}_in_flight", f"Admitted {_controller.name} holding a slot",
+                      lambda c=_controller: c.in_flight)
+    registry.callback(f"{_prefix}_queued", f"Requests waiting for a slot for {_controller.name}",
+                      lambda c=_controller: c.queued)
+    registry.callback(f"{_prefix}_rejected_total", f"Requests for {_controller.name} shed with 503",
+                      lambda c=_controller: c.rejected, kind="counter")
+    registry.callback(f"{_prefix}_expired_total", f"Requests for {_controller.name} whose deadline passed in the queue",
+                      lambda c=_controller: c.expired, kind="counter")
 
-# Store custom agents
-custom_agents = {}
-custom_agents_info = []
+# Custom agent definitions, shared by every worker when the store is SQLite
+agent_store = create_agent_store()
+agent_catalog = AgentCatalog(agent_store)
+
+# GenericAgent instances this worker built, with the definition each came from
+custom_agents: Dict[str, Tuple[Dict[str, Any], GenericAgent]] = {}
+
+def get_custom_agent(agent_id: str) -> Optional[GenericAgent]:
+    """This worker's instance of a custom agent, rebuilt when its definition changed"""
+    definition = agent_store.get(agent_id)
+    if definition is None:
+        custom_agents.pop(agent_id, None)
+        return None
+    cached = custom_agents.get(agent_id)
+    if cached is None or cached[0] != definition:
+        agent = GenericAgent(
+            name=definition["name"],
+            role=definition["role"],
+            description=definition["description"],
+            capabilities=definition["capabilities"],
+            agent_id=agent_id,
+            model=definition.get("model"),
+            endpoint=definition.get("endpoint")
+        )
+        cached = custom_agents[agent_id] = (definition, agent)
+    return cached[1]
 
 # Request models
 class AgentRequest(BaseModel):
     agent_type: str
     input_data: str
+    timeout: Optional[float] = None
+    bypass_cache: bool = False
+    refresh_cache: bool = False
+    # Skip the model router and use the agent's own model
+    large_model: bool = False
 
 class WorkflowRequest(BaseModel):
     match_info: str
     player_name: Optional[str] = "Team Players"
+    # Prepare each of these players; overrides player_name
+    players: Optional[List[str]] = None
+    workflow_type: Optional[str] = WorkflowType.SEQUENTIAL.value
+    max_concurrency: Optional[int] = None
+    # Per-task timeout/retry/hedging; unset values use the server defaults
+    task_timeout: Optional[float] = None
+    max_retries: Optional[int] = None
+    hedge: Optional[bool] = None
+    # Recompute every task instead of reusing results of identical earlier tasks
+    force: bool = False
+    bypass_cache: bool = False
+    refresh_cache: bool = False
+    large_model: bool = False
+
+    def cache_mode(self):
+        return cache_mode_for(self.bypass_cache, self.refresh_cache or self.force)
+
+    def route_mode(self):
+        return route_mode_for(self.large_model)
+
+class BatchItem(BaseModel):
+    agent_type: str
+    input_data: str
+
+class BatchAgentRequest(BaseModel):
+    items: List[BatchItem]
+    max_concurrency: Optional[int] = None
+    timeout: Optional[float] = None
+    bypass_cache: bool = False
+    refresh_cache: bool = False
+    large_model: bool = False
 
 class CustomAgentRequest(BaseModel):
     id: str
@@ -45,11 +159,112 @@ class CustomAgentRequest(BaseModel):
     icon: str
     color: str
     capabilities: List[str]
+    # Model and named endpoint (from LLM_ENDPOINTS); unset uses LLM_AGENT_MODELS or LLM_MODEL
+    model: Optional[str] = None
+    endpoint: Optional[str] = None
+
+# Agents are built on first use; with AGENT_PREWARM=1 they are also built in the background after startup
+AGENT_PREWARM = os.getenv("AGENT_PREWARM", "1") == "1"
+prewarm_task: Optional[asyncio.Future] = None
 
-# Initialize agents on startup
+async def prewarm():
+    """Build the agents and load the LLM client so the first request doesn't wait for them"""
+    failures = await asyncio.get_running_loop().run_in_executor(None, orchestrator.agents.prewarm)
+    for agent_type, error in failures.items():
+        print(f"❌ Could not initialize {agent_type} agent: {error}")
+    await llm_executor.prewarm()
+
+# Start serving right away; pre-warming doesn't hold up startup
 @app.on_event("startup")
 async def startup_event():
-    orchestrator.initialize_agents()
+    global prewarm_task
+    if AGENT_PREWARM:
+        prewarm_task = asyncio.ensure_future(prewarm())
+    await job_runner.start()
+
+# Stop background workflows and release LLM worker threads on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    if prewarm_task is not None and not prewarm_task.done():
+        prewarm_task.cancel()
+    await job_runner.stop()
+    await llm_executor.aclose()
+    if orchestrator.result_cache is not None:
+        orchestrator.result_cache.close()
+
+# Shed requests: tell the client when capacity is likely to be free again
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    return JSONResponse({"detail": str(exc)}, status_code=503,
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededError):
+    return JSONResponse({"detail": str(exc)}, status_code=504)
+
+def request_timeout(http_request: Request) -> Optional[float]:
+    """Seconds the client will wait for this request, from the X-Request-Timeout header"""
+    value = http_request.headers.get("x-request-timeout")
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout must be a number of seconds")
+    if timeout <= 0:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout must be positive")
+    return timeout
+
+def use_request_class(http_request: Request, default: Priority, agent_id: Optional[str] = None):
+    """Schedule the request's LLM calls under its class and tenant.
+
+    X-Priority may lower the class but never raise it. The tenant is
+    X-Tenant-ID, else the custom agent being called, else the client address.
+    """
+    priority = lower_priority(http_request.headers.get("x-priority"), default)
+    tenant = http_request.headers.get("x-tenant-id") or agent_id or \
+        (http_request.client.host if http_request.client else None)
+    return use_call_class(priority, tenant)
+
+def custom_agent_id(agent_type: str) -> Optional[str]:
+    return None if agent_type in BASE_AGENT_IDS else agent_type
+
+def effective_timeout(timeout: Optional[float]) -> Optional[float]:
+    """The per-call timeout, shortened to what is left of the request deadline"""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    remaining = round(max(remaining, 0.001), 3)
+    return remaining if timeout is None else min(timeout, remaining)
+
+def release_when_done(controller: AdmissionController, future: asyncio.Future):
+    """Give the admission slot back once a background call finishes"""
+    start = asyncio.get_running_loop().time()
+    future.add_done_callback(lambda _: controller.release(asyncio.get_running_loop().time() - start))
+
+# How often to check whether the client is still waiting for a response
+DISCONNECT_POLL_INTERVAL = 0.5
+
+async def cancel_on_disconnect(http_request: Request, coro, timeout: Optional[float] = None):
+    """Await coro, cancelling it if the client disconnects or the timeout expires"""
+    task = asyncio.ensure_future(coro)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout else None
+    try:
+        while True:
+            wait = DISCONNECT_POLL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - loop.time(), 0))
+            done, _ = await asyncio.wait({task}, timeout=wait)
+            if done:
+                return task.result()
+            if deadline is not None and loop.time() >= deadline:
+                raise HTTPException(status_code=504, detail=f"Agent call timed out after {timeout}s")
+            if await http_request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
 
 # Health check
 @app.get("/")
@@ -59,19 +274,13 @@ async def root():
 # Add custom agent
 @app.post("/api/agents/custom")
 async def add_custom_agent(agent_request: CustomAgentRequest):
+    if agent_request.id in BASE_AGENT_IDS:
+        raise HTTPException(status_code=409, detail=f"Agent {agent_request.id} is a built-in agent")
+    # Only endpoints the server was configured with, so calls can't be sent elsewhere with our API key
+    if agent_request.endpoint is not None and agent_request.endpoint not in ENDPOINTS:
+        raise HTTPException(status_code=400, detail=f"Unknown endpoint {agent_request.endpoint}")
     try:
-        # Create generic agent instance
-        agent = GenericAgent(
-            name=agent_request.name,
-            role=agent_request.role,
-            description=agent_request.description,
-            capabilities=agent_request.capabilities
-        )
-        
-        # Store the agent
-        custom_agents[agent_request.id] = agent
-        
-        # Store agent info
+        # Store agent info; workers build the agent itself on first use
         agent_info = {
             "id": agent_request.id,
             "name": agent_request.name,
@@ -82,7 +291,11 @@ async def add_custom_agent(agent_request: CustomAgentRequest):
             "capabilities": agent_request.capabilities,
             "type": agent_request.id
         }
-        custom_agents_info.append(agent_info)
+        if agent_request.model:
+            agent_info["model"] = agent_request.model
+        if agent_request.endpoint:
+            agent_info["endpoint"] = agent_request.endpoint
+        agent_store.put(agent_info)
         
         return {"status": "success", "message": "Agent added successfully", "agent": agent_info}
     except Exception as e:
@@ -91,215 +304,515 @@ async def add_custom_agent(agent_request: CustomAgentRequest):
 # Delete custom agent
 @app.delete("/api/agents/custom/{agent_id}")
 async def delete_custom_agent(agent_id: str):
-    if agent_id in custom_agents:
-        del custom_agents[agent_id]
-        # Remove from info list
-        global custom_agents_info
-        custom_agents_info = [a for a in custom_agents_info if a["id"] != agent_id]
+    custom_agents.pop(agent_id, None)
+    if agent_store.delete(agent_id):
         return {"status": "success", "message": "Agent deleted successfully"}
     return {"status": "success", "message": "Agent not found or already deleted"}
 
 # Get agent information
 @app.get("/api/agents")
-async def get_agents():
-    base_agents = [
-            {
-                "id": "head_coach",
-                "name": "Head Coach",
-                "role": "Strategic Planning & Team Guidance",
-                "description": "Plans strategies, analyzes opponents, and guides the team",
-                "icon": "🎯",
-                "color": "blue",
-                "capabilities": [
-                    "Match Strategy Planning",
-                    "Opponent Analysis",
-                    "Team Motivation",
-                    "Game Plan Development"
-                ]
-            },
-            {
-                "id": "batting_coach",
-                "name": "Batting Coach",
-                "role": "Batting Excellence",
-                "description": "Improves batting performance and provides training routines",
-                "icon": "🏏",
-                "color": "green",
-                "capabilities": [
-                    "Technique Improvement",
-                    "Training Drills",
-                    "Weakness Analysis",
-                    "Performance Enhancement"
-                ]
-            },
-            {
-                "id": "bowling_coach",
-                "name": "Bowling Coach",
-                "role": "Bowling Mastery",
-                "description": "Analyzes bowling performance and provides expert coaching",
-                "icon": "⚡",
-                "color": "red",
-                "capabilities": [
-                    "Performance Analysis",
-                    "Skill Development",
-                    "Strategy Design",
-                    "Technical Guidance"
-                ]
-            },
-            {
-                "id": "head_physio",
-                "name": "Head Physio",
-                "role": "Health & Fitness",
-                "description": "Monitors fitness, recovery and injury prevention",
-                "icon": "💪",
-                "color": "purple",
-                "capabilities": [
-                    "Fitness Assessment",
-                    "Injury Prevention",
-                    "Recovery Plans",
-                    "Health Monitoring"
-                ]
-            },
-            {
-                "id": "player",
-                "name": "Player",
-                "role": "Performance Execution",
-                "description": "Executes skills and reports performance feedback",
-                "icon": "👤",
-                "color": "orange",
-                "capabilities": [
-                    "Skill Execution",
-                    "Performance Reporting",
-                    "Training Feedback",
-                    "Self-Assessment"
-                ]
-            }
-        ]
-    
-    # Combine base agents with custom agents
-    all_agents = base_agents + custom_agents_info
-    return {"agents": all_agents}
+async def get_agents(request: Request, role: Optional[str] = None, offset: int = 0,
+                     limit: Optional[int] = None):
+    if offset < 0 or (limit is not None and limit < 1):
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit >= 1")
+    body, etag = agent_catalog.page(role, offset, limit)
+    # Clients may cache the list but must revalidate it on every poll
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+# Agent method and argument name used for each base agent type
+AGENT_METHODS = {
+    "head_coach": ("plan_strategy", "match_info"),
+    "batting_coach": ("train_batting", "player_name"),
+    "bowling_coach": ("train_bowling", "player_name"),
+    "head_physio": ("provide_fitness_plan", "player_name"),
+    "player": ("report_performance", "player_name")
+}
+
+def resolve_agent_call(agent_type: str, input_data: str):
+    """Return (method name, bound method, kwargs) for an agent request"""
+    # Check if it's a custom agent
+    custom_agent = get_custom_agent(agent_type)
+    if custom_agent is not None:
+        return "execute", custom_agent.execute, {"input_data": input_data}
+
+    # Check if it's a base agent
+    if agent_type not in orchestrator.agents:
+        raise HTTPException(status_code=404, detail=f"Agent {agent_type} not found")
+    if agent_type not in AGENT_METHODS:
+        raise HTTPException(status_code=400, detail="Invalid agent type")
+
+    method_name, arg_name = AGENT_METHODS[agent_type]
+    method = getattr(orchestrator.agents[agent_type], method_name)
+    return method_name, method, {arg_name: input_data}
 
 # Execute single agent
 @app.post("/api/agent/execute")
-async def execute_agent(request: AgentRequest):
+async def execute_agent(request: AgentRequest, http_request: Request):
+    with use_deadline(request_timeout(http_request)), \
+            use_request_class(http_request, Priority.INTERACTIVE, custom_agent_id(request.agent_type)), \
+            use_cache_mode(cache_mode_for(request.bypass_cache, request.refresh_cache)), \
+            use_route_mode(route_mode_for(request.large_model)):
+        async with agent_admission.slot():
+            return await _execute_agent(request, http_request)
+
+async def _execute_agent(request: AgentRequest, http_request: Request):
     try:
         agent_type = request.agent_type
-        
-        # Check if it's a custom agent
-        if agent_type in custom_agents:
-            agent = custom_agents[agent_type]
-            result = await agent.execute(request.input_data)
-            return {
-                "agent": agent_type,
-                "result": result,
-                "status": "success"
-            }
-        
-        # Check if it's a base agent
-        if agent_type not in orchestrator.agents:
-            raise HTTPException(status_code=404, detail=f"Agent {agent_type} not found")
-        
-        # Determine method based on agent type
-        method_map = {
-            "head_coach": ("plan_strategy", {"match_info": request.input_data}),
-            "batting_coach": ("train_batting", {"player_name": request.input_data}),
-            "bowling_coach": ("train_bowling", {"player_name": request.input_data}),
-            "head_physio": ("provide_fitness_plan", {"player_name": request.input_data}),
-            "player": ("report_performance", {"player_name": request.input_data})
-        }
-        
-        if agent_type not in method_map:
-            raise HTTPException(status_code=400, detail="Invalid agent type")
-        
-        method_name, args = method_map[agent_type]
-        agent = orchestrator.agents[agent_type]
-        method = getattr(agent, method_name)
-        result = await method(**args)
+        method_name, method, args = resolve_agent_call(agent_type, request.input_data)
+        result = await cancel_on_disconnect(
+            http_request,
+            orchestrator.call_agent(agent_type, method_name, method, args),
+            effective_timeout(request.timeout)
+        )
         
         return {
             "agent": agent_type,
             "result": result,
             "status": "success"
         }
+    except (HTTPException, DeadlineExceededError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Execute complete workflow
-@app.post("/api/workflow/execute")
-async def execute_workflow(request: WorkflowRequest):
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def drain_until_done(queue: asyncio.Queue, task: asyncio.Future):
+    """Yield items put on queue until task finishes, then whatever is left"""
+    while not task.done():
+        getter = asyncio.ensure_future(queue.get())
+        await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            yield getter.result()
+        else:
+            getter.cancel()
+    while not queue.empty():
+        yield queue.get_nowait()
+
+def event_stream_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events, media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Stream a single agent's output as Server-Sent Events
+@app.post("/api/agent/execute/stream")
+async def execute_agent_stream(request: AgentRequest, http_request: Request):
+    agent_type = request.agent_type
+    method_name, method, args = resolve_agent_call(agent_type, request.input_data)
+
+    tokens = asyncio.Queue()
+    with use_deadline(request_timeout(http_request)), \
+            use_request_class(http_request, Priority.INTERACTIVE, custom_agent_id(agent_type)), \
+            use_cache_mode(cache_mode_for(request.bypass_cache, request.refresh_cache)), \
+            use_route_mode(route_mode_for(request.large_model)), use_token_sink(tokens.put_nowait):
+        await agent_admission.acquire()
+        timeout = effective_timeout(request.timeout)
+        call = asyncio.ensure_future(asyncio.wait_for(method(**args), timeout))
+    release_when_done(agent_admission, call)
+
+    async def events():
+        try:
+            async for delta in drain_until_done(tokens, call):
+                yield sse_event("token", {"delta": delta})
+            if call.cancelled():
+                yield sse_event("error", {"agent": agent_type, "error": "Agent call cancelled"})
+            elif call.exception() is not None:
+                error = call.exception()
+                if isinstance(error, asyncio.TimeoutError) and not str(error):
+                    error = f"Agent call timed out after {timeout}s"
+                yield sse_event("error", {"agent": agent_type, "error": str(error)})
+            else:
+                yield sse_event("done", {"agent": agent_type, "result": call.result(), "status": "success"})
+        finally:
+            if not call.done():
+                call.cancel()
+
+    return event_stream_response(events())
+
+# Default and upper bound for how many batch items run at once
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+async def run_batch_item(index: int, item: BatchItem, timeout: Optional[float]) -> Dict[str, Any]:
+    """Run one batch item, reporting failure in the returned line instead of raising"""
+    line = {"index": index, "agent": item.agent_type}
     try:
-        # Create workflow
-        workflow_id = orchestrator.create_workflow(
-            name="Team Preparation Workflow",
-            workflow_type=WorkflowType.SEQUENTIAL
-        )
+        method_name, method, args = resolve_agent_call(item.agent_type, item.input_data)
+        # Each item is admitted like a single agent call; a shed item reports when to retry it
+        async with agent_admission.slot():
+            line["result"] = await asyncio.wait_for(
+                orchestrator.call_agent(item.agent_type, method_name, method, args),
+                timeout
+            )
+        line["status"] = "success"
+    except HTTPException as e:
+        line.update(status="error", error=e.detail)
+    except OverloadedError as e:
+        line.update(status="error", error=str(e), retry_after=e.retry_after)
+    except asyncio.TimeoutError:
+        line.update(status="error", error=f"Agent call timed out after {timeout}s")
+    except Exception as e:
+        line.update(status="error", error=str(e))
+    return line
 
-        # Head Coach plans strategy
-        task1 = orchestrator.add_task_to_workflow(
-            workflow_id, "head_coach", "plan_strategy",
-            {"match_info": request.match_info}
-        )
+# Run many agent calls and stream each result as a JSON line as soon as it finishes
+@app.post("/api/agent/execute/batch")
+async def execute_agent_batch(request: BatchAgentRequest, http_request: Request):
+    request_class = use_request_class(http_request, Priority.BULK)
+    concurrency = max(min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY), 1)
+    mode = cache_mode_for(request.bypass_cache, request.refresh_cache)
 
-        # Batting Coach trains player
-        task2 = orchestrator.add_task_to_workflow(
-            workflow_id, "batting_coach", "train_batting",
-            {"player_name": request.player_name},
-            dependencies=[task1]
-        )
+    async def lines():
+        pending = iter(enumerate(request.items))
+        # Bounded so workers pause while the client is slow to read
+        finished = asyncio.Queue(maxsize=concurrency * 2)
 
-        # Bowling Coach trains player
-        task3 = orchestrator.add_task_to_workflow(
-            workflow_id, "bowling_coach", "train_bowling",
-            {"player_name": request.player_name},
-            dependencies=[task1]
-        )
+        async def worker():
+            for index, item in pending:
+                await finished.put(await run_batch_item(index, item, request.timeout))
 
-        # Physio provides fitness plans
-        task4 = orchestrator.add_task_to_workflow(
-            workflow_id, "head_physio", "provide_fitness_plan",
-            {"player_name": request.player_name},
-            dependencies=[task1]
-        )
+        with request_class, use_cache_mode(mode), use_route_mode(route_mode_for(request.large_model)):
+            workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(request.items)))]
+        all_done = asyncio.ensure_future(asyncio.gather(*workers))
+        succeeded = failed = 0
+        try:
+            async for line in drain_until_done(finished, all_done):
+                if line["status"] == "success":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield json.dumps(line) + "\n"
+            yield json.dumps({"done": True, "total": len(request.items),
+                              "succeeded": succeeded, "failed": failed}) + "\n"
+        finally:
+            # Client went away: stop picking up new items
+            for task in workers:
+                task.cancel()
+            all_done.cancel()
 
-        # Player reports performance
-        task5 = orchestrator.add_task_to_workflow(
-            workflow_id, "player", "report_performance",
-            {"player_name": request.player_name},
-            dependencies=[task2, task3, task4]
-        )
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def build_team_workflow(request: WorkflowRequest) -> str:
+    """Create the Team Preparation workflow described by the request"""
+    try:
+        workflow_type = WorkflowType(request.workflow_type)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid workflow type {request.workflow_type}")
+
+    # Create workflow
+    workflow_id = orchestrator.create_workflow(
+        name="Team Preparation Workflow",
+        workflow_type=workflow_type,
+        max_concurrency=request.max_concurrency
+    )
+
+    policy = TaskPolicy(timeout=request.task_timeout, max_retries=request.max_retries, hedge=request.hedge)
+
+    # Head Coach plans strategy
+    task1 = orchestrator.add_task_to_workflow(
+        workflow_id, "head_coach", "plan_strategy",
+        {"match_info": request.match_info},
+        policy=policy
+    )
+
+    # With a player list, each player task fans out over the whole squad
+    player_args = {"player_name": request.players or request.player_name}
+    per_player = {"map_over": "player_name"} if request.players else {}
+
+    # Batting Coach trains player
+    task2 = orchestrator.add_task_to_workflow(
+        workflow_id, "batting_coach", "train_batting",
+        player_args,
+        dependencies=[task1], policy=policy, **per_player
+    )
+
+    # Bowling Coach trains player
+    task3 = orchestrator.add_task_to_workflow(
+        workflow_id, "bowling_coach", "train_bowling",
+        player_args,
+        dependencies=[task1], policy=policy, **per_player
+    )
+
+    # Physio provides fitness plans
+    task4 = orchestrator.add_task_to_workflow(
+        workflow_id, "head_physio", "provide_fitness_plan",
+        player_args,
+        dependencies=[task1], policy=policy, **per_player
+    )
+
+    # Player reports performance
+    orchestrator.add_task_to_workflow(
+        workflow_id, "player", "report_performance",
+        player_args,
+        dependencies=[task2, task3, task4], policy=policy, **per_player
+    )
+    return workflow_id
+
+# Characters of each result text included as a preview
+RESULT_PREVIEW_CHARS = 500
+
+def result_preview(result: Any) -> Any:
+    """Truncate text results for preview, including each result of a map task"""
+    if isinstance(result, str):
+        return result[:RESULT_PREVIEW_CHARS]
+    if isinstance(result, dict):
+        return {key: result_preview(value) for key, value in result.items()}
+    if isinstance(result, list):
+        return [result_preview(value) for value in result]
+    return result
+
+# Task fields a response can be projected onto with ?fields=
+TASK_FIELDS = frozenset({"id", "agent", "method", "status", "result", "full_result", "truncated", "error",
+                         "attempts", "hedge_wins", "provenance"})
+
+def parse_fields(fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Validate a comma-separated ?fields= projection; the task id is always included"""
+    if not fields:
+        return None
+    requested = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    unknown = requested - TASK_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown task fields: {', '.join(sorted(unknown))}")
+    return requested | {"id"}
+
+def format_task(task, include_full: bool = True, fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+    """Task as sent to clients. `result` is a preview; `full_result` is only added when the
+    preview was truncated and include_full is set."""
+    formatted = {
+        "id": task.id,
+        "agent": task.agent_type,
+        "method": task.method,
+        "status": task.status.value,
+        "error": task.error,
+        "attempts": task.attempts,
+        "hedge_wins": task.hedge_wins,
+        # Whether a completed task's result was reused from an earlier identical run
+        "provenance": ("reused" if task.reused else "computed") if task.status == TaskStatus.COMPLETED else None
+    }
+    # Stored results may be loaded lazily, so only touch them when asked for
+    if fields is None or fields & {"result", "full_result", "truncated"}:
+        result = task.result
+        preview = result_preview(result)
+        formatted["result"] = preview
+        formatted["truncated"] = preview != result
+        if include_full and formatted["truncated"]:
+            formatted["full_result"] = result
+    if fields is not None:
+        formatted = {key: value for key, value in formatted.items() if key in fields}
+    return formatted
+
+def reuse_summary(workflow) -> Dict[str, int]:
+    """How many tasks (and agent calls) an incremental rerun reused instead of computing"""
+    reused = [task for task in workflow.tasks if task.status == TaskStatus.COMPLETED and task.reused]
+    return {
+        "reused_tasks": len(reused),
+        "computed_tasks": sum(1 for task in workflow.tasks if task.status == TaskStatus.COMPLETED) - len(reused),
+        "agent_calls_saved": sum(len(task.args[task.map_over]) if task.map_over else 1 for task in reused)
+    }
+
+# Execute complete workflow
+@app.post("/api/workflow/execute")
+async def execute_workflow(request: WorkflowRequest, http_request: Request, include_full: bool = True,
+                           fields: Optional[str] = None):
+    with use_deadline(request_timeout(http_request)), use_request_class(http_request, Priority.WORKFLOW), \
+            use_cache_mode(request.cache_mode()), use_route_mode(request.route_mode()):
+        async with workflow_admission.slot():
+            return await _execute_workflow(request, http_request, include_full, parse_fields(fields))
+
+async def _execute_workflow(request: WorkflowRequest, http_request: Request, include_full: bool,
+                            fields: Optional[FrozenSet[str]]):
+    try:
+        workflow_id = build_team_workflow(request)
 
         # Execute workflow
-        results = await orchestrator.execute_workflow(workflow_id)
+        await cancel_on_disconnect(http_request, orchestrator.execute_workflow(workflow_id))
         
         # Get workflow details
         workflow = orchestrator.workflows[workflow_id]
         
         # Format response with task details
-        task_results = []
-        for task in workflow.tasks:
-            task_results.append({
-                "id": task.id,
-                "agent": task.agent_type,
-                "method": task.method,
-                "status": task.status.value,
-                "result": task.result[:500] if task.result else None,  # Truncate for preview
-                "full_result": task.result
-            })
+        task_results = [format_task(task, include_full, fields) for task in workflow.tasks]
         
-        return {
+        completed = workflow.status.value == "completed"
+        return await json_response(http_request, {
             "workflow_id": workflow_id,
-            "status": "completed",
+            "status": workflow.status.value,
             "tasks": task_results,
-            "message": "Workflow executed successfully"
-        }
+            "reuse": reuse_summary(workflow),
+            "message": "Workflow executed successfully" if completed else "Workflow finished with failed tasks"
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Stream workflow task lifecycle updates as Server-Sent Events
+@app.post("/api/workflow/execute/stream")
+async def execute_workflow_stream(request: WorkflowRequest, http_request: Request):
+    with use_deadline(request_timeout(http_request)), use_request_class(http_request, Priority.WORKFLOW), \
+            use_cache_mode(request.cache_mode()), use_route_mode(request.route_mode()):
+        await workflow_admission.acquire()
+        try:
+            workflow_id = build_team_workflow(request)
+        except Exception:
+            workflow_admission.release()
+            raise
+        workflow = orchestrator.workflows[workflow_id]
+
+        updates = asyncio.Queue()
+        orchestrator.watch_workflow(workflow_id, lambda task: updates.put_nowait(format_task(task)))
+        run = asyncio.ensure_future(orchestrator.execute_workflow(workflow_id))
+    release_when_done(workflow_admission, run)
+
+    async def events():
+        try:
+            yield sse_event("workflow", {
+                "workflow_id": workflow_id,
+                "status": workflow.status.value,
+                "tasks": [format_task(task) for task in workflow.tasks]
+            })
+            async for update in drain_until_done(updates, run):
+                yield sse_event("task", update)
+            error = None if run.cancelled() else run.exception()
+            yield sse_event("done", {
+                "workflow_id": workflow_id,
+                "status": workflow.status.value,
+                "reuse": reuse_summary(workflow),
+                "error": str(error) if error else None
+            })
+        finally:
+            if not run.done():
+                run.cancel()
+
+    return event_stream_response(events())
+
+# Submit workflow for background execution
+@app.post("/api/workflows", status_code=202)
+async def submit_workflow(request: WorkflowRequest, http_request: Request):
+    # Background runs share the workflow slots; turn the submission away while they are all spoken for
+    workflow_admission.check()
+    workflow_id = build_team_workflow(request)
+    try:
+        with use_request_class(http_request, Priority.WORKFLOW), use_cache_mode(request.cache_mode()), \
+                use_route_mode(request.route_mode()):
+            job_runner.submit(workflow_id)
+    except QueueFullError as e:
+        del orchestrator.workflows[workflow_id]
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"workflow_id": workflow_id, "status": TaskStatus.PENDING.value}
+
 # Get workflows
 @app.get("/api/workflows")
-async def get_workflows():
-    workflows = orchestrator.list_workflows()
-    return {"workflows": workflows}
+async def get_workflows(request: Request, status: Optional[str] = None, offset: int = 0, limit: int = 100,
+                        created_after: Optional[datetime] = None):
+    try:
+        status_filter = TaskStatus(status) if status else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid status {status}")
+    if offset < 0 or limit < 1:
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit >= 1")
+    workflows = orchestrator.list_workflows(
+        status=status_filter, offset=offset, limit=limit, created_after=created_after
+    )
+    return await json_response(request, {"workflows": workflows, "offset": offset, "limit": limit})
+
+# Background job runner queue stats
+@app.get("/api/workflows/jobs/stats")
+async def get_job_stats():
+    return job_runner.stats()
+
+# Get workflow status and per-task results
+@app.get("/api/workflows/{workflow_id}")
+async def get_workflow(workflow_id: str, request: Request, include_full: bool = True,
+                       fields: Optional[str] = None):
+    task_fields = parse_fields(fields)
+    workflow = orchestrator.workflows.get(workflow_id)
+    if workflow is None:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+    return await json_response(request, {
+        "workflow_id": workflow.id,
+        "name": workflow.name,
+        "status": workflow.status.value,
+        "tasks": [format_task(task, include_full, task_fields) for task in workflow.tasks],
+        "reuse": reuse_summary(workflow)
+    })
+
+# Get one task's full result, for clients that listed the workflow with previews only
+@app.get("/api/workflows/{workflow_id}/tasks/{task_id}/result")
+async def get_task_result(workflow_id: str, task_id: str, request: Request):
+    workflow = orchestrator.workflows.get(workflow_id)
+    if workflow is None:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+    task = next((task for task in workflow.tasks if task.id == task_id), None)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found in workflow {workflow_id}")
+    return await json_response(request, {
+        "workflow_id": workflow_id,
+        "task_id": task_id,
+        "status": task.status.value,
+        "result": task.result
+    })
+
+# Cancel a queued or running workflow
+@app.delete("/api/workflows/{workflow_id}")
+async def cancel_workflow(workflow_id: str):
+    if workflow_id not in orchestrator.workflows:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+    if job_runner.cancel(workflow_id):
+        return {"status": "success", "message": "Workflow cancelled"}
+    # Running in another worker: it picks the request up from the shared store
+    if orchestrator.workflows.request_cancel(workflow_id):
+        return {"status": "success", "message": "Workflow cancellation requested"}
+    workflow = orchestrator.workflows[workflow_id]
+    return {"status": "success", "message": f"Workflow already {workflow.status.value}"}
+
+# LLM response cache counters
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    if llm_executor.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_executor.cache.stats()}
+
+# Client-side rate limiter queue and wait-time stats
+@app.get("/api/ratelimit/stats")
+async def get_rate_limit_stats():
+    if llm_executor.limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_executor.limiter.stats()}
+
+# Coalesced in-flight agent call counters
+@app.get("/api/inflight/stats")
+async def get_inflight_stats():
+    return orchestrator.inflight.stats()
+
+# LLM scheduler load and wait times per priority class
+@app.get("/api/scheduler/stats")
+async def get_scheduler_stats():
+    if llm_executor.scheduler is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_executor.scheduler.stats()}
+
+# Routing decisions, fallbacks and latency/token totals per model
+@app.get("/api/models/stats")
+async def get_model_stats():
+    if llm_executor.router is None:
+        return {"routing": False, "models": {}}
+    return llm_executor.router.stats()
+
+# Admission control counters and current load
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    return {"agent_calls": agent_admission.stats(), "workflows": workflow_admission.stats()}
+
+# Prometheus metrics for agent calls, LLM usage and workflows
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,110 @@
+"""
+Goodput under overload
+Offers POST /api/agent/execute more requests per second than the LLM
+connection pool can serve, with clients that give up after --client-timeout
+seconds, and reports goodput (answers that arrived in time, per second)
+with admission control off and on. Without it every request queues behind
+the pool and most answers arrive too late; with it the excess is turned
+away at once and the admitted requests keep finishing in time.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from admission import AdmissionController
+from stub_llm import StubLLMServer
+
+
+async def offer_load(client, rate: float, duration: float, client_timeout: float, send_deadline: bool,
+                     seed: int) -> Dict[str, Any]:
+    """Open-loop Poisson arrivals; returns counts by outcome"""
+    rng = random.Random(seed)
+    outcomes: Dict[str, int] = {"ok": 0, "late": 0, "shed": 0, "error": 0}
+    latencies: List[float] = []
+    headers = {"X-Request-Timeout": str(client_timeout)} if send_deadline else {}
+
+    async def one(i: int):
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(client.post(
+                "/api/agent/execute", json={"agent_type": "player", "input_data": f"Player {i}"}, headers=headers
+            ), client_timeout)
+        except asyncio.TimeoutError:
+            outcomes["late"] += 1
+            return
+        if response.status_code == 200:
+            outcomes["ok"] += 1
+            latencies.append(time.perf_counter() - start)
+        elif response.status_code in (503, 504):
+            outcomes["shed"] += 1
+        else:
+            outcomes["error"] += 1
+
+    requests = []
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        requests.append(asyncio.ensure_future(one(i)))
+        i += 1
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*requests)
+    latencies.sort()
+    return {
+        "offered": i,
+        **outcomes,
+        "goodput_rps": round(outcomes["ok"] / duration, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 1) if latencies else None,
+    }
+
+
+async def main(cli_args):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import api
+        api.orchestrator.initialize_agents()
+    capacity = cli_args.connections / cli_args.latency
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for variant, admission in (("unbounded", False), ("admission", True)):
+            # 0 slots means no limit
+            api.agent_admission = AdmissionController("agent calls", cli_args.connections if admission else 0,
+                                                      cli_args.connections * 2, cli_args.client_timeout)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result = await offer_load(client, capacity * cli_args.overload, cli_args.duration,
+                                          cli_args.client_timeout, admission, cli_args.seed)
+            print(json.dumps({"variant": variant, "capacity_rps": round(capacity, 1),
+                              "offered_rps": round(capacity * cli_args.overload, 1), **result}))
+            # Let abandoned calls drain before the next variant
+            while api.orchestrator.inflight.in_flight:
+                await asyncio.sleep(0.1)
+    await api.llm_executor.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=8, help="LLM connections, i.e. calls served at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM latency in seconds")
+    parser.add_argument("--overload", type=float, default=2.0, help="Offered load as a multiple of capacity")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--client-timeout", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    cli_args = parser.parse_args()
+
+    server = StubLLMServer(latency=cli_args.latency).start()
+    os.environ.update({"LLM_BASE_URL": server.base_url, "GROQ_API_KEY": "stub", "LLM_RPM": "0", "LLM_TPM": "0",
+                       "LLM_CACHE_SIZE": "0", "LLM_MAX_CONNECTIONS": str(cli_args.connections)})
+    try:
+        asyncio.run(main(cli_args))
+    finally:
+        server.stop()
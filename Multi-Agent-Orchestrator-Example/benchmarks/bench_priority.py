@@ -0,0 +1,100 @@
+"""
+Interactive latency and tenant fairness under a batch backlog
+A stub LLM serves --slots calls at a time. One bulk tenant queues a large
+backlog, a second bulk tenant a small one, and interactive calls arrive at a
+steady rate on top. Reports interactive latency percentiles and when each
+bulk tenant finishes, first with plain first-come ordering (a thread pool of
+the same size) and then with the priority/fair scheduler; both again behind
+a client-side rate limiter of --rate requests per second, where the backlog
+queues for rate budget rather than for slots.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from llm import LLMExecutor
+from ratelimit import RateLimiter
+from scheduler import FairScheduler, Priority, use_call_class
+from stub_llm import StubAgent
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+async def run(scheduler: Optional[FairScheduler], limiter: Optional[RateLimiter], slots: int, latency: float,
+              big_backlog: int, small_backlog: int, interactive_rate: float, duration: float) -> Dict[str, Any]:
+    # With the scheduler, the pool is only the stub's thread budget; without it, it is the queue
+    executor = LLMExecutor(pool_size=slots if scheduler is None else slots * 4, timeout=None,
+                           limiter=limiter, scheduler=scheduler)
+    agent = StubAgent(latency=latency)
+    finished: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    async def backlog(tenant: str, count: int):
+        with use_call_class(Priority.BULK, tenant):
+            await asyncio.gather(*(executor.prompt(agent, f"{tenant} {i}") for i in range(count)))
+        finished[tenant] = time.perf_counter() - start
+
+    async def interactive() -> List[float]:
+        latencies = []
+
+        async def one(i: int):
+            sent = time.perf_counter()
+            with use_call_class(Priority.INTERACTIVE, "chat"):
+                await executor.prompt(agent, f"chat {i}")
+            latencies.append(time.perf_counter() - sent)
+
+        calls = []
+        for i in range(int(duration * interactive_rate)):
+            calls.append(asyncio.ensure_future(one(i)))
+            await asyncio.sleep(1 / interactive_rate)
+        await asyncio.gather(*calls)
+        return latencies
+
+    big = asyncio.ensure_future(backlog("big-tenant", big_backlog))
+    await asyncio.sleep(0.01)
+    small = asyncio.ensure_future(backlog("small-tenant", small_backlog))
+    latencies = await interactive()
+    await asyncio.gather(big, small)
+    executor.shutdown()
+    return {
+        "scheduler": scheduler is not None,
+        "rate_limit_rps": limiter.requests.limit if limiter is not None else None,
+        "interactive_calls": len(latencies),
+        "interactive_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "interactive_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "interactive_max_ms": round(max(latencies) * 1000, 1),
+        "small_tenant_done_s": round(finished["small-tenant"], 2),
+        "big_tenant_done_s": round(finished["big-tenant"], 2),
+    }
+
+
+async def main(cli_args):
+    for rate in (None, cli_args.rate):
+        for use_scheduler in (False, True):
+            limiter = RateLimiter(requests_per_minute=rate, period=1.0) if rate else None
+            scheduler = FairScheduler(slots=cli_args.slots, limiter=limiter) if use_scheduler else None
+            print(json.dumps(await run(scheduler, limiter, cli_args.slots, cli_args.latency, cli_args.big_backlog,
+                                       cli_args.small_backlog, cli_args.interactive_rate, cli_args.duration)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=10, help="LLM calls served at once")
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub LLM latency in seconds")
+    parser.add_argument("--big-backlog", type=int, default=400)
+    parser.add_argument("--small-backlog", type=int, default=20)
+    parser.add_argument("--interactive-rate", type=float, default=10.0, help="Interactive calls per second")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of interactive traffic")
+    parser.add_argument("--rate", type=float, default=50.0, help="Rate limit in requests per second (0: skip)")
+    asyncio.run(main(parser.parse_args()))
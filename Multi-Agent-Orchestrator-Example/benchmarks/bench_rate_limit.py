@@ -0,0 +1,64 @@
+"""
+Rate limiter benchmark against a stub server that enforces a request limit
+Fires a burst of agent calls with and without the client-side limiter and
+reports 429s seen by the server and time spent queueing in the limiter
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from types import SimpleNamespace
+
+from llm import LLMClient, LLMExecutor
+from ratelimit import RateLimiter
+from stub_llm import StubLLMServer
+
+
+async def run_burst(use_limiter: bool, calls: int, limit: int, period: float) -> dict:
+    with StubLLMServer(requests_per_period=limit, period=period, latency=0.01) as server:
+        limiter = RateLimiter(requests_per_minute=limit, period=period) if use_limiter else None
+        executor = LLMExecutor(timeout=30, limiter=limiter, rate_limit_retries=0 if not use_limiter else 5,
+                               client=LLMClient(base_url=server.base_url, api_key="stub"))
+        agent = SimpleNamespace(model="stub-model", preamble="stub")
+
+        # Warm up the HTTP client, then let the stub's bucket refill
+        await executor.prompt(agent, "warm up")
+        await asyncio.sleep(period)
+        server.requests = server.rejected = 0
+
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(executor.prompt(agent, f"call {i}") for i in range(calls)), return_exceptions=True
+        )
+        elapsed = time.perf_counter() - start
+        failures = sum(isinstance(outcome, Exception) for outcome in outcomes)
+        result = {
+            "limiter": use_limiter,
+            "calls": calls,
+            "failed": failures,
+            "server_429s": server.rejected,
+            "elapsed_s": round(elapsed, 3),
+            "limiter_stats": limiter.stats() if limiter else None,
+        }
+        await executor.aclose()
+        return result
+
+
+async def main(calls: int, limit: int, period: float):
+    for use_limiter in (False, True):
+        print(json.dumps(await run_burst(use_limiter, calls, limit, period)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="429s and queue wait with and without the rate limiter")
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=10, help="Requests the stub accepts per period")
+    parser.add_argument("--period", type=float, default=1.0, help="Rate limit window in seconds")
+    cli_args = parser.parse_args()
+    asyncio.run(main(cli_args.calls, cli_args.limit, cli_args.period))
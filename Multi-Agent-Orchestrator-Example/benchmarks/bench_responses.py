@@ -0,0 +1,115 @@
+"""
+Workflow response size and serialization benchmark
+Formats finished workflows the way GET /api/workflows/{id} does and reports
+bytes on the wire (identity, gzip and, when installed, brotli) and the time
+to serialize them, for the previous format that repeated every result as
+`full_result`, the current default and previews only (include_full=false)
+"""
+
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.encoders import jsonable_encoder
+
+from models import Task, TaskStatus
+
+with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    import api
+from responses import brotli, compress, dumps
+
+
+def completion(rng: random.Random, vocabulary: List[str], chars: int) -> str:
+    """Prose-like text of about `chars` characters"""
+    words, length = [], 0
+    while length < chars:
+        word = rng.choice(vocabulary)
+        words.append(word + ("." if rng.random() < 0.08 else ""))
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def build_tasks(count: int, result_chars: int, seed: int) -> List[Task]:
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("etaoinshrdlucmfwyp") for _ in range(rng.randint(2, 10)))
+                  for _ in range(2000)]
+    agents = list(api.AGENT_METHODS.items())
+    tasks = []
+    for i in range(count):
+        agent_type, (method, arg_name) = agents[i % len(agents)]
+        tasks.append(Task(agent_type=agent_type, method=method, args={arg_name: f"Player {i}"},
+                          status=TaskStatus.COMPLETED, attempts=1,
+                          result=completion(rng, vocabulary, rng.randint(result_chars // 2, result_chars * 3 // 2))))
+    return tasks
+
+
+def legacy_task(task: Task) -> Dict[str, Any]:
+    """The response format before previews and projections: every result sent twice"""
+    return {"id": task.id, "agent": task.agent_type, "method": task.method, "status": task.status.value,
+            "result": api.result_preview(task.result), "full_result": task.result, "error": task.error,
+            "attempts": task.attempts, "hedge_wins": task.hedge_wins}
+
+
+def legacy_dumps(payload: Any) -> bytes:
+    """What FastAPI does with a returned dict: jsonable_encoder, then json.dumps"""
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    """Median microseconds per call"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def run_case(name: str, tasks: List[Task], repeat: int) -> List[Dict[str, Any]]:
+    variants = {
+        "legacy": (lambda: [legacy_task(task) for task in tasks], legacy_dumps),
+        "default": (lambda: [api.format_task(task) for task in tasks], dumps),
+        "previews": (lambda: [api.format_task(task, include_full=False) for task in tasks], dumps),
+    }
+    rows = []
+    for variant, (format_tasks, serialize) in variants.items():
+        def respond():
+            return serialize({"workflow_id": "bench", "status": "completed", "tasks": format_tasks()})
+
+        body = respond()
+        row = {
+            "case": name,
+            "tasks": len(tasks),
+            "variant": variant,
+            "identity_bytes": len(body),
+            "gzip_bytes": len(gzip.compress(body, compresslevel=6)),
+            "serialize_us": round(timed(respond, repeat), 1),
+            "gzip_us": round(timed(lambda: compress(body, "gzip"), repeat), 1),
+        }
+        if brotli is not None:
+            row["br_bytes"] = len(compress(body, "br"))
+            row["br_us"] = round(timed(lambda: compress(body, "br"), repeat), 1)
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--result-chars", type=int, default=3000, help="Typical length of one agent result")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    cli_args = parser.parse_args()
+
+    for case, count in (("typical", 5), ("large", 100)):
+        for row in run_case(case, build_tasks(count, cli_args.result_chars, cli_args.seed), cli_args.repeat):
+            print(json.dumps(row))
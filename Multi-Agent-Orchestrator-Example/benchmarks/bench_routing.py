@@ -0,0 +1,99 @@
+"""
+Latency-aware model routing
+Serves a large and a small model from one stub LLM, each with its own
+latency, and sends a mix of short and long inputs to the Player agent:
+without the router, with it, and with a small model the stub does not
+serve (every routed call falls back to the large model). Reports latency
+percentiles, calls per model and the router's decisions.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+with open(os.devnull, "w") as _devnull, contextlib.redirect_stdout(_devnull):
+    from agents import PlayerAgent
+from llm import LLMClient, LLMExecutor
+from routing import ModelRouter
+from stub_llm import StubLLMServer
+
+LARGE_MODEL = "llama-3.3-70b-versatile"
+SMALL_MODEL = "llama-3.1-8b-instant"
+
+
+def workload(calls: int, long_share: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    inputs = []
+    for i in range(calls):
+        if rng.random() < long_share:
+            inputs.append("\n".join(f"Over {over}: dot, four, dot, single, wide, six" for over in range(20)))
+        else:
+            inputs.append(f"Player {i}")
+    return inputs
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+async def run(base_url: str, router: Optional[ModelRouter], inputs: List[str], concurrency: int) -> Dict[str, Any]:
+    executor = LLMExecutor(timeout=30, client=LLMClient(base_url=base_url, api_key="stub"), router=router)
+    agent = PlayerAgent("player", model=LARGE_MODEL)
+    latencies = []
+    pending = iter(inputs)
+
+    async def worker():
+        for text in pending:
+            start = time.perf_counter()
+            await executor.prompt(agent, text)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await executor.aclose()
+    result = {
+        "calls": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+    }
+    if router is not None:
+        stats = router.stats()
+        result.update(decisions=stats["decisions"], fallbacks=stats["fallbacks"],
+                      calls_per_model={model: s["calls"] for model, s in stats["models"].items()})
+    return result
+
+
+async def main(cli_args, base_url: str):
+    inputs = workload(cli_args.calls, cli_args.long_share, cli_args.seed)
+    variants = (
+        ("large only", None),
+        ("routed", ModelRouter(small_model=SMALL_MODEL, agents=set())),
+        ("routed, small model missing", ModelRouter(small_model="not-served-8b", agents=set(), cooldown=3600)),
+    )
+    for name, router in variants:
+        print(json.dumps({"variant": name, **await run(base_url, router, inputs, cli_args.concurrency)}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--long-share", type=float, default=0.2, help="Fraction of inputs too long to route")
+    parser.add_argument("--large-latency", type=float, default=0.4)
+    parser.add_argument("--small-latency", type=float, default=0.08)
+    parser.add_argument("--seed", type=int, default=1)
+    cli_args = parser.parse_args()
+    os.environ.update({"LLM_RPM": "0", "LLM_TPM": "0"})
+    with StubLLMServer(models={LARGE_MODEL: cli_args.large_latency, SMALL_MODEL: cli_args.small_latency}) as server:
+        asyncio.run(main(cli_args, server.base_url))
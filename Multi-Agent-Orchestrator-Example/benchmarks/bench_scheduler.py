@@ -0,0 +1,93 @@
+"""
+Scheduling overhead micro-benchmark
+Runs workflows of no-op tasks through the orchestrator and reports the cost
+per task, which should stay flat as workflows grow from thousands to
+hundreds of thousands of tasks
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from orchestrator import MultiAgentOrchestrator, TaskStatus, WorkflowType
+
+
+class NoopAgent:
+    """Agent whose only method returns immediately"""
+
+    async def run(self, i: int) -> int:
+        return i
+
+
+def build_workflow(orchestrator: MultiAgentOrchestrator, shape: str, size: int,
+                   workflow_type: WorkflowType) -> str:
+    workflow_id = orchestrator.create_workflow(f"{shape}-{size}", workflow_type)
+    rng = random.Random(size)
+    ids = []
+    for i in range(size):
+        if not ids:
+            dependencies = []
+        elif shape == "chain":
+            dependencies = [ids[-1]]
+        elif shape == "fanout":
+            dependencies = [ids[0]]
+        else:
+            dependencies = rng.sample(ids, min(len(ids), 3))
+        ids.append(orchestrator.add_task_to_workflow(workflow_id, "noop", "run", {"i": i}, dependencies))
+    return workflow_id
+
+
+async def run_case(shape: str, size: int, workflow_type: WorkflowType) -> dict:
+    orchestrator = MultiAgentOrchestrator()
+    orchestrator.agents["noop"] = NoopAgent()
+
+    start = time.perf_counter()
+    workflow_id = build_workflow(orchestrator, shape, size, workflow_type)
+    built = time.perf_counter()
+    await orchestrator.execute_workflow(workflow_id)
+    finished = time.perf_counter()
+
+    workflow = orchestrator.workflows[workflow_id]
+    assert workflow.status == TaskStatus.COMPLETED, workflow.status
+    return {
+        "shape": shape,
+        "workflow_type": workflow_type.value,
+        "tasks": size,
+        "build_s": round(built - start, 3),
+        "execute_s": round(finished - built, 3),
+        "build_us_per_task": round((built - start) / size * 1e6, 1),
+        "execute_us_per_task": round((finished - built) / size * 1e6, 1),
+    }
+
+
+async def main(sizes, shapes, workflow_types, disable_gc: bool):
+    if disable_gc:
+        gc.disable()
+    for workflow_type in workflow_types:
+        for shape in shapes:
+            for size in sizes:
+                # Per-task progress prints would dominate the measurement
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    result = await run_case(shape, size, WorkflowType(workflow_type))
+                print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--shapes", nargs="+", default=["chain", "fanout", "random"],
+                        choices=["chain", "fanout", "random"])
+    parser.add_argument("--workflow-types", nargs="+", default=["sequential", "parallel"],
+                        choices=["sequential", "parallel"])
+    parser.add_argument("--disable-gc", action="store_true",
+                        help="Exclude garbage collection of many live task objects from the timings")
+    cli_args = parser.parse_args()
+    asyncio.run(main(cli_args.sizes, cli_args.shapes, cli_args.workflow_types, cli_args.disable_gc))
@@ -0,0 +1,95 @@
+"""
+Cold start
+Measures how long `import api` takes in a fresh interpreter, then starts the
+API under uvicorn against a stub LLM and measures the time from launch to
+the first healthy response (GET /) and to the first successful agent call.
+Runs with background pre-warming off and on (AGENT_PREWARM); each figure
+is the median over --runs fresh processes.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, BENCH_DIR)
+
+from stub_llm import StubLLMServer
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def import_seconds(module: str, env: Dict[str, str]) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(module=module)], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url: str, body: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    data = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers), timeout=10) as response:
+            return response.status
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return None
+
+
+def cold_start(env: Dict[str, str], timeout: float = 30.0) -> Dict[str, float]:
+    """Seconds from launching uvicorn to the first 200 from GET / and from an agent call"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while request(base + "/") != 200:
+            if time.perf_counter() - start > timeout or server.poll() is not None:
+                raise RuntimeError("API did not become healthy")
+            time.sleep(0.005)
+        healthy = time.perf_counter() - start
+        if request(base + "/api/agent/execute", {"agent_type": "player", "input_data": "Virat Kohli"}) != 200:
+            raise RuntimeError("First agent call failed")
+        first_call = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    return {"healthy_s": healthy, "first_agent_call_s": first_call}
+
+
+def main(cli_args):
+    with StubLLMServer(latency=cli_args.latency) as stub:
+        env = dict(os.environ, LLM_BASE_URL=stub.base_url, GROQ_API_KEY="stub", LLM_RPM="0", LLM_TPM="0",
+                   LLM_CACHE_SIZE="0")
+        for module in ("agents", "orchestrator", "api"):
+            times = [import_seconds(module, env) for _ in range(cli_args.runs)]
+            print(json.dumps({"import": module, "median_ms": round(statistics.median(times) * 1000, 1)}))
+        for prewarm in ("0", "1"):
+            runs = [cold_start(dict(env, AGENT_PREWARM=prewarm)) for _ in range(cli_args.runs)]
+            print(json.dumps({
+                "agent_prewarm": prewarm == "1",
+                "healthy_ms": round(statistics.median(r["healthy_s"] for r in runs) * 1000, 1),
+                "first_agent_call_ms": round(statistics.median(r["first_agent_call_s"] for r in runs) * 1000, 1),
+            }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub LLM latency in seconds")
+    main(parser.parse_args())
@@ -0,0 +1,72 @@
+"""
+Memory benchmark for the workflow stores
+Pushes many finished Team Preparation-sized workflows through a store and
+samples process RSS, which should stay flat once the store reaches its bound
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models import Task, TaskStatus, Workflow
+from store import InMemoryWorkflowStore, SQLiteWorkflowStore
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), falling back to peak RSS elsewhere"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def finished_workflow(i: int, result_size: int) -> Workflow:
+    workflow = Workflow(name=f"Team Preparation Workflow {i}", status=TaskStatus.COMPLETED)
+    previous = []
+    for agent_type, method in (("head_coach", "plan_strategy"), ("batting_coach", "train_batting"),
+                               ("bowling_coach", "train_bowling"), ("head_physio", "provide_fitness_plan"),
+                               ("player", "report_performance")):
+        task = Task(agent_type=agent_type, method=method, args={"player_name": f"Player {i}"},
+                    dependencies=previous[-1:], status=TaskStatus.COMPLETED,
+                    result=f"{method} {i} " + "x" * result_size, completed_at=datetime.now())
+        workflow.tasks.append(task)
+        previous.append(task.id)
+    workflow.completed_at = datetime.now()
+    return workflow
+
+
+def run(store, workflows: int, result_size: int, samples: int):
+    every = max(workflows // samples, 1)
+    start_rss = rss_mb()
+    for i in range(1, workflows + 1):
+        workflow = finished_workflow(i, result_size)
+        store.add(workflow)
+        store.save(workflow)
+        if i % every == 0:
+            print(json.dumps({"store": type(store).__name__, "workflows": i,
+                              "stored": len(store), "rss_mb": round(rss_mb(), 1),
+                              "rss_growth_mb": round(rss_mb() - start_rss, 1)}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RSS while storing many finished workflows")
+    parser.add_argument("--store", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--workflows", type=int, default=100000)
+    parser.add_argument("--max-workflows", type=int, default=1000,
+                        help="Bound for the in-memory store")
+    parser.add_argument("--result-size", type=int, default=2000, help="Characters per task result")
+    parser.add_argument("--samples", type=int, default=10)
+    cli_args = parser.parse_args()
+
+    if cli_args.store == "memory":
+        workflow_store = InMemoryWorkflowStore(max_workflows=cli_args.max_workflows)
+    else:
+        workflow_store = SQLiteWorkflowStore(os.path.join(tempfile.mkdtemp(), "workflows.db"))
+    run(workflow_store, cli_args.workflows, cli_args.result_size, cli_args.samples)
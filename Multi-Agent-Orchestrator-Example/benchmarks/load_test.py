@@ -0,0 +1,79 @@
+"""
+Load test for the async LLM layer
+Fires concurrent agent calls at a stub LLM and reports throughput per pool size
+(worker threads, or connections with --http), plus how long a trivial coroutine
+waits for the event loop while calls are in flight
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from types import SimpleNamespace
+
+from llm import LLMClient, LLMExecutor
+from stub_llm import StubAgent, StubLLMServer
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Worst delay between scheduling a wake-up and getting the loop back"""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - start - interval)
+    return worst
+
+
+async def run_load(pool_size: int, requests: int, latency: float, server: StubLLMServer = None) -> dict:
+    if server is None:
+        executor = LLMExecutor(pool_size=pool_size, timeout=None)
+        agent = StubAgent(latency=latency)
+    else:
+        client = LLMClient(base_url=server.base_url, api_key="stub", max_connections=pool_size)
+        executor = LLMExecutor(timeout=None, client=client)
+        agent = SimpleNamespace(model="stub-model", preamble="stub")
+    stop = asyncio.Event()
+    lag_task = asyncio.ensure_future(measure_loop_lag(stop))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(executor.prompt(agent, f"request {i}") for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    loop_lag = await lag_task
+    await executor.aclose()
+    return {
+        "pool_size": pool_size,
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "max_loop_lag_ms": round(loop_lag * 1000, 2),
+    }
+
+
+async def main(pool_sizes, requests: int, latency: float, http: bool):
+    server = StubLLMServer(latency=latency).start() if http else None
+    try:
+        for pool_size in pool_sizes:
+            print(json.dumps(await run_load(pool_size, requests, latency, server)))
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of agent calls against a stub LLM")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub LLM latency in seconds")
+    parser.add_argument("--http", action="store_true",
+                        help="Go through the shared HTTP client against a stub server")
+    cli_args = parser.parse_args()
+    asyncio.run(main(cli_args.pool_sizes, cli_args.requests, cli_args.latency, cli_args.http))
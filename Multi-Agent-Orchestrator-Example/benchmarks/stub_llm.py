@@ -0,0 +1,271 @@
+"""
+Local stub LLMs for benchmarks
+StubAgent stands in for alith.Agent in-process; StubLLMServer speaks the
+OpenAI chat completions protocol over HTTP so agents can be pointed at it
+through base_url. Neither ever touches the Groq API.
+
+Run this file directly to serve the stub on a fixed port, then start the
+backend with LLM_BASE_URL=http://127.0.0.1:<port>/openai/v1.
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+class StubAgent:
+    """Drop-in for alith.Agent whose blocking prompt() sleeps like a network call"""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, preamble: str = "",
+                 model: str = "stub-model"):
+        self.latency = latency
+        self.jitter = jitter
+        self.preamble = preamble
+        self.model = model
+        self.calls = 0
+
+    def prompt(self, prompt: str) -> str:
+        self.calls += 1
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+        return f"Stub response to: {prompt}"
+
+
+class StubLLMServer:
+    """OpenAI-compatible chat completions server on localhost.
+
+    Completions are served under any path ending in /chat/completions, so
+    base_url can be e.g. http://127.0.0.1:<port>/openai/v1. Optionally
+    enforces a requests-per-period limit, answering 429 with Retry-After
+    and x-ratelimit-* headers like the real provider.
+
+    Time to first token is drawn from `latency_distribution` around
+    `latency` (uniform: +/- `latency_spread`; lognormal: median `latency`,
+    sigma `latency_spread`; exponential: mean `latency`). Completions are
+    `completion_words` long when set and generated at `tokens_per_second`
+    (one word per token). `error_rate` and `rate_limit_rate` inject 500s
+    and 429s at random. `models` maps the model names served to their
+    latency (in place of `latency`); other models get a 404 like an unknown
+    model would from the provider.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.05,
+                 requests_per_period: Optional[int] = None, period: float = 60.0,
+                 latency_distribution: str = "fixed", latency_spread: float = 0.0,
+                 tokens_per_second: Optional[float] = None, completion_words: Optional[int] = None,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 0.1,
+                 seed: Optional[int] = None, models: Optional[Dict[str, float]] = None):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {latency_distribution}")
+        self.latency = latency
+        self.requests_per_period = requests_per_period
+        self.period = period
+        self.latency_distribution = latency_distribution
+        self.latency_spread = latency_spread
+        self.tokens_per_second = tokens_per_second
+        self.completion_words = completion_words
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.models = models
+        self.model_requests: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self._allowance = float(requests_per_period or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/openai/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def sample_latency(self, model: Optional[str] = None) -> float:
+        latency = self.models[model] if self.models and model in self.models else self.latency
+        with self._lock:
+            if self.latency_distribution == "uniform":
+                value = self._random.uniform(latency - self.latency_spread, latency + self.latency_spread)
+            elif self.latency_distribution == "exponential":
+                value = self._random.expovariate(1 / latency) if latency > 0 else 0.0
+            elif self.latency_distribution == "lognormal":
+                value = self._random.lognormvariate(math.log(latency), self.latency_spread) if latency > 0 else 0.0
+            else:
+                value = latency
+        return max(value, 0.0)
+
+    def _inject(self) -> Optional[int]:
+        """Status code of an injected failure for this request, if any"""
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.error_rate:
+                self.errors += 1
+                return 500
+            if roll < self.error_rate + self.rate_limit_rate:
+                self.rejected += 1
+                return 429
+        return None
+
+    def completion(self, prompt: str) -> str:
+        content = f"Stub response to: {prompt}"
+        if self.completion_words:
+            words = content.split(" ")
+            words += ["lorem"] * max(self.completion_words - len(words), 0)
+            content = " ".join(words[:self.completion_words])
+        return content
+
+    def _admit(self):
+        """Returns (allowed, remaining, seconds until a slot frees up)"""
+        with self._lock:
+            self.requests += 1
+            if self.requests_per_period is None:
+                return True, None, 0.0
+            now = time.monotonic()
+            rate = self.requests_per_period / self.period
+            self._allowance = min(self.requests_per_period,
+                                  self._allowance + (now - self._updated) * rate)
+            self._updated = now
+            if self._allowance < 1:
+                self.rejected += 1
+                return False, 0, (1 - self._allowance) / rate
+            self._allowance -= 1
+            reset = (self.requests_per_period - self._allowance) / rate
+            return True, int(self._allowance), reset
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict, headers: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}}, {})
+                    return
+                model = request.get("model", "stub-model")
+                with stub._lock:
+                    stub.model_requests[model] = stub.model_requests.get(model, 0) + 1
+                if stub.models is not None and model not in stub.models:
+                    self._send_json(404, {"error": {"message": f"The model `{model}` does not exist",
+                                                    "type": "invalid_request_error", "code": "model_not_found"}}, {})
+                    return
+                allowed, remaining, reset = stub._admit()
+                injected = stub._inject()
+                if injected == 500:
+                    self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}}, {})
+                    return
+                if injected == 429:
+                    allowed, remaining, reset = False, 0, stub.retry_after
+                headers = {}
+                if stub.requests_per_period is not None:
+                    headers["x-ratelimit-limit-requests"] = str(stub.requests_per_period)
+                    headers["x-ratelimit-remaining-requests"] = str(remaining)
+                    headers["x-ratelimit-reset-requests"] = f"{reset:.3f}s"
+                if not allowed:
+                    headers["retry-after"] = f"{reset:.3f}"
+                    self._send_json(429, {"error": {"message": "Rate limit reached",
+                                                    "type": "requests", "code": "rate_limit_exceeded"}},
+                                    headers)
+                    return
+
+                time.sleep(stub.sample_latency(model))
+                messages = request.get("messages") or [{}]
+                content = stub.completion(messages[-1].get("content", ""))
+                words = content.split(" ")
+                token_delay = 1 / stub.tokens_per_second if stub.tokens_per_second else 0.0
+                if request.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    for word in words:
+                        if token_delay:
+                            time.sleep(token_delay)
+                        chunk = {"object": "chat.completion.chunk", "model": model,
+                                 "choices": [{"index": 0, "delta": {"content": word + " "}}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.close_connection = True
+                    return
+                time.sleep(token_delay * len(words))
+                prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+                self._send_json(200, {
+                    "id": "stub", "object": "chat.completion", "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                              "total_tokens": prompt_tokens + len(words)},
+                }, headers)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stub OpenAI-compatible chat completions API")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="Time to first token in seconds")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-spread", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--completion-words", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=None)
+    parser.add_argument("--model", action="append", default=[], metavar="NAME=LATENCY",
+                        help="Serve only these models, each with its own latency (repeatable)")
+    cli_args = parser.parse_args()
+    models = {name: float(latency) for name, _, latency in (m.partition("=") for m in cli_args.model)}
+    stub = StubLLMServer(port=cli_args.port, latency=cli_args.latency,
+                         requests_per_period=cli_args.requests_per_minute,
+                         latency_distribution=cli_args.latency_distribution,
+                         latency_spread=cli_args.latency_spread,
+                         tokens_per_second=cli_args.tokens_per_second,
+                         completion_words=cli_args.completion_words,
+                         error_rate=cli_args.error_rate, rate_limit_rate=cli_args.rate_limit_rate,
+                         models=models or None)
+    print(f"🧪 Stub LLM serving at {stub.base_url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,213 @@
+"""
+Offline benchmark suite
+Points the real agents at a local stub LLM server through LLM_BASE_URL and
+measures single agent calls, the Team Preparation workflow from run.py, a
+large synthetic DAG and concurrent load on api.py. Results (p50/p95/p99
+latency, throughput, error rate and RSS per scenario) are printed as one
+JSON document so runs can be compared over time.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_store_memory import rss_mb
+from stub_llm import LATENCY_DISTRIBUTIONS, StubLLMServer
+
+SCENARIOS = ("agent", "workflow_sequential", "workflow_parallel", "dag", "api")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    requests = len(latencies) + errors
+    return {
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "rss_mb": round(rss_mb(), 1),
+        "peak_rss_mb": round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, rss_mb()), 1),
+    }
+
+
+async def measure(call: Callable[[int], Awaitable[Any]], requests: int, concurrency: int) -> Dict[str, Any]:
+    """Run call(0..requests-1) with at most `concurrency` in flight"""
+    latencies: List[float] = []
+    errors = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with limit:
+            start = time.perf_counter()
+            try:
+                await call(i)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def run_scenario(name: str, cli_args) -> Dict[str, Any]:
+    # Imported late so the LLM settings from the environment point at the stub
+    import api
+    import run
+    from orchestrator import TaskStatus, WorkflowType
+
+    orchestrator = api.orchestrator
+    if name == "agent":
+        agent = orchestrator.agents["bowling_coach"]
+        return await measure(
+            lambda i: orchestrator.call_agent("bowling_coach", "train_bowling", agent.train_bowling,
+                                              {"player_name": f"Player {i}"}),
+            cli_args.requests, cli_args.concurrency)
+
+    if name in ("workflow_sequential", "workflow_parallel"):
+        workflow_type = WorkflowType.SEQUENTIAL if name == "workflow_sequential" else WorkflowType.PARALLEL
+
+        async def run_workflow(i: int):
+            workflow_id = run.build_team_workflow(orchestrator, workflow_type)
+            await orchestrator.execute_workflow(workflow_id)
+            if orchestrator.workflows[workflow_id].status != TaskStatus.COMPLETED:
+                raise RuntimeError(f"Workflow {workflow_id} did not complete")
+
+        return await measure(run_workflow, cli_args.workflows, cli_args.workflow_concurrency)
+
+    if name == "dag":
+        rng = random.Random(cli_args.dag_size)
+        calls = list(api.AGENT_METHODS.items())
+        workflow_id = orchestrator.create_workflow("Synthetic DAG", WorkflowType.PARALLEL,
+                                                   max_concurrency=cli_args.concurrency)
+        ids = []
+        for i in range(cli_args.dag_size):
+            agent_type, (method, arg_name) = calls[i % len(calls)]
+            dependencies = rng.sample(ids, min(len(ids), rng.randint(0, 3)))
+            ids.append(orchestrator.add_task_to_workflow(
+                workflow_id, agent_type, method, {arg_name: f"Player {i}"}, dependencies))
+        start = time.perf_counter()
+        await orchestrator.execute_workflow(workflow_id)
+        elapsed = time.perf_counter() - start
+        workflow = orchestrator.workflows[workflow_id]
+        latencies = [(task.completed_at - task.started_at).total_seconds() for task in workflow.tasks
+                     if task.status == TaskStatus.COMPLETED]
+        return summarize(latencies, len(workflow.tasks) - len(latencies), elapsed)
+
+    if name == "api":
+        import httpx
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def post(i: int):
+                response = await client.post("/api/agent/execute", json={
+                    "agent_type": "head_physio", "input_data": f"Player {i}"})
+                response.raise_for_status()
+
+            return await measure(post, cli_args.requests, cli_args.concurrency)
+
+    raise ValueError(f"Unknown scenario {name}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def main(cli_args) -> Dict[str, Any]:
+    import api
+    scenarios = {}
+    # Progress prints would dominate the measurement and garble the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        api.orchestrator.initialize_agents()
+        for name in cli_args.scenarios:
+            scenarios[name] = await run_scenario(name, cli_args)
+    await api.llm_executor.aclose()
+    return scenarios
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Calls for the agent and api scenarios")
+    parser.add_argument("--concurrency", type=int, default=16, help="Calls in flight at once")
+    parser.add_argument("--workflows", type=int, default=20, help="Team Preparation workflows to run")
+    parser.add_argument("--workflow-concurrency", type=int, default=4)
+    parser.add_argument("--dag-size", type=int, default=1000, help="Tasks in the synthetic DAG")
+    parser.add_argument("--base-url", default=None,
+                        help="Use an already running stub instead of starting one in-process")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--completion-words", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    cli_args = parser.parse_args()
+
+    server = None
+    base_url = cli_args.base_url
+    if base_url is None:
+        server = StubLLMServer(latency=cli_args.latency, latency_distribution=cli_args.latency_distribution,
+                               latency_spread=cli_args.latency_spread,
+                               tokens_per_second=cli_args.tokens_per_second,
+                               completion_words=cli_args.completion_words, error_rate=cli_args.error_rate,
+                               rate_limit_rate=cli_args.rate_limit_rate, seed=cli_args.seed).start()
+        base_url = server.base_url
+    # Every call must reach the stub: no caches, no client-side rate limit, in-memory store
+    os.environ.update({"LLM_BASE_URL": base_url, "GROQ_API_KEY": "stub", "LLM_CACHE_SIZE": "0",
+                       "LLM_RPM": "0", "LLM_TPM": "0", "WORKFLOW_STORE": "memory",
+                       "TASK_RESULT_CACHE_SIZE": "0"})
+    try:
+        results = asyncio.run(main(cli_args))
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(cli_args).items() if key not in ("output", "scenarios")},
+        "stub": {"requests": server.requests, "errors_injected": server.errors,
+                 "rate_limited": server.rejected} if server is not None else None,
+        "scenarios": results,
+    }
+    print(json.dumps(report, indent=2))
+    if cli_args.output:
+        with open(cli_args.output, "w") as output:
+            json.dump(report, output, indent=2)
@@ -0,0 +1,281 @@
+"""
+Bulk workflow runner
+Runs the Team Preparation workflow from run.py once per row of a CSV or
+JSONL file (one row per fixture and squad member, say), with a global limit
+on workflows in flight. Rows are read as they are needed and results are
+appended to a JSONL file as workflows finish, so memory stays flat however
+long the input is. A checkpoint next to the output records which rows are
+done; running the same command again after an interruption picks up where
+it stopped.
+
+Row fields (all optional): id, match_info, player_name (sets batter, bowler
+and squad at once), batter, bowler, squad, workflow_type, max_concurrency,
+task_timeout, max_retries. Workflows run their tasks in parallel unless a
+row sets workflow_type to sequential.
+
+    python bulk_run.py fixtures.csv results.jsonl --concurrency 16
+"""
+
+from dotenv import load_dotenv
+
+# Settings are read as the modules below are imported
+load_dotenv()
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from memo import create_result_cache
+from orchestrator import MultiAgentOrchestrator, WorkflowType
+from policy import TaskPolicy
+from run import build_team_workflow
+from scheduler import Priority, use_call_class
+
+# How many rows past the oldest unfinished one may be started, bounding the checkpoint
+WINDOW_PER_WORKER = 64
+ROW_FIELDS = {"id", "match_info", "player_name", "batter", "bowler", "squad", "workflow_type",
+              "max_concurrency", "task_timeout", "max_retries"}
+
+
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows of a CSV (with a header) or JSONL file, one at a time"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                yield {key: value for key, value in row.items() if key and value not in (None, "")}
+
+
+def count_rows(path: str) -> int:
+    return sum(1 for _ in read_rows(path))
+
+
+def workflow_options(row: Dict[str, Any]) -> Dict[str, Any]:
+    """build_team_workflow() arguments for a row"""
+    unknown = set(row) - ROW_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    options: Dict[str, Any] = {}
+    if "player_name" in row:
+        options.update(batter=row["player_name"], bowler=row["player_name"], squad=row["player_name"])
+    for key in ("match_info", "batter", "bowler", "squad"):
+        if key in row:
+            options[key] = str(row[key])
+    options["workflow_type"] = WorkflowType(row.get("workflow_type", WorkflowType.PARALLEL.value))
+    if "max_concurrency" in row:
+        options["max_concurrency"] = int(row["max_concurrency"])
+    if "task_timeout" in row or "max_retries" in row:
+        options["policy"] = TaskPolicy(
+            timeout=float(row["task_timeout"]) if "task_timeout" in row else None,
+            max_retries=int(row["max_retries"]) if "max_retries" in row else None,
+        )
+    return options
+
+
+class Checkpoint:
+    """Rows below `watermark`, plus those in `done`, have their results in the output.
+
+    Saved atomically after every row along with the output size at that
+    point; on resume the output is cut back to that size, so a result
+    written just before a crash is redone rather than duplicated.
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = input_path
+        self.watermark = 0
+        self.done: Set[int] = set()
+        self.output_bytes = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    @classmethod
+    def load(cls, path: str, input_path: str) -> "Checkpoint":
+        checkpoint = cls(path, input_path)
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if os.path.abspath(state["input"]) != os.path.abspath(input_path):
+            raise ValueError(f"Checkpoint {path} belongs to {state['input']}; use --restart to start over")
+        checkpoint.watermark = state["watermark"]
+        checkpoint.done = set(state["done"])
+        checkpoint.output_bytes = state["output_bytes"]
+        checkpoint.succeeded = state["succeeded"]
+        checkpoint.failed = state["failed"]
+        return checkpoint
+
+    def is_done(self, index: int) -> bool:
+        return index < self.watermark or index in self.done
+
+    def mark_done(self, index: int, succeeded: bool, output_bytes: int):
+        self.done.add(index)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.output_bytes = output_bytes
+        self.save()
+
+    def save(self):
+        state = {"input": self.input_path, "watermark": self.watermark, "done": sorted(self.done),
+                 "output_bytes": self.output_bytes, "succeeded": self.succeeded, "failed": self.failed}
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temporary, self.path)
+
+
+class Progress:
+    """Periodic done/throughput/ETA line on stderr"""
+
+    def __init__(self, total: Optional[int], already_done: int, interval: float):
+        self.total = total
+        self.done = already_done
+        self.failed = 0
+        self.started_with = already_done
+        self.interval = interval
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, succeeded: bool, force: bool = False):
+        self.done += 1
+        if not succeeded:
+            self.failed += 1
+        self.report(force)
+
+    def report(self, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        elapsed = now - self.start
+        rate = (self.done - self.started_with) / elapsed if elapsed > 0 else 0.0
+        line = f"📊 {self.done}"
+        if self.total is not None:
+            line += f"/{self.total} ({self.done / max(self.total, 1):.1%})"
+        line += f" done, {self.failed} failed this run | {rate:.2f} workflows/s"
+        if self.total is not None and rate > 0:
+            remaining = (self.total - self.done) / rate
+            line += f" | ETA {int(remaining // 3600):02d}:{int(remaining % 3600 // 60):02d}:{int(remaining % 60):02d}"
+        print(line, file=sys.stderr, flush=True)
+
+
+async def run_row(orchestrator: MultiAgentOrchestrator, index: int, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one row's workflow and return its output record"""
+    record: Dict[str, Any] = {"index": index, "id": row.get("id", index), "params": row}
+    start = time.perf_counter()
+    try:
+        options = workflow_options(row)
+    except (ValueError, TypeError) as e:
+        record.update(status="invalid", error=str(e), elapsed_s=0.0)
+        return record
+    workflow_id = None
+    try:
+        workflow_id = build_team_workflow(orchestrator, **options)
+        workflow = orchestrator.workflows[workflow_id]
+        await orchestrator.execute_workflow(workflow_id)
+        record["status"] = workflow.status.value
+        record["tasks"] = [{"agent": task.agent_type, "method": task.method, "status": task.status.value,
+                            "result": task.result, "error": task.error} for task in workflow.tasks]
+    except Exception as e:
+        record.update(status="failed", error=str(e))
+    finally:
+        # Finished workflows live on only in the output file
+        if workflow_id is not None and workflow_id in orchestrator.workflows:
+            del orchestrator.workflows[workflow_id]
+    record["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+async def run_bulk(input_path: str, output_path: str, concurrency: int, checkpoint: Checkpoint,
+                   max_tasks: Optional[int], progress: Progress, verbose: bool) -> Tuple[int, int]:
+    orchestrator = MultiAgentOrchestrator(max_concurrency=max_tasks, result_cache=create_result_cache())
+    window = concurrency * WINDOW_PER_WORKER
+    rows = ((index, row) for index, row in enumerate(read_rows(input_path)) if not checkpoint.is_done(index))
+    room = asyncio.Condition()
+
+    # Per-task chatter from the orchestrator would drown the progress line
+    with open(output_path, "a", encoding="utf-8") as output, open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        orchestrator.initialize_agents()
+
+        async def worker():
+            for index, row in rows:
+                # Don't run too far ahead of the oldest unfinished row
+                async with room:
+                    await room.wait_for(lambda: index - checkpoint.watermark < window)
+                record = await run_row(orchestrator, index, row)
+                output.write(json.dumps(record, default=str) + "\n")
+                output.flush()
+                succeeded = record["status"] == "completed"
+                checkpoint.mark_done(index, succeeded, output.tell())
+                progress.update(succeeded)
+                async with room:
+                    room.notify_all()
+
+        # Behind interactive and workflow traffic when sharing a scheduler with them
+        with use_call_class(Priority.BULK, "bulk_run"):
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+    if orchestrator.result_cache is not None:
+        orchestrator.result_cache.close()
+    progress.report(force=True)
+    return checkpoint.succeeded, checkpoint.failed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV (with a header row) or JSONL file of workflow parameters")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workflows running at once")
+    parser.add_argument("--max-tasks", type=int, default=None,
+                        help="Tasks running at once across all workflows (default: no limit)")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--no-count", action="store_true", help="Skip counting input rows (no ETA)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the orchestrator's per-task output")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    if os.path.exists(checkpoint_path) and not args.restart:
+        try:
+            checkpoint = Checkpoint.load(checkpoint_path, args.input)
+        except ValueError as e:
+            parser.error(str(e))
+        if not os.path.exists(args.output) or os.path.getsize(args.output) < checkpoint.output_bytes:
+            parser.error(f"{args.output} is shorter than {checkpoint_path} records; use --restart to start over")
+        # Drop results written after the last checkpoint; those rows run again
+        with open(args.output, "a", encoding="utf-8") as output:
+            output.truncate(checkpoint.output_bytes)
+        print(f"🔁 Resuming: {checkpoint.succeeded + checkpoint.failed} rows already done", file=sys.stderr)
+    else:
+        checkpoint = Checkpoint(checkpoint_path, args.input)
+        open(args.output, "w").close()
+        checkpoint.save()
+
+    already_done = checkpoint.succeeded + checkpoint.failed
+    progress = Progress(None if args.no_count else count_rows(args.input), already_done, args.progress_interval)
+    try:
+        succeeded, failed = asyncio.run(run_bulk(args.input, args.output, max(args.concurrency, 1), checkpoint,
+                                                 args.max_tasks, progress, args.verbose))
+    except KeyboardInterrupt:
+        print(f"\n🛑 Interrupted; rerun the same command to resume from {checkpoint_path}", file=sys.stderr)
+        return 130
+    print(f"✅ {succeeded} workflows completed, {failed} failed or invalid; results in {args.output}",
+          file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Response cache for LLM completions
+In-memory LRU with TTL and size bounds, optionally written through to SQLite
+(off the event loop) so warm results survive restarts
+"""
+
+import asyncio
+import atexit
+import contextlib
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+
+class CacheMode(Enum):
+    DEFAULT = "default"    # read and write the cache
+    REFRESH = "refresh"    # skip the lookup but store the fresh result
+    BYPASS = "bypass"      # neither read nor write
+
+# Cache mode for the current request, inherited by tasks it spawns
+cache_mode = ContextVar("cache_mode", default=CacheMode.DEFAULT)
+
+
+@contextlib.contextmanager
+def use_cache_mode(mode: CacheMode):
+    token = cache_mode.set(mode)
+    try:
+        yield
+    finally:
+        cache_mode.reset(token)
+
+
+def cache_mode_for(bypass: bool = False, refresh: bool = False) -> CacheMode:
+    """Map the per-request API flags onto a CacheMode"""
+    if bypass:
+        return CacheMode.BYPASS
+    if refresh:
+        return CacheMode.REFRESH
+    return CacheMode.DEFAULT
+
+
+def make_key(model: str, preamble: str, prompt: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model or "", preamble or "", prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of completions keyed on model, preamble and prompt
+
+    With a SQLite path, writes are queued without blocking and committed in
+    batches by a background thread, and `aget` reads the file on a worker
+    thread, so neither holds up the event loop on disk I/O.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600,
+                 path: Optional[str] = None, table: str = "responses", max_queued: int = 10000,
+                 batch_size: int = 500):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.table = table
+        self.batch_size = batch_size
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes: "queue.Queue[Optional[Tuple]]" = queue.Queue(maxsize=max_queued)
+        self._writer: Optional[threading.Thread] = None
+        # Entries queued for SQLite but not yet committed, so an evicted one is still found
+        self._pending: Dict[str, Tuple[float, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dropped_writes = 0
+        if path:
+            self._db = self._connect()
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, created_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        # WAL and a busy timeout let several API workers (and our writer thread) share the file
+        db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, entry: Tuple[float, str]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _cached(self, key: str) -> Optional[Tuple[float, str]]:
+        """Entry held in memory, if any and still fresh"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                entry = self._pending.get(key)
+                if entry is not None and self._expired(entry[0]):
+                    entry = None
+            return entry
+
+    def _load(self, key: str) -> Optional[Tuple[float, str]]:
+        """Read an entry from SQLite into memory; blocking"""
+        with self._db_lock:
+            row = self._db.execute(
+                f"SELECT created_at, value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self._expired(row[0]):
+            self._write(("delete", key))
+            return None
+        with self._lock:
+            self._remember(key, row)
+        return row
+
+    def _count(self, key: str, entry: Optional[Tuple[float, str]]) -> Optional[str]:
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get(self, key: str) -> Optional[str]:
+        """Look a key up, reading SQLite on the calling thread on a memory miss"""
+        entry = self._cached(key)
+        if entry is None and self._db is not None:
+            entry = self._load(key)
+        return self._count(key, entry)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Like get, but a SQLite read runs on a worker thread instead of the event loop"""
+        entry = self._cached(key)
+        if entry is None and self._db is not None:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self._load, key)
+        return self._count(key, entry)
+
+    def set(self, key: str, value: str):
+        entry = (time.time(), value)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._pending[key] = entry
+        if self._db is not None:
+            self._write(("set", key, entry[0], value))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+        if self._db is not None:
+            self._write(("clear",))
+
+    def _write(self, op: Tuple):
+        """Queue a write for the writer thread; never blocks, dropping it if the writer has fallen behind"""
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name=f"cache-{self.table}", daemon=True)
+                    self._writer.start()
+                    # Scripts that never close the cache still get their writes out
+                    atexit.register(self.close)
+        try:
+            self._writes.put_nowait(op)
+        except queue.Full:
+            self.dropped_writes += 1
+            if op[0] == "set":
+                self._committed([op])
+
+    def _run(self):
+        db = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                op = self._writes.get()
+                batch = []
+                while op is not None:
+                    batch.append(op)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        op = self._writes.get_nowait()
+                    except queue.Empty:
+                        break
+                stopping = op is None
+                # One transaction per batch
+                for kind, *args in batch:
+                    if kind == "set":
+                        db.execute(
+                            f"INSERT OR REPLACE INTO {self.table} (key, created_at, value) VALUES (?, ?, ?)", args
+                        )
+                    elif kind == "delete":
+                        db.execute(f"DELETE FROM {self.table} WHERE key = ?", args)
+                    else:
+                        db.execute(f"DELETE FROM {self.table}")
+                if batch:
+                    db.commit()
+                    self._committed(batch)
+        finally:
+            db.close()
+
+    def _committed(self, batch: List[Tuple]):
+        """Forget pending entries that are now in SQLite (or were dropped)"""
+        with self._lock:
+            for kind, *args in batch:
+                if kind == "set" and self._pending.get(args[0], (None,))[0] == args[1]:
+                    del self._pending[args[0]]
+
+    def close(self, timeout: float = 5.0):
+        """Write out whatever is queued and stop the writer thread"""
+        if self._writer is None:
+            return
+        self._writes.put(None)
+        self._writer.join(timeout)
+        self._writer = None
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "persistent": self._db is not None,
+            "queued_writes": self._writes.qsize(),
+            "dropped_writes": self.dropped_writes,
+        }
@@ -0,0 +1,142 @@
+"""
+Structured LLM call log
+One compact JSON line per completion (agent, model, status, latency, token
+counts and a hash of the prompt rather than the prompt itself). Records are
+queued without blocking and written by a background thread, which rotates
+the file by size. Successful calls can be sampled; failures are always kept.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+from typing import Any, Dict, Optional
+
+LOG_PATH = os.getenv("LLM_CALL_LOG_PATH")
+LOG_MAX_BYTES = int(os.getenv("LLM_CALL_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LLM_CALL_LOG_BACKUPS", "5"))
+LOG_SAMPLE_RATE = float(os.getenv("LLM_CALL_LOG_SAMPLE_RATE", "1"))
+
+# Statuses that are only logged at the sample rate
+SAMPLED_STATUSES = ("success", "cache_hit")
+
+
+def prompt_hash(preamble: str, prompt: str) -> str:
+    """Short, stable identifier of a preamble and prompt pair"""
+    digest = hashlib.sha256()
+    for part in (preamble or "", prompt or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class CallLogger:
+    """Buffered JSONL writer with size-based rotation and sampling"""
+
+    def __init__(self, path: str, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS,
+                 sample_rate: float = LOG_SAMPLE_RATE, max_queued: int = 10000,
+                 flush_interval: float = 1.0, batch_size: int = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queued)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.rotations = 0
+
+    def log(self, record: Dict[str, Any]):
+        """Queue a record; never blocks, dropping it if the writer has fallen behind"""
+        if self.sample_rate < 1 and record.get("status") in SAMPLED_STATUSES:
+            if random.random() >= self.sample_rate:
+                self.sampled_out += 1
+                return
+            record["sample_rate"] = self.sample_rate
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="llm-call-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        output = open(self.path, "a", encoding="utf-8")
+        try:
+            stopping = False
+            while not stopping:
+                try:
+                    record = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = []
+                while record is not None:
+                    batch.append(json.dumps(record, separators=(",", ":"), default=str))
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                stopping = record is None
+                if batch:
+                    output.write("\n".join(batch) + "\n")
+                    output.flush()
+                    self.written += len(batch)
+                    if output.tell() >= self.max_bytes:
+                        output = self._rotate(output)
+        finally:
+            output.close()
+
+    def _rotate(self, output):
+        """Shift path.N-1 -> path.N ... path -> path.1 and start a new file"""
+        output.close()
+        if self.backups > 0:
+            for index in range(self.backups - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        return open(self.path, "a", encoding="utf-8")
+
+    def close(self, timeout: float = 5.0):
+        """Write out whatever is queued and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "written": self.written,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "rotations": self.rotations,
+            "sample_rate": self.sample_rate,
+        }
+
+
+def create_call_logger() -> Optional[CallLogger]:
+    """Call logger configured by LLM_CALL_LOG_*, or None when LLM_CALL_LOG_PATH is unset"""
+    return CallLogger(LOG_PATH) if LOG_PATH else None
@@ -0,0 +1,137 @@
+"""
+Agent catalog served by GET /api/agents
+Built-in agents followed by the custom agents in the agent store. Pages are
+serialized once and reused until a custom agent is added, changed or
+deleted, each with an ETag so unchanged polls can be answered with 304.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from store import AgentStore
+
+# Built-in agents, as shown in the dashboard
+BASE_AGENTS = [
+    {
+        "id": "head_coach",
+        "name": "Head Coach",
+        "role": "Strategic Planning & Team Guidance",
+        "description": "Plans strategies, analyzes opponents, and guides the team",
+        "icon": "🎯",
+        "color": "blue",
+        "capabilities": [
+            "Match Strategy Planning",
+            "Opponent Analysis",
+            "Team Motivation",
+            "Game Plan Development"
+        ]
+    },
+    {
+        "id": "batting_coach",
+        "name": "Batting Coach",
+        "role": "Batting Excellence",
+        "description": "Improves batting performance and provides training routines",
+        "icon": "🏏",
+        "color": "green",
+        "capabilities": [
+            "Technique Improvement",
+            "Training Drills",
+            "Weakness Analysis",
+            "Performance Enhancement"
+        ]
+    },
+    {
+        "id": "bowling_coach",
+        "name": "Bowling Coach",
+        "role": "Bowling Mastery",
+        "description": "Analyzes bowling performance and provides expert coaching",
+        "icon": "⚡",
+        "color": "red",
+        "capabilities": [
+            "Performance Analysis",
+            "Skill Development",
+            "Strategy Design",
+            "Technical Guidance"
+        ]
+    },
+    {
+        "id": "head_physio",
+        "name": "Head Physio",
+        "role": "Health & Fitness",
+        "description": "Monitors fitness, recovery and injury prevention",
+        "icon": "💪",
+        "color": "purple",
+        "capabilities": [
+            "Fitness Assessment",
+            "Injury Prevention",
+            "Recovery Plans",
+            "Health Monitoring"
+        ]
+    },
+    {
+        "id": "player",
+        "name": "Player",
+        "role": "Performance Execution",
+        "description": "Executes skills and reports performance feedback",
+        "icon": "👤",
+        "color": "orange",
+        "capabilities": [
+            "Skill Execution",
+            "Performance Reporting",
+            "Training Feedback",
+            "Self-Assessment"
+        ]
+    }
+]
+
+BASE_AGENT_IDS = frozenset(agent["id"] for agent in BASE_AGENTS)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names the given ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class AgentCatalog:
+    """Serialized, paginated agent listings cached per agent store version"""
+
+    def __init__(self, store: AgentStore, max_pages: int = 256):
+        self.store = store
+        self.max_pages = max_pages
+        self._version: Optional[int] = None
+        self._agents: List[Dict[str, Any]] = []
+        # Lower-cased role -> agents with that role, in listing order
+        self._by_role: Dict[str, List[Dict[str, Any]]] = {}
+        # (role, offset, limit) -> (JSON body, ETag)
+        self._pages: Dict[Tuple[Optional[str], int, Optional[int]], Tuple[bytes, str]] = {}
+
+    def _refresh(self):
+        version = self.store.version()
+        if version == self._version:
+            return
+        agents = BASE_AGENTS + self.store.list()
+        by_role: Dict[str, List[Dict[str, Any]]] = {}
+        for agent in agents:
+            by_role.setdefault(agent["role"].lower(), []).append(agent)
+        self._agents, self._by_role, self._pages = agents, by_role, {}
+        self._version = version
+
+    def page(self, role: Optional[str] = None, offset: int = 0,
+             limit: Optional[int] = None) -> Tuple[bytes, str]:
+        """JSON body and ETag for one page of agents, optionally of a single role"""
+        self._refresh()
+        key = (role.lower() if role else None, offset, limit)
+        cached = self._pages.get(key)
+        if cached is None:
+            agents = self._agents if key[0] is None else self._by_role.get(key[0], [])
+            stop = offset + limit if limit is not None else None
+            body = json.dumps({"agents": agents[offset:stop], "total": len(agents)}).encode()
+            cached = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+            if len(self._pages) >= self.max_pages:
+                self._pages.clear()
+            self._pages[key] = cached
+        return cached
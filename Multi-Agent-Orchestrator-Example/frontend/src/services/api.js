@@ -21,16 +21,36 @@ export const executeAgent = async (agentType, inputData) => {
   return response.data;
 };
 
-export const executeWorkflow = async (matchInfo, playerName) => {
+export const executeWorkflow = async (matchInfo, playerName, workflowType = 'parallel') => {
   const response = await api.post('/api/workflow/execute', {
     match_info: matchInfo,
     player_name: playerName,
+    workflow_type: workflowType,
   });
   return response.data;
 };
 
-export const fetchWorkflows = async () => {
-  const response = await api.get('/api/workflows');
+export const fetchWorkflows = async (params = {}) => {
+  const response = await api.get('/api/workflows', { params });
+  return response.data;
+};
+
+export const submitWorkflow = async (matchInfo, playerName, workflowType = 'parallel') => {
+  const response = await api.post('/api/workflows', {
+    match_info: matchInfo,
+    player_name: playerName,
+    workflow_type: workflowType,
+  });
+  return response.data;
+};
+
+export const fetchWorkflow = async (workflowId) => {
+  const response = await api.get(`/api/workflows/${workflowId}`);
+  return response.data;
+};
+
+export const cancelWorkflow = async (workflowId) => {
+  const response = await api.delete(`/api/workflows/${workflowId}`);
   return response.data;
 };
 
@@ -0,0 +1,146 @@
+"""
+Background job runner for submitted workflows
+Workflows are queued on submission and executed by a fixed number of
+workers, so API handlers return immediately and load stays bounded. With
+an admission controller, each run also holds one of its slots.
+"""
+
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+from admission import AdmissionController, OverloadedError
+from cache import cache_mode, use_cache_mode
+from orchestrator import MultiAgentOrchestrator, TaskStatus
+from routing import route_mode, use_route_mode
+from scheduler import call_class, use_call_class
+
+DEFAULT_WORKERS = int(os.getenv("WORKFLOW_WORKERS", "4"))
+DEFAULT_MAX_QUEUED = int(os.getenv("WORKFLOW_QUEUE_SIZE", "1000"))
+# How often to look for cancellations requested through another process
+CANCEL_POLL_INTERVAL = float(os.getenv("WORKFLOW_CANCEL_POLL_INTERVAL", "1"))
+
+
+class QueueFullError(Exception):
+    """Raised when a workflow is submitted while the queue is at capacity"""
+
+
+class WorkflowJobRunner:
+    """Executes submitted workflows in the background with bounded concurrency"""
+
+    def __init__(self, orchestrator: MultiAgentOrchestrator, workers: int = DEFAULT_WORKERS,
+                 max_queued: int = DEFAULT_MAX_QUEUED, admission: Optional[AdmissionController] = None):
+        self.orchestrator = orchestrator
+        self.workers = workers
+        self.max_queued = max_queued
+        # Shared with the synchronous workflow endpoints, so background runs count against the same limit
+        self.admission = admission
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        if self.orchestrator.workflows.shared:
+            self._workers.append(asyncio.ensure_future(self._watch_cancellations()))
+        print(f"🧵 Workflow job runner started with {self.workers} workers")
+
+    async def stop(self):
+        for task in list(self._running.values()) + self._workers:
+            task.cancel()
+        await asyncio.gather(*self._running.values(), *self._workers, return_exceptions=True)
+        self._workers = []
+        self._running.clear()
+
+    def submit(self, workflow_id: str):
+        """Queue a workflow; it inherits the caller's cache mode and call class"""
+        if self._queue is None:
+            raise RuntimeError("Job runner is not started")
+        try:
+            self._queue.put_nowait((workflow_id, cache_mode.get(), call_class.get(), route_mode.get()))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Workflow queue is full ({self.max_queued} queued)")
+        # Let other processes sharing the store see it while it is queued
+        self.orchestrator.workflows.update(self.orchestrator.workflows[workflow_id])
+
+    def cancel(self, workflow_id: str) -> bool:
+        """Cancel a queued or running workflow. Returns False if it already finished
+        or belongs to another process."""
+        if workflow_id in self._running:
+            self._running[workflow_id].cancel()
+            return True
+        if not self.orchestrator.workflows.is_live(workflow_id):
+            return False
+        workflow = self.orchestrator.workflows[workflow_id]
+        if workflow.status == TaskStatus.PENDING:
+            # Still queued: the worker skips it when dequeued
+            self.orchestrator.mark_workflow_cancelled(workflow_id)
+            return True
+        return False
+
+    async def _worker(self):
+        while True:
+            workflow_id, mode, priority_class, routing = await self._queue.get()
+            try:
+                if not self._runnable(workflow_id):
+                    continue
+                await self._admit()
+                start = asyncio.get_running_loop().time()
+                try:
+                    # It may have been cancelled while waiting for its slot
+                    if not self._runnable(workflow_id):
+                        continue
+                    with use_cache_mode(mode), use_call_class(*priority_class), use_route_mode(routing):
+                        run = asyncio.ensure_future(self.orchestrator.execute_workflow(workflow_id))
+                    self._running[workflow_id] = run
+                    try:
+                        await run
+                    except asyncio.CancelledError:
+                        if not run.cancelled():
+                            raise
+                    except Exception as e:
+                        print(f"❌ Workflow {workflow_id} failed: {e}")
+                    finally:
+                        self._running.pop(workflow_id, None)
+                finally:
+                    if self.admission is not None:
+                        self.admission.release(asyncio.get_running_loop().time() - start)
+            finally:
+                self._queue.task_done()
+
+    def _runnable(self, workflow_id: str) -> bool:
+        """Whether a dequeued workflow is still pending, marking it cancelled if another process asked"""
+        workflow = self.orchestrator.workflows.get(workflow_id)
+        if workflow is None or workflow.status != TaskStatus.PENDING:
+            return False
+        if self.orchestrator.workflows.cancel_requested([workflow_id]):
+            self.orchestrator.mark_workflow_cancelled(workflow_id)
+            return False
+        return True
+
+    async def _admit(self):
+        """Wait for a workflow slot; a background job has nobody to send a 503 to, so it just tries again"""
+        if self.admission is None:
+            return
+        while True:
+            try:
+                await self.admission.acquire()
+                return
+            except OverloadedError as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def _watch_cancellations(self):
+        """Cancel running workflows that another process asked to stop"""
+        while True:
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+            for workflow_id in self.orchestrator.workflows.cancel_requested(list(self._running)):
+                self.cancel(workflow_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+        }
@@ -0,0 +1,470 @@
+"""
+Async LLM call layer shared by the cricket agents
+Every agent goes through one pooled HTTP client for the OpenAI-compatible
+chat completions API. Without httpx, blocking alith calls run on a
+dedicated, bounded thread pool so the event loop stays free while
+completions are in flight.
+"""
+
+import asyncio
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# httpx is only imported when the first client connects, keeping it off the start-up path.
+# Without it, calls fall back to alith on the thread pool, without token streaming.
+HTTPX = importlib.util.find_spec("httpx") is not None
+
+from admission import DeadlineExceededError, remaining_time
+from cache import CacheMode, ResponseCache, cache_mode, make_key
+from calllog import CallLogger, create_call_logger, prompt_hash
+from metrics import (LLM_RATE_LIMIT_WAIT_SECONDS, LLM_REQUESTS, LLM_REQUEST_SECONDS, LLM_ROUTE_DECISIONS,
+                     LLM_ROUTE_FALLBACKS, LLM_TOKENS, registry)
+from ratelimit import RateLimiter, estimate_tokens
+from routing import ENDPOINTS, ModelRouter
+from scheduler import FairScheduler, Priority, create_scheduler
+
+DEFAULT_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 needs the optional h2 package
+HTTP2 = os.getenv("LLM_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+DEFAULT_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+# Client-side rate limits; off (0) unless configured for the provider's plan
+RATE_LIMIT_RPM = float(os.getenv("LLM_RPM", "0"))
+RATE_LIMIT_TPM = float(os.getenv("LLM_TPM", "0"))
+RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+# Expected completion length, used to budget tokens before a call
+COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "512"))
+# Pause after a rate-limit error that carries no Retry-After information
+RATE_LIMIT_BACKOFF = 5.0
+
+# Receives completion text as it arrives, for callers that stream output
+token_sink = ContextVar("token_sink", default=None)
+
+
+@contextlib.contextmanager
+def use_token_sink(sink: Callable[[str], None]):
+    token = token_sink.set(sink)
+    try:
+        yield
+    finally:
+        token_sink.reset(token)
+
+
+def _messages(preamble: str, prompt: str):
+    return [{"role": "system", "content": preamble}, {"role": "user", "content": prompt}]
+
+
+class LLMClient:
+    """One pooled, keep-alive HTTP client shared by every agent.
+
+    The API key is read on first use so it can come from a .env file
+    loaded after import.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, api_key: Optional[str] = None,
+                 max_connections: int = MAX_CONNECTIONS,
+                 max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = KEEPALIVE_EXPIRY, http2: bool = HTTP2):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.limits = {"max_connections": max_connections,
+                       "max_keepalive_connections": max_keepalive_connections,
+                       "keepalive_expiry": keepalive_expiry}
+        self.http2 = http2
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        # Connections belong to an event loop; rebuild the pool if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            import httpx
+            api_key = self.api_key or os.getenv("GROQ_API_KEY")
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {api_key}"},
+                limits=httpx.Limits(**self.limits),
+                http2=self.http2,
+                timeout=None,
+            )
+            self._loop = loop
+        return self._client
+
+    async def complete(self, model: str, preamble: str, prompt: str,
+                       limiter: Optional[RateLimiter] = None) -> Tuple[str, Dict[str, Any]]:
+        """Chat completion; returns the text and the provider's usage block"""
+        response = await self._get_client().post("chat/completions", json={
+            "model": model, "messages": _messages(preamble, prompt),
+        })
+        if limiter is not None:
+            limiter.update_from_headers(response.headers)
+        response.raise_for_status()
+        data = response.json()
+        return data["choices"][0]["message"]["content"], data.get("usage") or {}
+
+    async def stream(self, model: str, preamble: str, prompt: str, sink: Callable[[str], None],
+                     limiter: Optional[RateLimiter] = None) -> str:
+        """Streaming chat completion, passing each text delta to sink"""
+        payload = {"model": model, "stream": True, "messages": _messages(preamble, prompt)}
+        parts = []
+        async with self._get_client().stream("POST", "chat/completions", json=payload) as response:
+            if limiter is not None:
+                limiter.update_from_headers(response.headers)
+            if response.status_code >= 400:
+                await response.aread()
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    sink(delta)
+        return "".join(parts)
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+def _alith_prompt(model: str, base_url: str, preamble: str, prompt: str) -> str:
+    """Blocking completion through alith, used when httpx is not installed"""
+    from alith import Agent
+    agent = Agent(model=model, base_url=base_url, api_key=os.getenv("GROQ_API_KEY"),
+                  preamble=preamble)
+    return agent.prompt(prompt)
+
+
+class LLMExecutor:
+    """Runs agent completions with caching, rate limiting and per-call timeouts.
+
+    Agents are anything with ``model`` and ``preamble`` attributes, and
+    optionally an ``endpoint`` named in LLM_ENDPOINTS. Objects that bring
+    their own blocking ``prompt`` method (alith.Agent, benchmark stubs) run
+    on the bounded thread pool; everything else goes through the shared
+    LLMClient for its endpoint.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: Optional[float] = DEFAULT_TIMEOUT,
+                 cache: Optional[ResponseCache] = None, limiter: Optional[RateLimiter] = None,
+                 rate_limit_retries: int = RATE_LIMIT_RETRIES, client: Optional[LLMClient] = None,
+                 call_log: Optional[CallLogger] = None, scheduler: Optional[FairScheduler] = None,
+                 router: Optional[ModelRouter] = None, endpoints: Optional[Dict[str, str]] = None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = cache
+        self.limiter = limiter
+        self.rate_limit_retries = rate_limit_retries
+        self.client = client
+        self.call_log = call_log
+        self.scheduler = scheduler
+        self.router = router
+        self.endpoints = dict(ENDPOINTS if endpoints is None else endpoints)
+        # One pooled client per named endpoint, opened on first use
+        self._clients: Dict[str, LLMClient] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.pool_size, thread_name_prefix="llm"
+                    )
+        return self._pool
+
+    def configure(self, pool_size: Optional[int] = None, timeout: Optional[float] = None):
+        """Resize the pool and/or change the default timeout"""
+        if timeout is not None:
+            self.timeout = timeout
+        if pool_size is not None and pool_size != self.pool_size:
+            with self._lock:
+                old_pool, self._pool = self._pool, None
+                self.pool_size = pool_size
+            if old_pool is not None:
+                old_pool.shutdown(wait=False)
+
+    async def prompt(self, agent: Any, prompt: str, timeout: Optional[float] = None) -> str:
+        """Complete prompt with the agent's preamble, on its model or the one the router picks.
+
+        Cancelling the awaiting task aborts an HTTP call, or drops a pool call
+        that is still queued; a call already running in a worker thread
+        finishes in the background and its result is discarded. Completions are served from and stored
+        in the response cache according to the current cache mode. When a
+        token sink is set, text is passed to it as it arrives. A call routed
+        to the small model that fails is made again on the agent's own model.
+        """
+        endpoint = getattr(agent, "endpoint", None)
+        route = self.router.choose(agent, prompt) if self.router is not None else None
+        if route is None:
+            return await self._prompt(agent, agent.model, endpoint, prompt, timeout)
+        self.router.record_decision(route)
+        LLM_ROUTE_DECISIONS.inc(route.model, route.reason)
+        if route.model == agent.model:
+            return await self._prompt(agent, route.model, route.endpoint, prompt, timeout, route.reason)
+
+        sink = token_sink.get()
+        forwarded = False
+
+        def forward(text: str):
+            nonlocal forwarded
+            forwarded = True
+            sink(text)
+
+        if timeout is None:
+            timeout = self.timeout
+        small_timeout = self.router.small_timeout if timeout is None else min(timeout, self.router.small_timeout)
+        try:
+            with use_token_sink(forward if sink is not None else None):
+                return await self._prompt(agent, route.model, route.endpoint, prompt, small_timeout, route.reason)
+        except DeadlineExceededError:
+            raise
+        except Exception:
+            # Text already streamed to the caller can't be taken back
+            if forwarded:
+                raise
+        self.router.record_fallback()
+        LLM_ROUTE_FALLBACKS.inc(route.model, agent.model)
+        return await self._prompt(agent, agent.model, endpoint, prompt, timeout, "fallback")
+
+    async def _admit(self, estimated: int) -> Optional[Priority]:
+        """Scheduler slot and rate budget for one attempt; returns the slot to release"""
+        if self.scheduler is not None and self.scheduler.limiter is self.limiter:
+            # Highest priority class first, fair between tenants; rate budget is spent in the same order
+            return await self.scheduler.acquire(estimated / 1000, estimated)
+        if self.limiter is not None:
+            # Wait for rate budget before taking a slot, so the wait never holds one
+            LLM_RATE_LIMIT_WAIT_SECONDS.observe(await self.limiter.acquire(estimated))
+        return await self.scheduler.acquire(estimated / 1000) if self.scheduler is not None else None
+
+    async def _prompt(self, agent: Any, model: str, endpoint: Optional[str], prompt: str,
+                      timeout: Optional[float], route: Optional[str] = None) -> str:
+        """One completion on a given model: cache, scheduler slot, rate limit and timeout"""
+        sink = token_sink.get()
+        key = None
+        mode = cache_mode.get()
+        if self.cache is not None and mode != CacheMode.BYPASS:
+            key = make_key(model, agent.preamble, prompt)
+            if mode == CacheMode.DEFAULT:
+                cached = await self.cache.aget(key)
+                if cached is not None:
+                    LLM_REQUESTS.inc(model, "cache_hit")
+                    self._log_call(agent, model, prompt, "cache_hit", route=route)
+                    if sink is not None:
+                        sink(cached)
+                    return cached
+
+        if timeout is None:
+            timeout = self.timeout
+        estimated = estimate_tokens(agent.preamble + prompt) + COMPLETION_TOKENS_ESTIMATE
+        for attempt in range(self.rate_limit_retries + 1):
+            slot = await self._admit(estimated)
+            try:
+                # Nobody is waiting for the answer any more: don't spend the call
+                call_timeout = timeout
+                remaining = remaining_time()
+                if remaining is not None:
+                    if remaining <= 0:
+                        LLM_REQUESTS.inc(model, "deadline_exceeded")
+                        self._log_call(agent, model, prompt, "deadline_exceeded", attempts=attempt, route=route)
+                        if self.limiter is not None:
+                            self.limiter.record_usage(estimated, 0)
+                        raise DeadlineExceededError("Request deadline passed before the LLM call started")
+                    call_timeout = remaining if timeout is None else min(timeout, remaining)
+                start = time.perf_counter()
+                try:
+                    result, usage, streamed = await asyncio.wait_for(
+                        self._call(agent, model, endpoint, prompt, sink), call_timeout
+                    )
+                    break
+                except asyncio.TimeoutError:
+                    latency = time.perf_counter() - start
+                    LLM_REQUESTS.inc(model, "timeout")
+                    self._record_model(model, latency, False)
+                    self._log_call(agent, model, prompt, "timeout", latency, attempt + 1, route=route)
+                    raise TimeoutError(f"LLM call timed out after {call_timeout:.3g}s")
+                except Exception as e:
+                    # Rate limited: wait our turn again instead of failing the caller
+                    if attempt == self.rate_limit_retries or not self._note_rate_limited(e):
+                        latency = time.perf_counter() - start
+                        LLM_REQUESTS.inc(model, "error")
+                        self._record_model(model, latency, False)
+                        self._log_call(agent, model, prompt, "error", latency, attempt + 1,
+                                       error=f"{type(e).__name__}: {e}", route=route)
+                        raise
+                    LLM_REQUESTS.inc(model, "rate_limited")
+            finally:
+                # A rate-limited retry queues again rather than holding its slot through the backoff
+                if slot is not None:
+                    self.scheduler.release(slot)
+        latency = time.perf_counter() - start
+        LLM_REQUESTS.inc(model, "success")
+        LLM_REQUEST_SECONDS.observe(latency, model)
+        prompt_tokens = usage.get("prompt_tokens") or estimate_tokens(agent.preamble + prompt)
+        completion_tokens = usage.get("completion_tokens") or estimate_tokens(result)
+        LLM_TOKENS.inc(model, "prompt", amount=prompt_tokens)
+        LLM_TOKENS.inc(model, "completion", amount=completion_tokens)
+        self._record_model(model, latency, True, prompt_tokens, completion_tokens)
+        self._log_call(agent, model, prompt, "success", latency, attempt + 1, prompt_tokens, completion_tokens,
+                       route=route)
+        if self.limiter is not None:
+            self.limiter.record_usage(estimated, usage.get("total_tokens") or prompt_tokens + completion_tokens)
+        if sink is not None and not streamed:
+            sink(result)
+
+        if key is not None:
+            self.cache.set(key, result)
+        return result
+
+    def _record_model(self, model: str, latency: float, ok: bool, prompt_tokens: int = 0,
+                      completion_tokens: int = 0):
+        if self.router is not None:
+            self.router.record(model, latency, ok, prompt_tokens, completion_tokens)
+
+    def _log_call(self, agent: Any, model: str, prompt: str, status: str, latency: float = 0.0, attempts: int = 0,
+                  prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None,
+                  error: Optional[str] = None, route: Optional[str] = None):
+        """Hand one call record to the structured call log, if enabled"""
+        if self.call_log is None:
+            return
+        record = {
+            "ts": round(time.time(), 3),
+            "agent": getattr(agent, "name", None) or type(agent).__name__,
+            "model": model,
+            "status": status,
+            "latency_ms": round(latency * 1000, 1),
+            "attempts": attempts,
+            "prompt_hash": prompt_hash(agent.preamble, prompt),
+        }
+        if prompt_tokens is not None:
+            record["prompt_tokens"] = prompt_tokens
+            record["completion_tokens"] = completion_tokens
+        if error is not None:
+            record["error"] = error[:200]
+        if route is not None:
+            record["route"] = route
+        self.call_log.log(record)
+
+    def _note_rate_limited(self, error: Exception) -> bool:
+        """Feed a rate-limit error into the limiter; False if the error is something else"""
+        if self.limiter is None:
+            return False
+        # Loaded by the time a client has made a call
+        httpx = sys.modules.get("httpx")
+        if httpx is not None and isinstance(error, httpx.HTTPStatusError):
+            if error.response.status_code != 429:
+                return False
+            self.limiter.update_from_headers(error.response.headers, 429)
+            return True
+        # alith surfaces provider errors as plain exceptions without headers
+        message = str(error).lower()
+        if "429" in message or "rate limit" in message or "rate_limit" in message:
+            self.limiter.throttled += 1
+            self.limiter.block_for(RATE_LIMIT_BACKOFF)
+            return True
+        return False
+
+    def _client_for(self, endpoint: Optional[str]) -> Optional[LLMClient]:
+        """Shared client for a named endpoint; None is the default LLM_BASE_URL client"""
+        if endpoint is None or self.client is None:
+            return self.client
+        client = self._clients.get(endpoint)
+        if client is None:
+            client = self._clients[endpoint] = LLMClient(base_url=self.endpoints[endpoint])
+        return client
+
+    async def _call(self, agent: Any, model: str, endpoint: Optional[str], prompt: str,
+                    sink: Optional[Callable[[str], None]]) -> Tuple[str, Dict[str, Any], bool]:
+        """One completion attempt; returns (text, provider usage if known, streamed?)"""
+        if hasattr(agent, "prompt"):
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, agent.prompt, prompt)
+            return result, {}, False
+        client = self._client_for(endpoint)
+        if client is None:
+            base_url = self.endpoints[endpoint] if endpoint is not None else DEFAULT_BASE_URL
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _alith_prompt, model, base_url, agent.preamble, prompt
+            )
+            return result, {}, False
+        if sink is not None:
+            result = await client.stream(model, agent.preamble, prompt, sink, self.limiter)
+            return result, {}, True
+        result, usage = await client.complete(model, agent.preamble, prompt, self.limiter)
+        return result, usage, False
+
+    async def prewarm(self):
+        """Import httpx off the event loop and open the default client before the first call needs them"""
+        if self.client is not None:
+            await asyncio.get_running_loop().run_in_executor(None, importlib.import_module, "httpx")
+            self.client._get_client()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+        if self.call_log is not None:
+            self.call_log.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    async def aclose(self):
+        """Close the shared HTTP client and release worker threads"""
+        if self.client is not None:
+            await self.client.aclose()
+        for client in self._clients.values():
+            await client.aclose()
+        self.shutdown()
+
+
+# Shared executor used by every agent in the process
+_limiter = RateLimiter(requests_per_minute=RATE_LIMIT_RPM, tokens_per_minute=RATE_LIMIT_TPM) \
+    if RATE_LIMIT_RPM or RATE_LIMIT_TPM else None
+llm_executor = LLMExecutor(
+    cache=ResponseCache(max_entries=CACHE_SIZE, ttl=CACHE_TTL, path=CACHE_PATH) if CACHE_SIZE > 0 else None,
+    limiter=_limiter,
+    client=LLMClient() if HTTPX else None,
+    call_log=create_call_logger(),
+    scheduler=create_scheduler(_limiter),
+    router=ModelRouter(),
+)
+
+# Cache and rate limiter state, read at scrape time
+if llm_executor.cache is not None:
+    registry.callback("llm_cache_hits_total", "Response cache hits",
+                      lambda: llm_executor.cache.hits, kind="counter")
+    registry.callback("llm_cache_misses_total", "Response cache misses",
+                      lambda: llm_executor.cache.misses, kind="counter")
+    registry.callback("llm_cache_entries", "Completions held in the response cache",
+                      lambda: llm_executor.cache.stats()["size"])
+if llm_executor.limiter is not None:
+    registry.callback("llm_rate_limit_waiting", "Calls queued in the client-side rate limiter",
+                      lambda: llm_executor.limiter.waiting)
+    registry.callback("llm_rate_limit_throttled_total", "Rate-limit responses from the provider",
+                      lambda: llm_executor.limiter.throttled, kind="counter")
+if llm_executor.call_log is not None:
+    registry.callback("llm_call_log_written_total", "Records written to the structured call log",
+                      lambda: llm_executor.call_log.written, kind="counter")
+    registry.callback("llm_call_log_dropped_total", "Call log records dropped because the writer fell behind",
+                      lambda: llm_executor.call_log.dropped, kind="counter")
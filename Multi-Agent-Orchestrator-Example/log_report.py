@@ -0,0 +1,329 @@
+"""
+LLM call log report
+Streams structured call logs (LLM_CALL_LOG_PATH, including rotated files and
+.gz archives) and the older alith text logs in llm_logs/ line by line, and
+reports call counts, error rates and latency/token percentiles per agent.
+Percentiles come from fixed-size log-bucket sketches (about 1% relative
+error), so memory stays flat however many records are read.
+
+    python log_report.py llm_logs/ logs/calls.jsonl
+    python log_report.py llm_logs/ --import-to legacy.jsonl
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+import sys
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from calllog import prompt_hash
+
+ANSI = re.compile(r"\x1b\[[0-9;]*m")
+HEADER = re.compile(r"^\s*(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?)Z\s+(\w+)\s+\S+:\s?(.*)$")
+FIELD = re.compile(r"^\s+(\w+): (.*)$")
+DURATION = re.compile(r"^([\d.]+)(ns|µs|us|ms|s)$")
+DURATION_UNITS_MS = {"ns": 1e-6, "µs": 1e-3, "us": 1e-3, "ms": 1.0, "s": 1000.0}
+# Legacy requests still waiting for their response; older ones are dropped as unmatched
+MAX_PENDING_REQUESTS = 1000
+LEGACY_FIELDS = ("total_prompt_tokens", "model", "total_time", "prompt_tokens", "completion_tokens",
+                 "finish_reason")
+
+
+class Sketch:
+    """Weighted quantile sketch over logarithmic buckets"""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, float] = {}
+        self.zeros = 0.0
+        self.count = 0.0
+
+    def add(self, value: float, weight: float = 1.0):
+        self.count += weight
+        if value <= 0:
+            self.zeros += weight
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0.0) + weight
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = self.zeros
+        if seen >= rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class GroupStats:
+    """Counts and sketches for one agent (or model) group"""
+
+    def __init__(self):
+        self.calls = 0.0
+        self.records = 0
+        self.statuses: Dict[str, int] = {}
+        self.latency_ms = Sketch()
+        self.prompt_tokens = Sketch()
+        self.completion_tokens = Sketch()
+
+    def add(self, record: Dict[str, Any]):
+        # Sampled records stand for 1/sample_rate calls
+        weight = 1 / (record.get("sample_rate") or 1)
+        status = record.get("status") or "unknown"
+        self.calls += weight
+        self.records += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == "cache_hit":
+            return
+        if record.get("latency_ms") is not None:
+            self.latency_ms.add(record["latency_ms"], weight)
+        if record.get("prompt_tokens") is not None:
+            self.prompt_tokens.add(record["prompt_tokens"], weight)
+        if record.get("completion_tokens") is not None:
+            self.completion_tokens.add(record["completion_tokens"], weight)
+
+    def summary(self) -> Dict[str, Any]:
+        failed = sum(n for status, n in self.statuses.items() if status in ("error", "timeout"))
+
+        def quantiles(sketch: Sketch, qs=(0.5, 0.95, 0.99)):
+            return {f"p{int(q * 100)}": None if sketch.quantile(q) is None else round(sketch.quantile(q), 1)
+                    for q in qs}
+
+        return {
+            "calls": round(self.calls),
+            "records": self.records,
+            "statuses": dict(sorted(self.statuses.items())),
+            "error_rate": round(failed / self.records, 4) if self.records else 0.0,
+            "latency_ms": quantiles(self.latency_ms),
+            "prompt_tokens": quantiles(self.prompt_tokens),
+            "completion_tokens": quantiles(self.completion_tokens),
+        }
+
+
+def _open(path: str) -> TextIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def _is_jsonl(path: str) -> bool:
+    return ".jsonl" in os.path.basename(path)
+
+
+def expand_paths(paths: Iterable[str]) -> Iterator[str]:
+    """Files as given, and every log file under a directory"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if ".jsonl" in name or name.endswith((".log", ".log.gz")):
+                    yield os.path.join(root, name)
+
+
+def read_jsonl(lines: Iterable[str], errors: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            errors["malformed"] = errors.get("malformed", 0) + 1
+
+
+def _epoch(timestamp: str) -> float:
+    # Trim to microseconds, which is all datetime can parse
+    head, _, fraction = timestamp.partition(".")
+    parsed = datetime.strptime(f"{head}.{(fraction or '0')[:6]}", "%Y-%m-%dT%H:%M:%S.%f")
+    return parsed.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _duration_ms(value: str) -> Optional[float]:
+    match = DURATION.match(value.strip())
+    if match is None:
+        return None
+    return float(match.group(1)) * DURATION_UNITS_MS[match.group(2)]
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AgentNames:
+    """Maps a logged system prompt back to the agent class that sends it"""
+
+    def __init__(self):
+        self._preambles: Optional[Dict[str, str]] = None
+
+    def __call__(self, system: Optional[str]) -> str:
+        if not system:
+            return "unknown"
+        if self._preambles is None:
+            self._preambles = {}
+            try:
+                from agents import AGENT_REGISTRY
+                self._preambles = {cls.preamble: cls.__name__ for cls in AGENT_REGISTRY.values()
+                                   if getattr(cls, "preamble", "")}
+            except Exception:  # the report also runs without the app's dependencies
+                pass
+        # Long preambles may be cut short in the text log
+        prefix = system[:-3] if system.endswith("...") else system
+        for preamble, name in self._preambles.items():
+            if preamble.startswith(prefix):
+                return name
+        match = re.match(r"You are (?:the |an? )?([^.,:\n]+)", system)
+        return match.group(1).strip() if match else system[:40]
+
+
+def read_legacy(lines: Iterable[str], agent_name: AgentNames, errors: Dict[str, int],
+                max_pending: int = MAX_PENDING_REQUESTS) -> Iterator[Dict[str, Any]]:
+    """Pair alith CompletionRequest blocks with their response or error"""
+    pending: deque = deque()
+    block: Optional[Dict[str, Any]] = None
+    expect: Optional[str] = None
+
+    def finish(block: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        if block is None:
+            return
+        if block.get("kind") == "request":
+            if len(pending) >= max_pending:
+                pending.popleft()
+                errors["unmatched_request"] = errors.get("unmatched_request", 0) + 1
+            pending.append(block)
+        elif block.get("kind") == "response":
+            yield _legacy_record(pending.popleft() if pending else {}, block, "success", agent_name)
+
+    for raw in lines:
+        line = ANSI.sub("", raw.rstrip("\n"))
+        header = HEADER.match(line)
+        if header:
+            yield from finish(block)
+            block, expect = None, None
+            timestamp, level, rest = header.groups()
+            if level in ("WARN", "ERROR") and rest.startswith("e: "):
+                yield _legacy_record(pending.popleft() if pending else {}, {"ts": timestamp, "error": rest[3:]},
+                                    "error", agent_name)
+            else:
+                block = {"ts": timestamp}
+            continue
+        if block is None:
+            continue
+        stripped = line.strip()
+        if stripped in ("CompletionRequest:", "CompletionResponse:"):
+            block["kind"] = "request" if stripped == "CompletionRequest:" else "response"
+        elif stripped in ("System:", "User:"):
+            expect = stripped[:-1].lower()
+        elif expect is not None and stripped.startswith('"'):
+            try:
+                block[expect] = json.loads(stripped)
+            except ValueError:
+                block[expect] = stripped.strip('"')
+            expect = None
+        else:
+            field = FIELD.match(line)
+            if field is not None and field.group(1) in LEGACY_FIELDS:
+                block.setdefault(field.group(1), field.group(2).strip().strip('"'))
+    yield from finish(block)
+    for request in pending:
+        yield _legacy_record(request, {}, "unknown", agent_name)
+
+
+def _legacy_record(request: Dict[str, Any], outcome: Dict[str, Any], status: str,
+                   agent_name: AgentNames) -> Dict[str, Any]:
+    started = _epoch(request["ts"]) if "ts" in request else None
+    latency = _duration_ms(outcome.get("total_time", ""))
+    if latency is None and started is not None and "ts" in outcome:
+        latency = (_epoch(outcome["ts"]) - started) * 1000
+    record = {
+        "ts": round(started, 3) if started is not None else None,
+        "agent": agent_name(request.get("system")),
+        "model": outcome.get("model"),
+        "status": status,
+        "latency_ms": round(latency, 1) if latency is not None else None,
+        "prompt_hash": prompt_hash(request.get("system", ""), request.get("user", "")) if request else None,
+        "prompt_tokens": _int(outcome.get("prompt_tokens")) or _int(request.get("total_prompt_tokens")),
+        "completion_tokens": _int(outcome.get("completion_tokens")),
+    }
+    if "error" in outcome:
+        record["error"] = outcome["error"][:200]
+    return {key: value for key, value in record.items() if value is not None}
+
+
+def read_records(paths: Iterable[str], errors: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    agent_name = AgentNames()
+    for path in expand_paths(paths):
+        with _open(path) as lines:
+            if _is_jsonl(path):
+                yield from read_jsonl(lines, errors)
+            else:
+                yield from read_legacy(lines, agent_name, errors)
+
+
+def _format(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:g}"
+
+
+def print_table(groups: Dict[str, Dict[str, Any]], group_by: str):
+    columns = [(group_by, 28), ("calls", 7), ("err%", 6), ("lat p50", 9), ("lat p95", 9), ("lat p99", 9),
+               ("in p50", 7), ("in p95", 7), ("out p50", 8), ("out p95", 8), ("out p99", 8)]
+    print("".join(name.ljust(width) if i == 0 else name.rjust(width) for i, (name, width) in enumerate(columns)))
+    for name, summary in groups.items():
+        row = [name[:27], summary["calls"], f"{summary['error_rate'] * 100:.1f}",
+               *(_format(summary["latency_ms"][p]) for p in ("p50", "p95", "p99")),
+               *(_format(summary["prompt_tokens"][p]) for p in ("p50", "p95")),
+               *(_format(summary["completion_tokens"][p]) for p in ("p50", "p95", "p99"))]
+        print("".join(str(value).ljust(width) if i == 0 else str(value).rjust(width)
+                      for i, (value, (_, width)) in enumerate(zip(row, columns))))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Log files or directories (.jsonl[.N][.gz] and alith .log)")
+    parser.add_argument("--group-by", choices=("agent", "model", "status"), default="agent")
+    parser.add_argument("--json", action="store_true", help="Print one JSON document instead of a table")
+    parser.add_argument("--import-to", metavar="OUT", help="Also write every record read as JSONL to OUT")
+    args = parser.parse_args(argv)
+
+    groups: Dict[str, GroupStats] = {}
+    total = GroupStats()
+    errors: Dict[str, int] = {}
+    output = open(args.import_to, "w", encoding="utf-8") if args.import_to else None
+    try:
+        for record in read_records(args.paths, errors):
+            key = str(record.get(args.group_by) or "unknown")
+            groups.setdefault(key, GroupStats()).add(record)
+            total.add(record)
+            if output is not None:
+                output.write(json.dumps(record, separators=(",", ":")) + "\n")
+    finally:
+        if output is not None:
+            output.close()
+
+    summaries = {name: groups[name].summary() for name in sorted(groups, key=lambda n: -groups[n].calls)}
+    if args.json:
+        print(json.dumps({"groups": summaries, "total": total.summary(), "skipped": errors}, indent=2))
+    else:
+        print_table({**summaries, "(all)": total.summary()}, args.group_by)
+        for kind, count in errors.items():
+            print(f"⚠️ Skipped {count} {kind.replace('_', ' ')} entries", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Content-addressed task results for incremental workflow reruns
+A task's input hash covers its agent (model, preamble and route mode),
+method, arguments and the result hashes of the tasks it depends on, so an unchanged task whose upstream
+results are also unchanged can reuse an earlier result instead of calling
+the agent again, while anything downstream of a changed task reruns.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import CacheMode, ResponseCache, cache_mode
+
+RESULT_CACHE_SIZE = int(os.getenv("TASK_RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("TASK_RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_PATH = os.getenv("TASK_RESULT_CACHE_PATH")
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def input_hash(agent_type: str, method: str, args: Dict[str, Any], map_over: Optional[str],
+               reducer: str, agent_config: List[str], upstream: List[Optional[str]]) -> str:
+    """Address of a task's inputs; upstream holds the dependencies' result hashes"""
+    return _digest([agent_type, method, args, map_over, reducer if map_over else None,
+                    agent_config, sorted(h or "" for h in upstream)])
+
+
+def result_hash(result: Any) -> str:
+    return _digest(result)
+
+
+class TaskResultCache:
+    """Task results keyed by input hash, following the current request's cache mode"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, ttl: Optional[float] = RESULT_CACHE_TTL,
+                 path: Optional[str] = RESULT_CACHE_PATH):
+        self.entries = ResponseCache(max_entries=max_entries, ttl=ttl, path=path, table="task_result_cache")
+
+    async def get(self, key: str) -> Optional[Tuple[Any, str]]:
+        """(result, result hash) of an earlier run with the same inputs"""
+        if cache_mode.get() != CacheMode.DEFAULT:
+            return None
+        value = await self.entries.aget(key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return entry["result"], entry["hash"]
+
+    def set(self, key: str, result: Any, digest: str):
+        if cache_mode.get() == CacheMode.BYPASS:
+            return
+        self.entries.set(key, json.dumps({"result": result, "hash": digest}, default=str))
+
+    def close(self):
+        self.entries.close()
+
+    def stats(self) -> Dict[str, float]:
+        return self.entries.stats()
+
+
+def create_result_cache() -> Optional[TaskResultCache]:
+    """Task result cache configured by TASK_RESULT_CACHE_*, or None when disabled"""
+    return TaskResultCache() if RESULT_CACHE_SIZE > 0 else None
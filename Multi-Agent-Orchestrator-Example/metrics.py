@@ -0,0 +1,235 @@
+"""
+Process-wide metrics and tracing for agent calls and workflows
+Counters, gauges and histograms are plain in-memory maps rendered in the
+Prometheus text format on demand, so recording a sample is a dict lookup
+and an add. Spans go to OpenTelemetry when it is installed and enabled.
+"""
+
+import bisect
+import contextlib
+import math
+import os
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Spans cost a few microseconds each even without an exporter, so they are opt-in,
+# and opentelemetry is only imported when they are on
+TRACING = os.getenv("OTEL_TRACING", "0") == "1"
+trace = None
+if TRACING:
+    try:
+        from opentelemetry import trace
+    except ImportError:  # tracing is optional; spans become no-ops
+        TRACING = False
+
+# Buckets in seconds, from cache hits up to the LLM call timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for metrics keyed by a tuple of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(name suffix, rendered labels, value) for every sample"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_number(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labelvalues: Any, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: Any) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        return [("", _labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labelvalues: Any, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value: float, *labelvalues: Any):
+        self._values[labelvalues] = value
+
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose value is read from elsewhere at scrape time"""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, help)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        return [("", "", self.fn())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: Any):
+        counts = self._values.get(labelvalues)
+        if counts is None:
+            counts = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def count(self, *labelvalues: Any) -> int:
+        counts = self._values.get(labelvalues)
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        samples = []
+        for key, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(("_bucket", _labels(self.labelnames, key, f'le="{_number(bound)}"'), cumulative))
+            samples.append(("_sum", _labels(self.labelnames, key), counts[-1]))
+            samples.append(("_count", _labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Registry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, fn, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Agent method calls, from workflow tasks and the agent endpoints alike
+AGENT_CALLS = registry.counter(
+    "agent_calls_total", "Agent method calls by outcome", ("agent_type", "method", "status"))
+AGENT_CALL_SECONDS = registry.histogram(
+    "agent_call_seconds", "Agent method call latency", ("agent_type", "method"))
+
+AGENT_RETRIES = registry.counter(
+    "agent_call_retries_total", "Task agent calls retried after a retryable failure", ("agent_type", "method"))
+AGENT_HEDGES = registry.counter(
+    "agent_call_hedges_total", "Duplicate calls fired for slow task agent calls, by winner",
+    ("agent_type", "method", "winner"))
+
+# LLM completions as seen by the shared executor
+LLM_REQUESTS = registry.counter(
+    "llm_requests_total", "LLM completions by outcome (success, error, timeout, rate_limited, cache_hit)",
+    ("model", "outcome"))
+LLM_REQUEST_SECONDS = registry.histogram(
+    "llm_request_seconds", "LLM completion latency, excluding rate-limit waits", ("model",))
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Prompt and completion tokens (estimated when the provider does not report usage)",
+    ("model", "kind"))
+LLM_RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    "llm_rate_limit_wait_seconds", "Time spent queued in the client-side rate limiter")
+LLM_ROUTE_DECISIONS = registry.counter(
+    "llm_route_decisions_total", "Model routing decisions by chosen model and reason", ("model", "reason"))
+LLM_ROUTE_FALLBACKS = registry.counter(
+    "llm_route_fallbacks_total", "Calls routed to the small model that were redone on the agent's model",
+    ("from_model", "to_model"))
+LLM_SCHEDULER_WAIT_SECONDS = registry.histogram(
+    "llm_scheduler_wait_seconds", "Time an LLM call waited for a scheduler slot", ("priority",))
+LLM_SCHEDULER_QUEUED = registry.gauge(
+    "llm_scheduler_queued", "LLM calls waiting for a scheduler slot", ("priority",))
+LLM_SCHEDULER_RUNNING = registry.gauge(
+    "llm_scheduler_running", "LLM calls holding a scheduler slot", ("priority",))
+
+# Workflow scheduling
+TASKS = registry.counter(
+    "workflow_tasks_total", "Workflow tasks by final status", ("agent_type", "method", "status"))
+TASKS_REUSED = registry.counter(
+    "workflow_tasks_reused_total", "Completed tasks whose result was reused from an earlier identical run",
+    ("agent_type", "method"))
+TASK_QUEUE_SECONDS = registry.histogram(
+    "workflow_task_queue_seconds", "Time a ready task waited for a concurrency slot", ("agent_type",))
+TASKS_WAITING = registry.gauge(
+    "workflow_tasks_waiting", "Ready tasks waiting for a concurrency slot")
+TASKS_RUNNING = registry.gauge(
+    "workflow_tasks_running", "Tasks currently executing")
+WORKFLOWS = registry.counter(
+    "workflows_total", "Finished workflows by type and status", ("workflow_type", "status"))
+WORKFLOW_SECONDS = registry.histogram(
+    "workflow_seconds", "Workflow duration", ("workflow_type",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name: str, **attributes: Any):
+    """OpenTelemetry span as the current span, or a no-op when tracing is off.
+
+    Spans started in asyncio tasks created under this one become its
+    children, which links a workflow span to its task spans.
+    """
+    if not TRACING:
+        return _NO_SPAN
+    return trace.get_tracer("multi-agent-orchestrator").start_as_current_span(
+        name, attributes={k: v for k, v in attributes.items() if v is not None})
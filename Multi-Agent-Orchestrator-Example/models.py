@@ -0,0 +1,175 @@
+"""
+Workflow and task data model shared by the orchestrator and workflow stores
+"""
+
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from policy import TaskPolicy
+
+class TaskStatus(Enum):
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    CANCELLED = "cancelled"
+
+class WorkflowType(Enum):
+    SEQUENTIAL = "sequential"
+    PARALLEL = "parallel"
+
+@dataclass
+class Task:
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    agent_type: str = ""
+    method: str = ""
+    args: Dict[str, Any] = field(default_factory=dict)
+    status: TaskStatus = TaskStatus.PENDING
+    result: Any = None
+    error: Optional[str] = None
+    dependencies: List[str] = field(default_factory=list)
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    # Map node: call the agent once per element of this list argument and
+    # store only the reduced result
+    map_over: Optional[str] = None
+    reducer: str = "by_item"
+    map_concurrency: Optional[int] = None
+    # Timeout/retry/hedging overrides, and what happened when the task ran
+    policy: Optional[TaskPolicy] = None
+    attempts: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    # Content addresses of the task's inputs and result, and whether the
+    # result was reused from an earlier run with the same inputs
+    input_hash: Optional[str] = None
+    result_hash: Optional[str] = None
+    reused: bool = False
+    listeners: List[Callable[["Task"], None]] = field(default_factory=list, repr=False, compare=False)
+
+    # Notify listeners whenever the status changes
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if name == "status":
+            for listener in getattr(self, "listeners", ()):
+                listener(self)
+
+@dataclass
+class Workflow:
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    name: str = ""
+    workflow_type: WorkflowType = WorkflowType.SEQUENTIAL
+    tasks: List[Task] = field(default_factory=list)
+    status: TaskStatus = TaskStatus.PENDING
+    results: Dict[str, Any] = field(default_factory=dict)
+    max_concurrency: Optional[int] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    completed_at: Optional[datetime] = None
+    # Dependency index maintained by add_task: task lookup and reverse edges
+    task_index: Dict[str, Task] = field(default_factory=dict, repr=False, compare=False)
+    dependents: Dict[str, List[str]] = field(default_factory=dict, repr=False, compare=False)
+
+    # Append a task, rejecting unknown or self dependencies. Dependencies must
+    # already be in the workflow, so the task graph can never contain a cycle.
+    def add_task(self, task: Task):
+        if task.id in self.task_index:
+            raise ValueError(f"Duplicate task ID {task.id}")
+        if task.id in task.dependencies:
+            raise ValueError(f"Task {task.id} cannot depend on itself")
+        unknown = [dep for dep in task.dependencies if dep not in self.task_index]
+        if unknown:
+            raise ValueError(f"Unknown dependencies for task {task.id}: {', '.join(unknown)}")
+        self.tasks.append(task)
+        self.task_index[task.id] = task
+        self.dependents[task.id] = []
+        for dep in task.dependencies:
+            self.dependents[dep].append(task.id)
+
+# Statuses after which a workflow no longer changes
+FINISHED_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
+# Marker for a task result that has not been loaded from storage yet
+_UNLOADED = object()
+
+
+class TaskRecord:
+    """Compact, read-only snapshot of a finished Task"""
+
+    __slots__ = ("id", "agent_type", "method", "args", "status", "error",
+                 "dependencies", "created_at", "started_at", "completed_at", "attempts", "hedges",
+                 "hedge_wins", "input_hash", "result_hash", "reused", "map_over", "_result", "_load_result")
+
+    def __init__(self, id: str, agent_type: str, method: str, args: Dict[str, Any],
+                 status: TaskStatus, error: Optional[str], dependencies: List[str],
+                 created_at: datetime, completed_at: Optional[datetime], result: Any = _UNLOADED,
+                 load_result: Optional[Callable[[str], Any]] = None, started_at: Optional[datetime] = None,
+                 attempts: int = 0, hedges: int = 0, hedge_wins: int = 0, input_hash: Optional[str] = None,
+                 result_hash: Optional[str] = None, reused: bool = False, map_over: Optional[str] = None):
+        self.id = id
+        self.agent_type = agent_type
+        self.method = method
+        self.args = args
+        self.status = status
+        self.error = error
+        self.dependencies = dependencies
+        self.created_at = created_at
+        self.started_at = started_at
+        self.completed_at = completed_at
+        self.attempts = attempts
+        self.hedges = hedges
+        self.hedge_wins = hedge_wins
+        self.input_hash = input_hash
+        self.result_hash = result_hash
+        self.reused = reused
+        self.map_over = map_over
+        self._result = result
+        self._load_result = load_result
+
+    @classmethod
+    def from_task(cls, task: Task) -> "TaskRecord":
+        return cls(task.id, task.agent_type, task.method, task.args, task.status, task.error,
+                   task.dependencies, task.created_at, task.completed_at, task.result,
+                   started_at=task.started_at, attempts=task.attempts, hedges=task.hedges,
+                   hedge_wins=task.hedge_wins, input_hash=task.input_hash, result_hash=task.result_hash,
+                   reused=task.reused, map_over=task.map_over)
+
+    @property
+    def result(self) -> Any:
+        # Large result texts may live out of line and are loaded on first access
+        if self._result is _UNLOADED:
+            self._result = self._load_result(self.id) if self._load_result else None
+        return self._result
+
+
+class WorkflowRecord:
+    """Compact, read-only snapshot of a finished Workflow"""
+
+    __slots__ = ("id", "name", "workflow_type", "status", "tasks", "max_concurrency",
+                 "created_at", "completed_at")
+
+    def __init__(self, id: str, name: str, workflow_type: WorkflowType, status: TaskStatus,
+                 tasks: List[TaskRecord], max_concurrency: Optional[int],
+                 created_at: datetime, completed_at: Optional[datetime]):
+        self.id = id
+        self.name = name
+        self.workflow_type = workflow_type
+        self.status = status
+        self.tasks = tasks
+        self.max_concurrency = max_concurrency
+        self.created_at = created_at
+        self.completed_at = completed_at
+
+    @classmethod
+    def from_workflow(cls, workflow: Workflow) -> "WorkflowRecord":
+        return cls(workflow.id, workflow.name, workflow.workflow_type, workflow.status,
+                   [TaskRecord.from_task(task) for task in workflow.tasks],
+                   workflow.max_concurrency, workflow.created_at, workflow.completed_at)
+
+    @property
+    def results(self) -> Dict[str, Any]:
+        return {task.id: task.result for task in self.tasks if task.status == TaskStatus.COMPLETED}
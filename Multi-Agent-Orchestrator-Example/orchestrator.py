@@ -4,158 +4,443 @@ Manages and coordinates cricket team agents asynchronously
 """
 
 import asyncio
-import uuid
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, field
-from enum import Enum
+import contextlib
+import heapq
+import time
+from typing import Callable, Dict, List, Any, Optional
 from datetime import datetime
 
-from agents import AGENT_REGISTRY
-
-class TaskStatus(Enum):
-    PENDING = "pending"
-    IN_PROGRESS = "in_progress"
-    COMPLETED = "completed"
-    FAILED = "failed"
-
-class WorkflowType(Enum):
-    SEQUENTIAL = "sequential"
-    PARALLEL = "parallel"
-
-@dataclass
-class Task:
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
-    agent_type: str = ""
-    method: str = ""
-    args: Dict[str, Any] = field(default_factory=dict)
-    status: TaskStatus = TaskStatus.PENDING
-    result: Any = None
-    error: Optional[str] = None
-    dependencies: List[str] = field(default_factory=list)
-    created_at: datetime = field(default_factory=datetime.now)
-    completed_at: Optional[datetime] = None
-
-@dataclass
-class Workflow:
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
-    name: str = ""
-    workflow_type: WorkflowType = WorkflowType.SEQUENTIAL
-    tasks: List[Task] = field(default_factory=list)
-    status: TaskStatus = TaskStatus.PENDING
-    results: Dict[str, Any] = field(default_factory=dict)
-    created_at: datetime = field(default_factory=datetime.now)
-    completed_at: Optional[datetime] = None
+from agents import LazyAgents
+from memo import TaskResultCache, input_hash, result_hash
+from metrics import (AGENT_CALLS, AGENT_CALL_SECONDS, AGENT_HEDGES, AGENT_RETRIES, TASKS, TASK_QUEUE_SECONDS, TASKS_REUSED,
+                     TASKS_RUNNING, TASKS_WAITING, WORKFLOWS, WORKFLOW_SECONDS, span)
+from models import Task, TaskStatus, Workflow, WorkflowRecord, WorkflowType
+from policy import DEFAULT_POLICY, CallStats, LatencyTracker, TaskPolicy, run_with_policy
+from routing import route_mode
+from singleflight import SingleFlight, call_key
+from store import WorkflowStore, InMemoryWorkflowStore
+
+# Ways to combine the per-item results of a map task into its single result
+REDUCERS: Dict[str, Callable[[List[Any], List[Any]], Any]] = {
+    "by_item": lambda items, results: {str(item): result for item, result in zip(items, results)},
+    "list": lambda items, results: list(results),
+    "join": lambda items, results: "\n\n".join(f"## {item}\n{result}" for item, result in zip(items, results)),
+}
 
 # ----------------------------
 # Orchestrator Class
 # ----------------------------
 class MultiAgentOrchestrator:
-    def __init__(self):
-        self.agents: Dict[str, Any] = {}
-        self.workflows: Dict[str, Workflow] = {}
+    def __init__(self, max_concurrency: Optional[int] = None, store: Optional[WorkflowStore] = None,
+                 default_policy: Optional[TaskPolicy] = None, result_cache: Optional[TaskResultCache] = None):
+        # Built on first use; initialize_agents() builds them up front
+        self.agents = LazyAgents()
+        # Running workflows are live objects; finished ones are compacted by the store
+        self.workflows: WorkflowStore = store if store is not None else InMemoryWorkflowStore()
+        # Limit on concurrently running tasks across all parallel workflows
+        self.max_concurrency = max_concurrency
+        self._global_limit: Optional[asyncio.Semaphore] = None
+        # Identical agent calls in flight at the same time share one LLM call
+        self.inflight = SingleFlight()
+        # Timeout/retry/hedging: per task, then per agent type, then these defaults
+        self.default_policy = default_policy if default_policy is not None else DEFAULT_POLICY
+        self.agent_policies: Dict[str, TaskPolicy] = {}
+        # Recent latencies, used to decide when to hedge
+        self.latencies = LatencyTracker()
+        # Results of earlier tasks by input hash, reused by reruns with unchanged inputs
+        self.result_cache = result_cache
 
-    # Initialize cricket agents
+    # Build cricket agents ahead of their first use; a failure is reported, not raised
     def initialize_agents(self, agent_types: List[str] = None):
         if agent_types is None:
-            agent_types = list(AGENT_REGISTRY.keys())
+            agent_types = self.agents.keys()
 
         for agent_type in agent_types:
-            if agent_type in AGENT_REGISTRY:
-                self.agents[agent_type] = AGENT_REGISTRY[agent_type]()
-                print(f"✅ Initialized {agent_type} agent")
+            failure = self.agents.prewarm([agent_type]).get(agent_type)
+            if failure is None:
+                print(f"✅ Initialized {agent_type} agent ({getattr(self.agents[agent_type], 'model', '')})")
             else:
-                print(f"❌ Unknown agent type: {agent_type}")
+                print(f"❌ Could not initialize {agent_type} agent: {failure}")
+
+    # Set the timeout/retry/hedging policy for every task of an agent type
+    def set_agent_policy(self, agent_type: str, policy: TaskPolicy):
+        self.agent_policies[agent_type] = policy
 
     # Create workflow
-    def create_workflow(self, name: str, workflow_type: WorkflowType = WorkflowType.SEQUENTIAL) -> str:
-        workflow = Workflow(name=name, workflow_type=workflow_type)
-        self.workflows[workflow.id] = workflow
+    def create_workflow(self, name: str, workflow_type: WorkflowType = WorkflowType.SEQUENTIAL,
+                        max_concurrency: Optional[int] = None) -> str:
+        workflow = Workflow(name=name, workflow_type=workflow_type, max_concurrency=max_concurrency)
+        self.workflows.add(workflow)
         print(f"📋 Created workflow: {name} (ID: {workflow.id})")
         return workflow.id
 
     # Add task to workflow
     def add_task_to_workflow(self, workflow_id: str, agent_type: str, method: str,
-                             args: Dict[str, Any] = None, dependencies: List[str] = None) -> str:
-        if workflow_id not in self.workflows:
+                             args: Dict[str, Any] = None, dependencies: List[str] = None,
+                             map_over: Optional[str] = None, reducer: str = "by_item",
+                             map_concurrency: Optional[int] = None, policy: Optional[TaskPolicy] = None) -> str:
+        workflow = self.workflows.get(workflow_id)
+        if workflow is None:
             raise ValueError(f"Workflow {workflow_id} not found")
+        if isinstance(workflow, WorkflowRecord):
+            raise ValueError(f"Workflow {workflow_id} already finished")
         if args is None:
             args = {}
         if dependencies is None:
             dependencies = []
+        if map_over is not None:
+            if not isinstance(args.get(map_over), list):
+                raise ValueError(f"Map argument {map_over} must be a list")
+            if reducer not in REDUCERS:
+                raise ValueError(f"Unknown reducer {reducer}")
 
-        task = Task(agent_type=agent_type, method=method, args=args, dependencies=dependencies)
-        self.workflows[workflow_id].tasks.append(task)
+        task = Task(agent_type=agent_type, method=method, args=args, dependencies=dependencies,
+                    map_over=map_over, reducer=reducer, map_concurrency=map_concurrency, policy=policy)
+        workflow.add_task(task)
         print(f"➕ Added task {task.id} ({agent_type}.{method})")
         return task.id
 
-    # Check dependencies
-    def _dependencies_met(self, task: Task, completed_tasks: set) -> bool:
-        return all(dep in completed_tasks for dep in task.dependencies)
+    # Subscribe to status changes of every task in a workflow
+    def watch_workflow(self, workflow_id: str, listener: Callable[[Task], None]):
+        if workflow_id not in self.workflows:
+            raise ValueError(f"Workflow {workflow_id} not found")
+        for task in self.workflows[workflow_id].tasks:
+            task.listeners.append(listener)
+
+    # Task lookup and dependents index, rebuilt if tasks were appended to the list directly
+    def _dependency_graph(self, workflow: Workflow):
+        if len(workflow.task_index) != len(workflow.tasks):
+            workflow.task_index = {task.id: task for task in workflow.tasks}
+            workflow.dependents = {task.id: [] for task in workflow.tasks}
+            for task in workflow.tasks:
+                for dep in task.dependencies:
+                    if dep in workflow.dependents:
+                        workflow.dependents[dep].append(task.id)
+        return workflow.task_index, workflow.dependents
+
+    # Content-address a ready task from its inputs and its dependencies' results
+    def _address_task(self, task: Task, tasks_by_id: Dict[str, Task]):
+        if self.result_cache is None:
+            return
+        agent = self.agents.get(task.agent_type)
+        # The route mode decides whether the router may answer on the small model
+        agent_config = [str(getattr(agent, "model", "")), str(getattr(agent, "preamble", "")), route_mode.get().value]
+        task.input_hash = input_hash(task.agent_type, task.method, task.args, task.map_over, task.reducer,
+                                     agent_config, [tasks_by_id[dep].result_hash for dep in task.dependencies])
 
-    # Execute single task
+    # Execute single task, reusing the result of an identical earlier task when there is one
     async def execute_task(self, task: Task) -> Any:
+        TASKS_RUNNING.inc()
+        stats = CallStats()
         try:
-            task.status = TaskStatus.IN_PROGRESS
-            if task.agent_type not in self.agents:
-                raise ValueError(f"Agent {task.agent_type} not initialized")
-
-            agent = self.agents[task.agent_type]
-            method = getattr(agent, task.method)
-            result = await method(**task.args)
+            with span("task", task_id=task.id, agent_type=task.agent_type, method=task.method):
+                task.started_at = datetime.now()
+                task.status = TaskStatus.IN_PROGRESS
+                cached = None
+                if task.input_hash is not None and self.result_cache is not None:
+                    cached = await self.result_cache.get(task.input_hash)
+                if cached is not None:
+                    result, task.result_hash = cached
+                    task.reused = True
+                else:
+                    result = await self._run_task(task, stats)
 
             task.result = result
-            task.status = TaskStatus.COMPLETED
             task.completed_at = datetime.now()
-            print(f"✅ Task {task.id} completed: {task.agent_type}.{task.method}")
+            task.status = TaskStatus.COMPLETED
+            TASKS.inc(task.agent_type, task.method, TaskStatus.COMPLETED.value)
+            if task.reused:
+                TASKS_REUSED.inc(task.agent_type, task.method)
+                print(f"♻️ Task {task.id} reused: {task.agent_type}.{task.method}")
+            else:
+                print(f"✅ Task {task.id} completed: {task.agent_type}.{task.method}")
             return result
         except Exception as e:
-            task.status = TaskStatus.FAILED
-            task.error = str(e)
+            # Some transport errors have no message; keep at least their type
+            task.error = str(e) or type(e).__name__
             task.completed_at = datetime.now()
+            task.status = TaskStatus.FAILED
+            TASKS.inc(task.agent_type, task.method, TaskStatus.FAILED.value)
             print(f"❌ Task {task.id} failed: {e}")
             raise
+        finally:
+            TASKS_RUNNING.dec()
+
+    # Call the task's agent under its policy and remember the result by input hash
+    async def _run_task(self, task: Task, stats: CallStats) -> Any:
+        if task.agent_type not in self.agents:
+            raise ValueError(f"Unknown agent type {task.agent_type}")
 
-    # Execute sequential workflow
+        agent = self.agents[task.agent_type]
+        method = getattr(agent, task.method)
+        policy = self.policy_for(task)
+        try:
+            if task.map_over is None:
+                result = await self._call_with_policy(task.agent_type, task.method, method,
+                                                      task.args, policy, stats)
+            else:
+                result = await self._execute_map(task, method, policy, stats)
+        finally:
+            self._record_attempts(task, stats)
+
+        if task.input_hash is not None and self.result_cache is not None:
+            task.result_hash = result_hash(result)
+            self.result_cache.set(task.input_hash, result, task.result_hash)
+        return result
+
+    # Effective timeout/retry/hedging policy for a task
+    def policy_for(self, task: Task) -> TaskPolicy:
+        return (task.policy or TaskPolicy()).merged(self.agent_policies.get(task.agent_type), self.default_policy)
+
+    # Copy attempt and hedge counts onto the task
+    def _record_attempts(self, task: Task, stats: CallStats):
+        task.attempts = stats.attempts
+        task.hedges = stats.hedges
+        task.hedge_wins = stats.hedge_wins
+        if stats.retries:
+            AGENT_RETRIES.inc(task.agent_type, task.method, amount=stats.retries)
+        if stats.hedges:
+            AGENT_HEDGES.inc(task.agent_type, task.method, "hedge", amount=stats.hedge_wins)
+            AGENT_HEDGES.inc(task.agent_type, task.method, "original", amount=stats.hedges - stats.hedge_wins)
+
+    # Call an agent method, sharing the call with identical ones in flight
+    async def call_agent(self, agent_type: str, method_name: str, method: Callable, args: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await self.inflight.do(call_key(agent_type, method_name, args), lambda: method(**args))
+            status = "success"
+            self.latencies.record(agent_type, method_name, time.perf_counter() - start)
+            return result
+        finally:
+            AGENT_CALL_SECONDS.observe(time.perf_counter() - start, agent_type, method_name)
+            AGENT_CALLS.inc(agent_type, method_name, status)
+
+    # Call an agent method under a timeout/retry/hedging policy
+    async def _call_with_policy(self, agent_type: str, method_name: str, method: Callable,
+                                args: Dict[str, Any], policy: TaskPolicy, stats: CallStats) -> Any:
+        hedge_after = None
+        if policy.hedge is not False:
+            hedge_after = policy.hedge_after
+            if hedge_after is None and policy.hedge:
+                hedge_after = self.latencies.percentile(agent_type, method_name, 95)
+        return await run_with_policy(
+            lambda: self.call_agent(agent_type, method_name, method, args),
+            # The duplicate skips single-flight, which would just join the slow call
+            lambda: method(**args),
+            policy, hedge_after, stats
+        )
+
+    # Execute a map task: one concurrent call per list element, reduced into a single result
+    async def _execute_map(self, task: Task, method: Callable, policy: TaskPolicy, stats: CallStats) -> Any:
+        items = task.args[task.map_over]
+        # All calls of the map share this budget on top of the task's own scheduling slot
+        limit = asyncio.Semaphore(task.map_concurrency) if task.map_concurrency else None
+
+        async def call(item: Any) -> Any:
+            args = dict(task.args, **{task.map_over: item})
+            # Each call retries on its own; the node reports the most attempts any of them took
+            call_stats = CallStats()
+            try:
+                if limit is None:
+                    return await self._call_with_policy(task.agent_type, task.method, method, args, policy,
+                                                        call_stats)
+                async with limit:
+                    return await self._call_with_policy(task.agent_type, task.method, method, args, policy,
+                                                        call_stats)
+            finally:
+                stats.add_call(call_stats)
+
+        results = await asyncio.gather(*(call(item) for item in items), return_exceptions=True)
+        failed = [f"{item}: {result}" for item, result in zip(items, results) if isinstance(result, BaseException)]
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(items)} map calls failed ({'; '.join(failed)})")
+        return REDUCERS[task.reducer](items, results)
+
+    # Execute sequential workflow: one task at a time, in the order tasks were added
     async def execute_workflow_sequential(self, workflow_id: str) -> Dict[str, Any]:
         workflow = self.workflows[workflow_id]
         workflow.status = TaskStatus.IN_PROGRESS
+        self.workflows.update(workflow)
+        results = {}
+
+        tasks_by_id, dependents = self._dependency_graph(workflow)
+        position = {task.id: i for i, task in enumerate(workflow.tasks)}
+        remaining = {task.id: len(task.dependencies) for task in workflow.tasks}
+        # Heap of positions of ready tasks (built in ascending order, so already a heap)
+        ready = [i for i, task in enumerate(workflow.tasks) if remaining[task.id] == 0]
+
+        while ready:
+            task = workflow.tasks[heapq.heappop(ready)]
+            if task.status != TaskStatus.PENDING:
+                continue
+            self._address_task(task, tasks_by_id)
+            try:
+                results[task.id] = await self.execute_task(task)
+            except Exception:
+                self._skip_dependents(task.id, dependents, tasks_by_id)
+                continue
+            finally:
+                self.workflows.update(workflow, task)
+            for dependent_id in dependents[task.id]:
+                remaining[dependent_id] -= 1
+                if remaining[dependent_id] == 0:
+                    heapq.heappush(ready, position[dependent_id])
+
+        self._finish_workflow(workflow, results)
+        return results
+
+    # Global concurrency limit, created lazily so it binds to the running loop
+    def _get_global_limit(self) -> Optional[asyncio.Semaphore]:
+        if self.max_concurrency and self._global_limit is None:
+            self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        return self._global_limit
+
+    # Execute single task once a slot is free in every given limit
+    async def _execute_limited(self, task: Task, limits: List[asyncio.Semaphore]) -> Any:
+        async with contextlib.AsyncExitStack() as stack:
+            if limits:
+                waiting_since = time.perf_counter()
+                TASKS_WAITING.inc()
+                try:
+                    for limit in limits:
+                        await stack.enter_async_context(limit)
+                finally:
+                    TASKS_WAITING.dec()
+                TASK_QUEUE_SECONDS.observe(time.perf_counter() - waiting_since, task.agent_type)
+            return await self.execute_task(task)
+
+    # Mark a task and everything downstream of it as skipped
+    def _skip_dependents(self, task_id: str, dependents: Dict[str, List[str]],
+                         tasks_by_id: Dict[str, Task]):
+        stack = list(dependents.get(task_id, []))
+        while stack:
+            task = tasks_by_id[stack.pop()]
+            if task.status != TaskStatus.PENDING:
+                continue
+            task.error = f"Skipped because dependency {task_id} did not complete"
+            task.completed_at = datetime.now()
+            task.status = TaskStatus.SKIPPED
+            TASKS.inc(task.agent_type, task.method, TaskStatus.SKIPPED.value)
+            print(f"⏭️ Task {task.id} skipped: {task.agent_type}.{task.method}")
+            stack.extend(dependents.get(task.id, []))
+
+    # Execute parallel workflow: each task starts as soon as its dependencies complete
+    async def execute_workflow_parallel(self, workflow_id: str) -> Dict[str, Any]:
+        workflow = self.workflows[workflow_id]
+        workflow.status = TaskStatus.IN_PROGRESS
+        self.workflows.update(workflow)
         results = {}
-        completed_tasks = set()
 
-        while len(completed_tasks) < len(workflow.tasks):
-            executed_this_round = False
+        tasks_by_id, dependents = self._dependency_graph(workflow)
+        remaining = {task.id: len(task.dependencies) for task in workflow.tasks}
+
+        limits = []
+        if workflow.max_concurrency:
+            limits.append(asyncio.Semaphore(workflow.max_concurrency))
+        global_limit = self._get_global_limit()
+        if global_limit is not None:
+            limits.append(global_limit)
+
+        running: Dict[asyncio.Future, Task] = {}
+        # Finished futures are handed over one by one, so each completion costs
+        # O(1) rather than a scan of everything still running
+        finished: asyncio.Queue = asyncio.Queue()
+
+        def start(task: Task):
+            self._address_task(task, tasks_by_id)
+            future = asyncio.ensure_future(self._execute_limited(task, limits))
+            future.add_done_callback(finished.put_nowait)
+            running[future] = task
+
+        try:
             for task in workflow.tasks:
-                if task.status == TaskStatus.PENDING and self._dependencies_met(task, completed_tasks):
-                    result = await self.execute_task(task)
-                    results[task.id] = result
-                    completed_tasks.add(task.id)
-                    executed_this_round = True
-            if not executed_this_round:
-                break
-
-        workflow.status = TaskStatus.COMPLETED
+                if task.status == TaskStatus.PENDING and remaining[task.id] == 0:
+                    start(task)
+
+            while running:
+                future = await finished.get()
+                task = running.pop(future)
+                self.workflows.update(workflow, task)
+                if future.exception() is not None:
+                    self._skip_dependents(task.id, dependents, tasks_by_id)
+                    continue
+                results[task.id] = future.result()
+                for dependent_id in dependents[task.id]:
+                    remaining[dependent_id] -= 1
+                    dependent = tasks_by_id[dependent_id]
+                    if remaining[dependent_id] == 0 and dependent.status == TaskStatus.PENDING:
+                        start(dependent)
+        finally:
+            # Workflow cancelled from outside: stop everything still in flight
+            for future in running:
+                future.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        self._finish_workflow(workflow, results)
+        return results
+
+    # Settle a workflow once no more tasks can run
+    def _finish_workflow(self, workflow: Workflow, results: Dict[str, Any]):
+        # Tasks never reached have unknown or cyclic dependencies
+        for task in workflow.tasks:
+            if task.status == TaskStatus.PENDING:
+                task.error = "Skipped because its dependencies could not be satisfied"
+                task.completed_at = datetime.now()
+                task.status = TaskStatus.SKIPPED
+
+        all_completed = all(task.status == TaskStatus.COMPLETED for task in workflow.tasks)
+        workflow.status = TaskStatus.COMPLETED if all_completed else TaskStatus.FAILED
         workflow.completed_at = datetime.now()
         workflow.results = results
-        return results
 
     # Execute workflow
     async def execute_workflow(self, workflow_id: str) -> Dict[str, Any]:
         if workflow_id not in self.workflows:
             raise ValueError(f"Workflow {workflow_id} not found")
         workflow = self.workflows[workflow_id]
+        start = time.perf_counter()
 
-        if workflow.workflow_type == WorkflowType.SEQUENTIAL:
-            return await self.execute_workflow_sequential(workflow_id)
-        else:
-            raise NotImplementedError("Only sequential workflow is implemented for cricket agents")
+        try:
+            with span("workflow", workflow_id=workflow_id, workflow_type=workflow.workflow_type.value,
+                      task_count=len(workflow.tasks)):
+                if workflow.workflow_type == WorkflowType.SEQUENTIAL:
+                    results = await self.execute_workflow_sequential(workflow_id)
+                else:
+                    results = await self.execute_workflow_parallel(workflow_id)
+        except asyncio.CancelledError:
+            self.mark_workflow_cancelled(workflow_id)
+            raise
+        except Exception:
+            workflow.status = TaskStatus.FAILED
+            workflow.completed_at = datetime.now()
+            self.workflows.save(workflow)
+            raise
+        finally:
+            WORKFLOWS.inc(workflow.workflow_type.value, workflow.status.value)
+            WORKFLOW_SECONDS.observe(time.perf_counter() - start, workflow.workflow_type.value)
+        self.workflows.save(workflow)
+        return results
+
+    # Mark a workflow and its unfinished tasks as cancelled
+    def mark_workflow_cancelled(self, workflow_id: str):
+        workflow = self.workflows[workflow_id]
+        for task in workflow.tasks:
+            if task.status in (TaskStatus.PENDING, TaskStatus.IN_PROGRESS):
+                task.error = "Workflow cancelled"
+                task.completed_at = datetime.now()
+                task.status = TaskStatus.CANCELLED
+        workflow.status = TaskStatus.CANCELLED
+        workflow.completed_at = datetime.now()
+        self.workflows.save(workflow)
+        print(f"🛑 Workflow {workflow_id} cancelled")
 
-    # List workflows
-    def list_workflows(self):
-        return [
-            {"id": w.id, "name": w.name, "status": w.status.value, "task_count": len(w.tasks)}
-            for w in self.workflows.values()
-        ]
+    # List workflows, optionally filtered by status and creation time, and paginated
+    def list_workflows(self, status: Optional[TaskStatus] = None, offset: int = 0,
+                       limit: Optional[int] = None, created_after: Optional[datetime] = None):
+        return self.workflows.list(status=status, offset=offset, limit=limit, created_after=created_after)
 
     # List agents
     def list_agents(self):
-        return list(self.agents.keys())
+        return self.agents.keys()
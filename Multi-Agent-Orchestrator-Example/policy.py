@@ -0,0 +1,178 @@
+"""
+Timeouts, retries and hedging for agent calls
+A TaskPolicy can be set per task, per agent type and globally; unset fields
+fall through to the next level. Retries back off exponentially with full
+jitter, and hedging fires a duplicate call once the original has run past
+the agent's recent p95 latency.
+"""
+
+import asyncio
+import os
+import random
+import sys
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from admission import DeadlineExceededError
+
+
+@dataclass
+class TaskPolicy:
+    # Seconds per attempt, including any hedged duplicate
+    timeout: Optional[float] = None
+    # Extra attempts after a retryable failure
+    max_retries: Optional[int] = None
+    # First backoff in seconds; doubles per retry up to backoff_max
+    backoff: Optional[float] = None
+    backoff_max: Optional[float] = None
+    # Fire a duplicate call when the first runs past hedge_after seconds,
+    # or past the agent's recent p95 latency when only hedge is set
+    hedge: Optional[bool] = None
+    hedge_after: Optional[float] = None
+
+    def merged(self, *fallbacks: Optional["TaskPolicy"]) -> "TaskPolicy":
+        """This policy with unset fields taken from the first fallback that sets them"""
+        values = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            for fallback in fallbacks:
+                if value is not None or fallback is None:
+                    continue
+                value = getattr(fallback, f.name)
+            values[f.name] = value
+        return TaskPolicy(**values)
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+# Global defaults; per-agent and per-task policies override them
+DEFAULT_POLICY = TaskPolicy(
+    timeout=_env_float("TASK_TIMEOUT"),
+    max_retries=int(os.getenv("TASK_MAX_RETRIES", "0")),
+    backoff=float(os.getenv("TASK_RETRY_BACKOFF", "0.5")),
+    backoff_max=float(os.getenv("TASK_RETRY_BACKOFF_MAX", "30")),
+    hedge=True if os.getenv("TASK_HEDGE", "0") == "1" else None,
+    hedge_after=_env_float("TASK_HEDGE_AFTER"),
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection problems, rate limits and server errors are worth retrying"""
+    if isinstance(error, DeadlineExceededError):
+        return False
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # httpx is imported lazily by llm.py; until then none of its errors can exist
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        if isinstance(error, httpx.TransportError):
+            return True
+    return False
+
+
+def backoff_delay(policy: TaskPolicy, retry: int) -> float:
+    """Full-jitter exponential backoff before retry number `retry` (0-based)"""
+    cap = min(policy.backoff_max or 0.0, (policy.backoff or 0.0) * 2 ** retry)
+    return random.uniform(0, cap)
+
+
+class LatencyTracker:
+    """Recent successful call latencies per (agent type, method)"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def record(self, agent_type: str, method: str, seconds: float):
+        samples = self._samples.get((agent_type, method))
+        if samples is None:
+            samples = self._samples[(agent_type, method)] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, agent_type: str, method: str, p: float) -> Optional[float]:
+        """Latency percentile, or None until enough calls have been seen"""
+        samples = self._samples.get((agent_type, method))
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(p / 100 * len(ordered)), len(ordered) - 1)]
+
+
+class CallStats:
+    """Attempt, retry and hedge counters collected while running one task"""
+
+    __slots__ = ("attempts", "retries", "hedges", "hedge_wins")
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def add_call(self, call: "CallStats"):
+        """Fold in one call of a map node: the most attempts any call took, retries and hedges summed"""
+        self.attempts = max(self.attempts, call.attempts)
+        self.retries += call.retries
+        self.hedges += call.hedges
+        self.hedge_wins += call.hedge_wins
+
+
+async def hedged(call: Callable[[], Awaitable[Any]], duplicate: Callable[[], Awaitable[Any]],
+                 hedge_after: Optional[float], stats: CallStats) -> Any:
+    """Await call(); if it is still running after hedge_after seconds, race it against duplicate()"""
+    if hedge_after is None:
+        return await call()
+    first = asyncio.ensure_future(call())
+    racers = {first}
+    try:
+        done, _ = await asyncio.wait(racers, timeout=hedge_after)
+        if done:
+            return first.result()
+        second = asyncio.ensure_future(duplicate())
+        racers.add(second)
+        stats.hedges += 1
+        error = None
+        while racers:
+            done, racers = await asyncio.wait(racers, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        stats.hedge_wins += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+    finally:
+        # Cancel the loser (or both, if we were cancelled ourselves)
+        for future in racers:
+            future.cancel()
+
+
+async def run_with_policy(call: Callable[[], Awaitable[Any]], duplicate: Callable[[], Awaitable[Any]],
+                          policy: TaskPolicy, hedge_after: Optional[float], stats: CallStats) -> Any:
+    """Run call() under the policy's timeout, retrying retryable failures with backoff"""
+    retries = policy.max_retries or 0
+    for retry in range(retries + 1):
+        stats.attempts += 1
+        try:
+            return await asyncio.wait_for(hedged(call, duplicate, hedge_after, stats), policy.timeout)
+        except DeadlineExceededError:
+            raise
+        except asyncio.TimeoutError:
+            if retry == retries:
+                if policy.timeout is None:
+                    # Raised by the call itself (the LLM timeout), not by the policy
+                    raise
+                raise TimeoutError(f"Timed out after {policy.timeout}s "
+                                   f"({stats.attempts} attempt{'s' if stats.attempts > 1 else ''})")
+        except Exception as e:
+            if retry == retries or not is_retryable(e):
+                raise
+        stats.retries += 1
+        await asyncio.sleep(backoff_delay(policy, retry))
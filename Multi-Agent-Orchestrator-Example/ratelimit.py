@@ -0,0 +1,172 @@
+"""
+Client-side rate limiting for the LLM provider
+Token buckets for requests and tokens per minute, shared by every agent in the
+process. Callers wait in FIFO order instead of failing (or, behind the LLM
+scheduler, in its priority order), and rate-limit from the provider feed back into the buckets.
+"""
+
+import asyncio
+import re
+import time
+from typing import Any, Dict, Mapping, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)"""
+    return max(len(text) // 4, 1)
+
+
+_DURATION = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$")
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse Retry-After style seconds ("7") or reset durations ("1m2.5s", "150ms")"""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = _DURATION.match(value)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds, millis = (float(g) if g else 0.0 for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + millis / 1000
+
+
+class TokenBucket:
+    """Bucket holding up to `limit` units that refills to full over `period` seconds"""
+
+    def __init__(self, limit: float, period: float = 60.0):
+        self.limit = limit
+        self.rate = limit / period
+        self.level = float(limit)
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.limit, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (after refill)"""
+        amount = min(amount, self.limit)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter with fair queueing"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, period: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute, period) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, period) if tokens_per_minute else None
+        self._blocked_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self.waiting = 0
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _buckets(self):
+        return [b for b in (self.requests, self.tokens) if b is not None]
+
+    def _reserve(self, tokens: int) -> float:
+        """Take one request and `tokens` tokens, or return how long to wait"""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        for bucket in self._buckets():
+            bucket.refill(now)
+        wait = max([0.0] + [
+            bucket.wait_time(1 if bucket is self.requests else tokens) for bucket in self._buckets()
+        ])
+        if wait > 0:
+            return wait
+        if self.requests is not None:
+            self.requests.level -= 1
+        if self.tokens is not None:
+            self.tokens.level -= min(tokens, self.tokens.limit)
+        return 0.0
+
+    async def acquire(self, tokens: int = 1) -> float:
+        """Wait for capacity for one request of `tokens` tokens; returns seconds waited"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, so only the head of the queue polls
+            async with self._lock:
+                while True:
+                    wait = self._reserve(tokens)
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - start
+        self._record_wait(waited)
+        return waited
+
+    def try_acquire(self, tokens: int = 1, waited: float = 0.0) -> float:
+        """Take capacity for one request without waiting; 0.0 if taken, else seconds until there may be room
+
+        For callers that queue elsewhere (the LLM scheduler); `waited` is how
+        long the call was held back for capacity, for the stats.
+        """
+        wait = self._reserve(tokens)
+        if wait <= 0:
+            self._record_wait(waited)
+        return wait
+
+    def _record_wait(self, waited: float):
+        self.acquired += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def record_usage(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage of a call is known"""
+        if self.tokens is not None:
+            self.tokens.level -= actual - estimated
+
+    def block_for(self, seconds: float):
+        """Hold every caller back for `seconds`, e.g. after a 429"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str], status_code: Optional[int] = None):
+        """Feed provider rate-limit headers (Retry-After, x-ratelimit-*) back into the buckets"""
+        headers = {k.lower(): v for k, v in headers.items()}
+        if status_code == 429:
+            self.throttled += 1
+            retry_after = parse_duration(headers.get("retry-after", "")) or 1.0
+            self.block_for(retry_after)
+        now = time.monotonic()
+        for bucket, name in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{name}")
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            if bucket is not None:
+                bucket.refill(now)
+                bucket.level = min(bucket.level, remaining)
+            if remaining <= 0:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{name}", ""))
+                if reset:
+                    self.block_for(reset)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute_limit": self.requests.limit if self.requests else None,
+            "tokens_per_minute_limit": self.tokens.limit if self.tokens else None,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.acquired, 4) if self.acquired else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 3),
+        }
@@ -0,0 +1,80 @@
+"""
+Compact JSON responses
+Bodies are serialized with orjson when it is installed (plain json without
+whitespace otherwise) and compressed with brotli or gzip when the client
+accepts it and the body is large enough for compression to pay off
+"""
+
+import asyncio
+import gzip
+import json
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library is a few times slower
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent as they are
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+# Bodies larger than this are compressed in a worker thread to keep the event loop free
+COMPRESS_IN_THREAD_BYTES = 64 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported content coding allowed by an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+    for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+async def json_response(request: Request, payload: Any, status_code: int = 200,
+                        headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialize payload, compressing it if the client accepts a supported coding"""
+    body = dumps(payload)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            if len(body) >= COMPRESS_IN_THREAD_BYTES:
+                body = await asyncio.get_running_loop().run_in_executor(None, compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,202 @@
+"""
+Per-agent models and latency-aware model routing
+Built-in agent types and custom agents can each name their own model and
+endpoint. On top of that, an optional router sends short, simple inputs to
+a small, fast model and keeps the agent's own (large) model for the rest.
+A routed call that fails is retried on the large model, and a request can
+ask for the large model outright. The router keeps per-model latency,
+error and token stats, and stops routing to the small model while it is
+failing or slower than the large one.
+"""
+
+import contextlib
+import os
+import threading
+import time
+from contextvars import ContextVar
+from enum import Enum
+from typing import Any, Dict, NamedTuple, Optional, Set
+
+from ratelimit import estimate_tokens
+
+
+def parse_mapping(value: str) -> Dict[str, str]:
+    """"player=llama-3.1-8b-instant,head_coach=llama-3.3-70b-versatile" -> dict"""
+    mapping = {}
+    for part in value.split(","):
+        key, _, item = part.partition("=")
+        if key.strip() and item.strip():
+            mapping[key.strip()] = item.strip()
+    return mapping
+
+
+# Model and named endpoint per agent type or custom agent ID
+AGENT_MODELS = parse_mapping(os.getenv("LLM_AGENT_MODELS", ""))
+AGENT_ENDPOINTS = parse_mapping(os.getenv("LLM_AGENT_ENDPOINTS", ""))
+# Endpoints besides LLM_BASE_URL, by name: "local=http://127.0.0.1:8001/openai/v1"
+ENDPOINTS = parse_mapping(os.getenv("LLM_ENDPOINTS", ""))
+
+# Routing is off unless a small model is configured
+SMALL_MODEL = os.getenv("LLM_ROUTER_SMALL_MODEL")
+# Named endpoint serving the small model; unset is LLM_BASE_URL, whatever the agent's own endpoint
+SMALL_ENDPOINT = os.getenv("LLM_ROUTER_SMALL_ENDPOINT")
+MAX_INPUT_TOKENS = int(os.getenv("LLM_ROUTER_MAX_INPUT_TOKENS", "64"))
+# Agent types or custom agent IDs that may be routed; empty means all of them
+ROUTED_AGENTS = {name.strip() for name in os.getenv("LLM_ROUTER_AGENTS", "").split(",") if name.strip()}
+# A small-model call gets at most this long before the large model takes over
+SMALL_TIMEOUT = float(os.getenv("LLM_ROUTER_SMALL_TIMEOUT", "15"))
+# Recent error rate at which the small model is skipped for ROUTER_COOLDOWN seconds
+MAX_ERROR_RATE = 0.5
+ROUTER_COOLDOWN = float(os.getenv("LLM_ROUTER_COOLDOWN", "30"))
+# While the small model looks slower, one simple call in this many still tries it
+PROBE_EVERY = 20
+EWMA_ALPHA = 0.2
+
+
+class RouteMode(Enum):
+    AUTO = "auto"      # let the router pick
+    LARGE = "large"    # always the agent's own model
+
+# Route mode for the current request, inherited by tasks it spawns
+route_mode = ContextVar("route_mode", default=RouteMode.AUTO)
+
+
+@contextlib.contextmanager
+def use_route_mode(mode: RouteMode):
+    token = route_mode.set(mode)
+    try:
+        yield
+    finally:
+        route_mode.reset(token)
+
+
+def route_mode_for(large_model: bool = False) -> RouteMode:
+    """Map the per-request API flag onto a RouteMode"""
+    return RouteMode.LARGE if large_model else RouteMode.AUTO
+
+
+def check_endpoint(endpoint: Optional[str]):
+    if endpoint is not None and endpoint not in ENDPOINTS:
+        raise ValueError(f"Unknown LLM endpoint {endpoint!r}; configure it in LLM_ENDPOINTS")
+
+
+class Route(NamedTuple):
+    model: str
+    endpoint: Optional[str]
+    reason: str
+
+
+class ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+class ModelRouter:
+    """Picks the model for each call and keeps the per-model stats that drive the choice"""
+
+    def __init__(self, small_model: Optional[str] = SMALL_MODEL, small_endpoint: Optional[str] = SMALL_ENDPOINT,
+                 max_input_tokens: int = MAX_INPUT_TOKENS, agents: Optional[Set[str]] = None,
+                 small_timeout: float = SMALL_TIMEOUT, cooldown: float = ROUTER_COOLDOWN):
+        check_endpoint(small_endpoint)
+        self.small_model = small_model
+        self.small_endpoint = small_endpoint
+        self.max_input_tokens = max_input_tokens
+        self.agents = set(ROUTED_AGENTS if agents is None else agents)
+        self.small_timeout = small_timeout
+        self.cooldown = cooldown
+        self.decisions: Dict[str, int] = {}
+        self.fallbacks = 0
+        self._models: Dict[str, ModelStats] = {}
+        self._avoid_small_until = 0.0
+        self._skipped_since_probe = 0
+        self._lock = threading.Lock()
+
+    def _model(self, model: str) -> ModelStats:
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = ModelStats()
+        return stats
+
+    def choose(self, agent: Any, prompt: str) -> Optional[Route]:
+        """The model for this call, or None when routing does not apply to it"""
+        # Agents that bring their own prompt() are bound to their model
+        if self.small_model is None or hasattr(agent, "prompt") or agent.model == self.small_model:
+            return None
+        if self.agents and getattr(agent, "agent_id", None) not in self.agents:
+            return None
+        large = Route(agent.model, getattr(agent, "endpoint", None), "")
+        if route_mode.get() == RouteMode.LARGE:
+            return large._replace(reason="requested")
+        if estimate_tokens(prompt) > self.max_input_tokens or "\n" in prompt.strip():
+            return large._replace(reason="complex")
+        small = Route(self.small_model, self.small_endpoint, "simple")
+        with self._lock:
+            if time.monotonic() < self._avoid_small_until:
+                return large._replace(reason="small_unhealthy")
+            small_latency = self._model(self.small_model).latency_ewma
+            large_latency = self._model(agent.model).latency_ewma
+            if small_latency is not None and large_latency is not None and small_latency > large_latency:
+                # Keep sampling the small model so a recovery is noticed
+                self._skipped_since_probe += 1
+                if self._skipped_since_probe < PROBE_EVERY:
+                    return large._replace(reason="small_slower")
+                self._skipped_since_probe = 0
+                return small._replace(reason="probe")
+        return small
+
+    def record_decision(self, route: Route):
+        with self._lock:
+            self.decisions[route.reason] = self.decisions.get(route.reason, 0) + 1
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def record(self, model: str, latency: float, ok: bool, prompt_tokens: int = 0, completion_tokens: int = 0):
+        """Outcome of one LLM call (success, error or timeout) on `model`"""
+        with self._lock:
+            stats = self._model(model)
+            stats.calls += 1
+            stats.error_ewma += EWMA_ALPHA * ((0.0 if ok else 1.0) - stats.error_ewma)
+            if ok:
+                stats.latency_total += latency
+                stats.latency_ewma = latency if stats.latency_ewma is None else \
+                    stats.latency_ewma + EWMA_ALPHA * (latency - stats.latency_ewma)
+                stats.prompt_tokens += prompt_tokens
+                stats.completion_tokens += completion_tokens
+            else:
+                stats.errors += 1
+                if model == self.small_model and stats.error_ewma >= MAX_ERROR_RATE:
+                    # Give it a rest, then a clean slate
+                    self._avoid_small_until = time.monotonic() + self.cooldown
+                    stats.error_ewma = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {}
+            for model, stats in self._models.items():
+                succeeded = stats.calls - stats.errors
+                models[model] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "latency_avg_ms": round(stats.latency_total / succeeded * 1000, 1) if succeeded else None,
+                    "latency_ewma_ms": round(stats.latency_ewma * 1000, 1) if stats.latency_ewma is not None else None,
+                    "prompt_tokens": stats.prompt_tokens,
+                    "completion_tokens": stats.completion_tokens,
+                }
+            return {
+                "routing": self.small_model is not None,
+                "small_model": self.small_model,
+                "small_endpoint": self.small_endpoint,
+                "max_input_tokens": self.max_input_tokens,
+                "small_model_paused_for_s": round(max(self._avoid_small_until - time.monotonic(), 0.0), 1),
+                "decisions": dict(self.decisions),
+                "fallbacks": self.fallbacks,
+                "models": models,
+            }
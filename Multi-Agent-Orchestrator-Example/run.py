@@ -1,57 +1,87 @@
+from dotenv import load_dotenv
+
+# Load .env before the app modules below read their settings
+load_dotenv()
+
+import argparse
 import asyncio
 from orchestrator import MultiAgentOrchestrator, WorkflowType
+from policy import TaskPolicy
 
-async def main():
-    print("🏏 Cricket Team Orchestrator")
-    orchestrator = MultiAgentOrchestrator()
-    orchestrator.initialize_agents()
-
+def build_team_workflow(orchestrator: MultiAgentOrchestrator, workflow_type: WorkflowType = WorkflowType.SEQUENTIAL,
+                        max_concurrency: int = None, match_info: str = "Upcoming match against Mumbai Indians",
+                        batter: str = "Virat Kohli", bowler: str = "Jasprit Bumrah", squad: str = "All Players",
+                        policy: TaskPolicy = None) -> str:
     # Workflow: prepare team before match
     workflow_id = orchestrator.create_workflow(
         name="Team Preparation Workflow",
-        workflow_type=WorkflowType.SEQUENTIAL
+        workflow_type=workflow_type,
+        max_concurrency=max_concurrency
     )
 
     # Head Coach plans strategy
     task1 = orchestrator.add_task_to_workflow(
         workflow_id, "head_coach", "plan_strategy",
-        {"match_info": "Upcoming match against Mumbai Indians"}
+        {"match_info": match_info},
+        policy=policy
     )
 
     # Batting Coach trains player (depends on strategy)
     task2 = orchestrator.add_task_to_workflow(
         workflow_id, "batting_coach", "train_batting",
-        {"player_name": "Virat Kohli"},
-        dependencies=[task1]
+        {"player_name": batter},
+        dependencies=[task1], policy=policy
     )
 
     # Bowling Coach trains player (depends on strategy)
     task3 = orchestrator.add_task_to_workflow(
         workflow_id, "bowling_coach", "train_bowling",
-        {"player_name": "Jasprit Bumrah"},
-        dependencies=[task1]
+        {"player_name": bowler},
+        dependencies=[task1], policy=policy
     )
 
     # Physio provides fitness plans
     task4 = orchestrator.add_task_to_workflow(
         workflow_id, "head_physio", "provide_fitness_plan",
-        {"player_name": "All Players"},
-        dependencies=[task1]
+        {"player_name": squad},
+        dependencies=[task1], policy=policy
     )
 
     # Player reports performance (depends on training and fitness)
-    task5 = orchestrator.add_task_to_workflow(
+    orchestrator.add_task_to_workflow(
         workflow_id, "player", "report_performance",
-        {"player_name": "All Players"},
-        dependencies=[task2, task3, task4]
+        {"player_name": squad},
+        dependencies=[task2, task3, task4], policy=policy
     )
+    return workflow_id
+
+async def main(workflow_type: WorkflowType = WorkflowType.SEQUENTIAL, max_concurrency: int = None):
+    print("🏏 Cricket Team Orchestrator")
+    orchestrator = MultiAgentOrchestrator()
+    orchestrator.initialize_agents()
+    workflow_id = build_team_workflow(orchestrator, workflow_type, max_concurrency)
 
     print("🔄 Executing workflow...")
     results = await orchestrator.execute_workflow(workflow_id)
 
-    print("\n✅ Workflow Completed!\nResults:")
+    workflow = orchestrator.workflows[workflow_id]
+    if workflow.status.value == "completed":
+        print("\n✅ Workflow Completed!\nResults:")
+    else:
+        print(f"\n❌ Workflow {workflow.status.value}!")
+        for task in workflow.tasks:
+            if task.error:
+                print(f"{task.id} ({task.agent_type}.{task.method}) {task.status.value}: {task.error}")
+        print("Results:")
     for task_id, output in results.items():
         print(f"{task_id}: {output[:300]}...")  # truncate long text
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Run the Team Preparation workflow")
+    parser.add_argument("--workflow-type", choices=[t.value for t in WorkflowType],
+                        default=WorkflowType.SEQUENTIAL.value,
+                        help="Run tasks one at a time or as soon as their dependencies complete")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Maximum number of tasks running at once in a parallel workflow")
+    cli_args = parser.parse_args()
+    asyncio.run(main(WorkflowType(cli_args.workflow_type), cli_args.max_concurrency))
@@ -0,0 +1,265 @@
+"""
+Priority classes and fair sharing of LLM capacity
+Every LLM call that misses the cache takes one of a fixed number of slots.
+When they are all taken, waiting calls are started in priority order
+(interactive, then workflow, then bulk), and within a class by weighted
+fair queuing per tenant, so one caller with a big backlog cannot starve the
+others. A few slots are held back for interactive calls so a chat request
+never waits behind a wall of batch work. With a rate limiter attached, a
+call is only started once there is rate budget for it too, and budget is
+handed out in the same order, so no slot sits idle waiting for it.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+import time
+from contextvars import ContextVar
+from enum import Enum
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from admission import DeadlineExceededError, remaining_time
+from metrics import (
+    LLM_RATE_LIMIT_WAIT_SECONDS, LLM_SCHEDULER_QUEUED, LLM_SCHEDULER_RUNNING, LLM_SCHEDULER_WAIT_SECONDS,
+)
+from ratelimit import RateLimiter
+
+
+class Priority(Enum):
+    INTERACTIVE = "interactive"    # a person is waiting on the answer
+    WORKFLOW = "workflow"          # multi-task workflows
+    BULK = "bulk"                  # batch endpoints and bulk runs
+
+
+# Highest first
+PRIORITIES = (Priority.INTERACTIVE, Priority.WORKFLOW, Priority.BULK)
+
+
+class CallClass(NamedTuple):
+    priority: Priority
+    tenant: str
+
+
+# Class of the calls made for the current request, inherited by tasks it spawns
+call_class = ContextVar("call_class", default=CallClass(Priority.WORKFLOW, "default"))
+
+
+@contextlib.contextmanager
+def use_call_class(priority: Optional[Priority] = None, tenant: Optional[str] = None):
+    """Run the block's LLM calls under a priority and/or tenant, keeping the other from the caller"""
+    current = call_class.get()
+    token = call_class.set(CallClass(priority or current.priority, tenant or current.tenant))
+    try:
+        yield
+    finally:
+        call_class.reset(token)
+
+
+def lower_priority(requested: Optional[str], default: Priority) -> Priority:
+    """`requested` if it is a known class no higher than `default`; callers may only step down"""
+    try:
+        priority = Priority(requested) if requested else default
+    except ValueError:
+        return default
+    return priority if PRIORITIES.index(priority) >= PRIORITIES.index(default) else default
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """"tenant-a=4,tenant-b=1" -> {"tenant-a": 4.0, "tenant-b": 1.0}"""
+    weights = {}
+    for part in value.split(","):
+        tenant, _, weight = part.partition("=")
+        if tenant.strip() and weight.strip():
+            weights[tenant.strip()] = float(weight)
+    return weights
+
+
+SLOTS = int(os.getenv("LLM_SCHEDULER_SLOTS", os.getenv("LLM_MAX_CONNECTIONS", "100")))
+# Default: a tenth of the slots can only be taken by interactive calls
+RESERVED_INTERACTIVE = os.getenv("LLM_SCHEDULER_RESERVED_INTERACTIVE")
+TENANT_WEIGHTS = parse_weights(os.getenv("LLM_SCHEDULER_WEIGHTS", ""))
+# Tenants whose virtual finish time has fallen behind are forgotten past this many
+MAX_TRACKED_TENANTS = 4096
+
+
+class ClassStats:
+    def __init__(self):
+        self.running = 0
+        self.admitted = 0
+        self.waited = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+
+class FairScheduler:
+    """Strict priority between classes, weighted fair queuing between tenants within a class"""
+
+    def __init__(self, slots: int = SLOTS, reserved_interactive: Optional[int] = None,
+                 weights: Optional[Dict[str, float]] = None, limiter: Optional[RateLimiter] = None):
+        self.slots = slots
+        if reserved_interactive is None:
+            reserved_interactive = int(RESERVED_INTERACTIVE) if RESERVED_INTERACTIVE else slots // 10
+        self.reserved_interactive = min(reserved_interactive, max(slots - 1, 0))
+        self.weights = dict(TENANT_WEIGHTS if weights is None else weights)
+        self.limiter = limiter
+        self._queues: Dict[Priority, List[Tuple[float, int, asyncio.Future, float, int]]] = {
+            p: [] for p in PRIORITIES
+        }
+        self._virtual_time: Dict[Priority, float] = {p: 0.0 for p in PRIORITIES}
+        self._last_finish: Dict[Tuple[Priority, str], float] = {}
+        self._sequence = itertools.count()
+        self._stats = {p: ClassStats() for p in PRIORITIES}
+        # Next call waiting only for rate budget, since when, and the timer that retries it
+        self._budget_blocked: Optional[Tuple[Optional[asyncio.Future], float]] = None
+        self._budget_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def running(self) -> int:
+        return sum(stats.running for stats in self._stats.values())
+
+    def _has_room(self, priority: Priority) -> bool:
+        limit = self.slots if priority == Priority.INTERACTIVE else self.slots - self.reserved_interactive
+        busy = self.running if priority == Priority.INTERACTIVE else \
+            self.running - self._stats[Priority.INTERACTIVE].running
+        return self.running < self.slots and busy < limit
+
+    def _waiting_ahead(self, priority: Priority) -> bool:
+        """Whether a call of this class or a higher one is already queued"""
+        return any(self._queues[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+
+    def _take_budget(self, tokens: int, waiter: Optional[asyncio.Future]) -> bool:
+        """Reserve rate budget for the next call, or arrange to dispatch again once there is some"""
+        if self.limiter is None:
+            return True
+        waited = 0.0
+        if self._budget_blocked is not None and self._budget_blocked[0] is waiter:
+            waited = time.perf_counter() - self._budget_blocked[1]
+        wait = self.limiter.try_acquire(tokens, waited)
+        if wait > 0:
+            if self._budget_blocked is None or self._budget_blocked[0] is not waiter:
+                self._budget_blocked = (waiter, time.perf_counter())
+            if self._budget_timer is None:
+                self._budget_timer = asyncio.get_running_loop().call_later(wait, self._budget_refilled)
+            return False
+        self._budget_blocked = None
+        LLM_RATE_LIMIT_WAIT_SECONDS.observe(waited)
+        return True
+
+    def _budget_refilled(self):
+        self._budget_timer = None
+        self._dispatch()
+
+    def _start(self, priority: Priority, waited: Optional[float]):
+        stats = self._stats[priority]
+        stats.running += 1
+        stats.admitted += 1
+        LLM_SCHEDULER_RUNNING.inc(priority.value)
+        if waited is not None:
+            stats.waited += 1
+            stats.wait_seconds_total += waited
+            stats.wait_seconds_max = max(stats.wait_seconds_max, waited)
+        LLM_SCHEDULER_WAIT_SECONDS.observe(waited or 0.0, priority.value)
+
+    async def acquire(self, cost: float = 1.0, tokens: int = 1) -> Priority:
+        """Wait for a slot (and rate budget for `tokens`) for the current call class; returns the class to release"""
+        priority, tenant = call_class.get()
+        if self._has_room(priority) and not self._waiting_ahead(priority) and self._take_budget(tokens, None):
+            self._start(priority, None)
+            return priority
+
+        # Virtual finish time: a tenant's calls are spaced cost/weight apart
+        key = (priority, tenant)
+        start_tag = max(self._virtual_time[priority], self._last_finish.get(key, 0.0))
+        finish_tag = start_tag + cost / self.weights.get(tenant, 1.0)
+        self._last_finish[key] = finish_tag
+        if len(self._last_finish) > MAX_TRACKED_TENANTS:
+            self._forget_idle_tenants()
+
+        waiter = asyncio.get_running_loop().create_future()
+        queued_at = time.perf_counter()
+        heapq.heappush(self._queues[priority], (finish_tag, next(self._sequence), waiter, queued_at, tokens))
+        LLM_SCHEDULER_QUEUED.inc(priority.value)
+        # Entries left behind by callers that gave up may be all that stood in the way
+        self._dispatch()
+        try:
+            remaining = remaining_time()
+            await asyncio.wait_for(asyncio.shield(waiter), remaining)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                raise DeadlineExceededError("Request deadline passed while waiting for LLM capacity")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as we were cancelled
+                if self.limiter is not None:
+                    self.limiter.record_usage(tokens, 0)
+                self.release(priority)
+            else:
+                waiter.cancel()
+            raise
+        return priority
+
+    def release(self, priority: Priority):
+        self._stats[priority].running -= 1
+        LLM_SCHEDULER_RUNNING.dec(priority.value)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Start the next waiting calls while there is room for them"""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                finish_tag, _, waiter, queued_at, tokens = queue[0]
+                if waiter.done():
+                    # Gave up waiting (cancelled or deadline)
+                    heapq.heappop(queue)
+                    LLM_SCHEDULER_QUEUED.dec(priority.value)
+                    continue
+                if not self._has_room(priority):
+                    break
+                if not self._take_budget(tokens, waiter):
+                    # Nothing behind this call may spend the budget first
+                    return
+                heapq.heappop(queue)
+                LLM_SCHEDULER_QUEUED.dec(priority.value)
+                self._virtual_time[priority] = max(self._virtual_time[priority], finish_tag)
+                self._start(priority, time.perf_counter() - queued_at)
+                waiter.set_result(None)
+            if queue and self.running >= self.slots:
+                return
+
+    def _forget_idle_tenants(self):
+        # A tenant that has fallen behind virtual time restarts from it anyway
+        self._last_finish = {key: finish for key, finish in self._last_finish.items()
+                             if finish > self._virtual_time[key[0]]}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, cost: float = 1.0):
+        priority = await self.acquire(cost)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> Dict[str, Any]:
+        classes = {}
+        for priority in PRIORITIES:
+            stats = self._stats[priority]
+            classes[priority.value] = {
+                "running": stats.running,
+                "queued": sum(1 for entry in self._queues[priority] if not entry[2].done()),
+                "admitted": stats.admitted,
+                "waited": stats.waited,
+                "wait_seconds_avg": round(stats.wait_seconds_total / stats.waited, 4) if stats.waited else 0.0,
+                "wait_seconds_max": round(stats.wait_seconds_max, 4),
+            }
+        return {"slots": self.slots, "reserved_interactive": self.reserved_interactive,
+                "running": self.running, "waiting_for_rate_limit": self._budget_timer is not None,
+                "classes": classes}
+
+
+def create_scheduler(limiter: Optional[RateLimiter] = None) -> Optional[FairScheduler]:
+    """Scheduler configured by LLM_SCHEDULER_*, or None when LLM_SCHEDULER_SLOTS is 0"""
+    return FairScheduler(limiter=limiter) if SLOTS > 0 else None
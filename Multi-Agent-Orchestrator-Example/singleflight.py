@@ -0,0 +1,98 @@
+"""
+Single-flight coalescing of identical in-flight agent calls
+Concurrent callers with the same key share one pending call and all receive
+its result or its error. Each caller keeps its own request deadline.
+"""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from admission import DeadlineExceededError, remaining_time, request_deadline
+from cache import cache_mode
+from routing import route_mode
+from scheduler import call_class
+
+
+def call_key(agent_type: str, method: str, args: Dict[str, Any]) -> Hashable:
+    """Key identifying an agent call by agent type, method and arguments.
+
+    The current cache mode, route mode and call class are part of the key:
+    the shared call runs under the first caller's, so only callers that
+    agree on them may share it.
+    """
+    return (agent_type, method, json.dumps(args, sort_keys=True, default=str),
+            cache_mode.get(), route_mode.get(), call_class.get())
+
+
+class _Call:
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key.
+
+    The shared call is only cancelled once every waiter has gone away, so a
+    single caller disconnecting never kills a result others are waiting for.
+    It runs without a request deadline; each caller applies its own deadline
+    to its wait instead, so a short one doesn't fail the call for the rest.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the error as retrieved even if every waiter was cancelled
+        if not call.future.cancelled():
+            call.future.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            self.calls += 1
+            token = request_deadline.set(None)
+            try:
+                call = _Call(asyncio.ensure_future(fn()))
+            finally:
+                request_deadline.reset(token)
+            self._calls[key] = call
+            call.future.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            remaining = remaining_time()
+            if remaining is None:
+                return await asyncio.shield(call.future)
+            try:
+                return await asyncio.wait_for(asyncio.shield(call.future), max(remaining, 0))
+            except asyncio.TimeoutError:
+                if call.future.done():
+                    # The call itself timed out; pass its own error on
+                    return call.future.result()
+                # Nobody else is waiting: don't spend the rest of the call
+                if call.waiters == 1:
+                    call.future.cancel()
+                raise DeadlineExceededError("Request deadline passed while waiting for the agent call")
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.future.done():
+                call.future.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": self.in_flight}
@@ -0,0 +1,556 @@
+"""
+Workflow and custom agent stores
+Keep workflows that are still running as live objects and compact finished
+ones, either into bounded in-memory records or into SQLite with task
+results stored out of line. The SQLite stores can be shared by several
+API worker processes pointed at the same file.
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from models import (FINISHED_STATUSES, Task, TaskRecord, TaskStatus, Workflow, WorkflowRecord,
+                    WorkflowType)
+
+StoredWorkflow = Union[Workflow, WorkflowRecord]
+
+# Seconds a write waits for another process holding the SQLite write lock
+BUSY_TIMEOUT = float(os.getenv("STORE_BUSY_TIMEOUT", "10"))
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """SQLite connection in WAL mode, safe to share between processes"""
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    # WAL keeps the database consistent without an fsync on every commit
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def summarize(workflow: StoredWorkflow) -> Dict[str, Any]:
+    return {"id": workflow.id, "name": workflow.name, "status": workflow.status.value,
+            "task_count": len(workflow.tasks)}
+
+
+class WorkflowStore:
+    """Interface shared by the workflow stores.
+
+    Supports the mapping operations the orchestrator uses (``in``, ``[]``,
+    ``get``, ``del``). ``add`` registers a new live workflow, ``update``
+    records its progress and ``save`` is called once it has finished so
+    the store can compact or persist it. A ``shared`` store is visible to
+    other processes, which see progress and can ask for cancellation.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._active: Dict[str, Workflow] = {}
+
+    def add(self, workflow: Workflow):
+        self._active[workflow.id] = workflow
+
+    def update(self, workflow: Workflow, task: Optional[Task] = None):
+        """Publish a live workflow's state, or just one task's, to other processes"""
+
+    def save(self, workflow: Workflow):
+        raise NotImplementedError
+
+    def is_live(self, workflow_id: str) -> bool:
+        """Whether the workflow is running (or queued) in this process"""
+        return workflow_id in self._active
+
+    def request_cancel(self, workflow_id: str) -> bool:
+        """Ask whichever process runs the workflow to cancel it"""
+        return False
+
+    def cancel_requested(self, workflow_ids: List[str]) -> Set[str]:
+        """The given live workflows that another process asked to cancel"""
+        return set()
+
+    def _get_finished(self, workflow_id: str) -> Optional[WorkflowRecord]:
+        raise NotImplementedError
+
+    def _delete_finished(self, workflow_id: str) -> bool:
+        raise NotImplementedError
+
+    def _iter_finished(self, status: Optional[TaskStatus],
+                       created_after: Optional[datetime]) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def get(self, workflow_id: str) -> Optional[StoredWorkflow]:
+        workflow = self._active.get(workflow_id)
+        if workflow is not None:
+            return workflow
+        return self._get_finished(workflow_id)
+
+    def __getitem__(self, workflow_id: str) -> StoredWorkflow:
+        workflow = self.get(workflow_id)
+        if workflow is None:
+            raise KeyError(workflow_id)
+        return workflow
+
+    def __contains__(self, workflow_id: str) -> bool:
+        return self.get(workflow_id) is not None
+
+    def __delitem__(self, workflow_id: str):
+        if self._active.pop(workflow_id, None) is None and not self._delete_finished(workflow_id):
+            raise KeyError(workflow_id)
+
+    def list(self, status: Optional[TaskStatus] = None, offset: int = 0,
+             limit: Optional[int] = None, created_after: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Workflow summaries: running ones first, then finished ones in the store's order"""
+        active = (
+            summarize(w) for w in list(self._active.values())
+            if (status is None or w.status == status)
+            and (created_after is None or w.created_at > created_after)
+        )
+        finished = self._iter_finished(status, created_after) if status not in (
+            TaskStatus.PENDING, TaskStatus.IN_PROGRESS) else iter(())
+        stop = offset + limit if limit is not None else None
+        return list(itertools.islice(itertools.chain(active, finished), offset, stop))
+
+
+class InMemoryWorkflowStore(WorkflowStore):
+    """Keeps finished workflows as compact records, evicting by LRU and age"""
+
+    def __init__(self, max_workflows: int = 10000, max_age: Optional[float] = None):
+        super().__init__()
+        self.max_workflows = max_workflows
+        self.max_age = max_age
+        # Finished records in least-recently-used order
+        self._finished: "OrderedDict[str, WorkflowRecord]" = OrderedDict()
+        # Finished workflow ids per status, in completion order
+        self._by_status: Dict[TaskStatus, Dict[str, None]] = {s: {} for s in FINISHED_STATUSES}
+        self.evictions = 0
+
+    def _expired(self, record: WorkflowRecord) -> bool:
+        if self.max_age is None or record.completed_at is None:
+            return False
+        return (datetime.now() - record.completed_at).total_seconds() > self.max_age
+
+    def _evict(self):
+        while len(self._finished) > self.max_workflows:
+            self._drop(next(iter(self._finished)))
+        while self._finished:
+            record = next(iter(self._finished.values()))
+            if not self._expired(record):
+                break
+            self._drop(record.id)
+
+    def _drop(self, workflow_id: str):
+        record = self._finished.pop(workflow_id)
+        self._by_status[record.status].pop(workflow_id, None)
+        self.evictions += 1
+
+    def save(self, workflow: Workflow):
+        self._active.pop(workflow.id, None)
+        record = WorkflowRecord.from_workflow(workflow)
+        self._finished[workflow.id] = record
+        self._by_status[record.status][workflow.id] = None
+        self._evict()
+
+    def _get_finished(self, workflow_id: str) -> Optional[WorkflowRecord]:
+        record = self._finished.get(workflow_id)
+        if record is None:
+            return None
+        if self._expired(record):
+            self._drop(workflow_id)
+            return None
+        self._finished.move_to_end(workflow_id)
+        return record
+
+    def _delete_finished(self, workflow_id: str) -> bool:
+        record = self._finished.pop(workflow_id, None)
+        if record is None:
+            return False
+        self._by_status[record.status].pop(workflow_id, None)
+        return True
+
+    def _iter_finished(self, status: Optional[TaskStatus],
+                       created_after: Optional[datetime]) -> Iterator[Dict[str, Any]]:
+        """Finished summaries grouped by status, each group in completion order"""
+        if status is None:
+            ids = itertools.chain.from_iterable(list(ids) for ids in self._by_status.values())
+        else:
+            ids = list(self._by_status.get(status, ()))
+        for workflow_id in ids:
+            record = self._finished.get(workflow_id)
+            if record is not None and (created_after is None or record.created_at > created_after):
+                yield summarize(record)
+
+    def __len__(self) -> int:
+        return len(self._active) + len(self._finished)
+
+
+class SQLiteWorkflowStore(WorkflowStore):
+    """Persists workflows to SQLite, keeping task results in a separate blob table.
+
+    Live workflows are written as they progress, so every process sharing
+    the file can list and read them, not only the one running them.
+    """
+
+    PAGE_SIZE = 500
+    shared = True
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS workflows (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                workflow_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                max_concurrency INTEGER,
+                task_count INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                completed_at REAL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS workflows_status_created ON workflows (status, created_at);
+            CREATE INDEX IF NOT EXISTS workflows_created ON workflows (created_at);
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                workflow_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                agent_type TEXT NOT NULL,
+                method TEXT NOT NULL,
+                args TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                dependencies TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                completed_at REAL,
+                started_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                hedges INTEGER NOT NULL DEFAULT 0,
+                hedge_wins INTEGER NOT NULL DEFAULT 0,
+                input_hash TEXT,
+                result_hash TEXT,
+                reused INTEGER NOT NULL DEFAULT 0,
+                map_over TEXT
+            );
+            CREATE INDEX IF NOT EXISTS tasks_workflow ON tasks (workflow_id, position);
+            CREATE TABLE IF NOT EXISTS task_results (
+                task_id TEXT PRIMARY KEY,
+                result TEXT,
+                is_json INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        # Columns added since the first version of the schema
+        for table, column, definition in (
+                ("tasks", "started_at", "REAL"), ("tasks", "attempts", "INTEGER NOT NULL DEFAULT 0"),
+                ("tasks", "hedges", "INTEGER NOT NULL DEFAULT 0"),
+                ("tasks", "hedge_wins", "INTEGER NOT NULL DEFAULT 0"),
+                ("tasks", "input_hash", "TEXT"), ("tasks", "result_hash", "TEXT"),
+                ("tasks", "reused", "INTEGER NOT NULL DEFAULT 0"), ("tasks", "map_over", "TEXT"),
+                ("workflows", "cancel_requested", "INTEGER NOT NULL DEFAULT 0"),
+                ("task_results", "is_json", "INTEGER NOT NULL DEFAULT 0")):
+            columns = [row[1] for row in self._db.execute(f"PRAGMA table_info({table})")]
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self._db.commit()
+
+    @staticmethod
+    def _timestamp(value: Optional[datetime]) -> Optional[float]:
+        return value.timestamp() if value is not None else None
+
+    @staticmethod
+    def _datetime(value: Optional[float]) -> Optional[datetime]:
+        return datetime.fromtimestamp(value) if value is not None else None
+
+    @staticmethod
+    def _result(task: Task) -> Tuple[str, str, bool]:
+        """task_results row: text results as they are, anything else (map results) as JSON"""
+        if isinstance(task.result, str):
+            return task.id, task.result, False
+        return task.id, json.dumps(task.result, default=str), True
+
+    def _write(self, workflow: Workflow):
+        with self._lock, self._db:
+            # Rewriting the row also clears any cancellation request
+            self._db.execute(
+                "INSERT OR REPLACE INTO workflows (id, name, workflow_type, status, max_concurrency, "
+                "task_count, created_at, completed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (workflow.id, workflow.name, workflow.workflow_type.value, workflow.status.value,
+                 workflow.max_concurrency, len(workflow.tasks),
+                 self._timestamp(workflow.created_at), self._timestamp(workflow.completed_at)),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(task.id, workflow.id, position, task.agent_type, task.method,
+                  json.dumps(task.args, default=str), task.status.value, task.error,
+                  json.dumps(task.dependencies), self._timestamp(task.created_at),
+                  self._timestamp(task.completed_at), self._timestamp(task.started_at),
+                  task.attempts, task.hedges, task.hedge_wins, task.input_hash, task.result_hash, task.reused,
+                  task.map_over)
+                 for position, task in enumerate(workflow.tasks)],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO task_results VALUES (?, ?, ?)",
+                [self._result(task) for task in workflow.tasks if task.result is not None],
+            )
+
+    def update(self, workflow: Workflow, task: Optional[Task] = None):
+        if task is None:
+            self._write(workflow)
+            return
+        with self._lock, self._db:
+            self._db.execute("UPDATE workflows SET status = ? WHERE id = ?",
+                             (workflow.status.value, workflow.id))
+            self._db.execute(
+                "UPDATE tasks SET status = ?, error = ?, started_at = ?, completed_at = ?, attempts = ?, "
+                "hedges = ?, hedge_wins = ?, input_hash = ?, result_hash = ?, reused = ? WHERE id = ?",
+                (task.status.value, task.error, self._timestamp(task.started_at),
+                 self._timestamp(task.completed_at), task.attempts, task.hedges, task.hedge_wins,
+                 task.input_hash, task.result_hash, task.reused, task.id),
+            )
+            if task.result is not None:
+                self._db.execute("INSERT OR REPLACE INTO task_results VALUES (?, ?, ?)", self._result(task))
+
+    def save(self, workflow: Workflow):
+        self._write(workflow)
+        self._active.pop(workflow.id, None)
+
+    def request_cancel(self, workflow_id: str) -> bool:
+        with self._lock, self._db:
+            return self._db.execute(
+                "UPDATE workflows SET cancel_requested = 1 WHERE id = ? AND status IN (?, ?)",
+                (workflow_id, TaskStatus.PENDING.value, TaskStatus.IN_PROGRESS.value),
+            ).rowcount > 0
+
+    def cancel_requested(self, workflow_ids: List[str]) -> Set[str]:
+        if not workflow_ids:
+            return set()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id FROM workflows WHERE cancel_requested = 1 AND id IN "
+                f"({', '.join('?' * len(workflow_ids))})", workflow_ids,
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def load_result(self, task_id: str) -> Any:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, is_json FROM task_results WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]) if row[1] else row[0]
+
+    def _get_finished(self, workflow_id: str) -> Optional[WorkflowRecord]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, name, workflow_type, status, max_concurrency, created_at, completed_at "
+                "FROM workflows WHERE id = ?", (workflow_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            task_rows = self._db.execute(
+                "SELECT id, agent_type, method, args, status, error, dependencies, created_at, "
+                "completed_at, started_at, attempts, hedges, hedge_wins, input_hash, result_hash, reused, "
+                "map_over FROM tasks WHERE workflow_id = ? ORDER BY position", (workflow_id,)
+            ).fetchall()
+        tasks = [
+            TaskRecord(t[0], t[1], t[2], json.loads(t[3]), TaskStatus(t[4]), t[5], json.loads(t[6]),
+                       self._datetime(t[7]), self._datetime(t[8]), load_result=self.load_result,
+                       started_at=self._datetime(t[9]), attempts=t[10], hedges=t[11], hedge_wins=t[12],
+                       input_hash=t[13], result_hash=t[14], reused=bool(t[15]), map_over=t[16])
+            for t in task_rows
+        ]
+        return WorkflowRecord(row[0], row[1], WorkflowType(row[2]), TaskStatus(row[3]), tasks,
+                              row[4], self._datetime(row[5]), self._datetime(row[6]))
+
+    def _delete_finished(self, workflow_id: str) -> bool:
+        with self._lock, self._db:
+            deleted = self._db.execute("DELETE FROM workflows WHERE id = ?", (workflow_id,)).rowcount
+            self._db.execute(
+                "DELETE FROM task_results WHERE task_id IN (SELECT id FROM tasks WHERE workflow_id = ?)",
+                (workflow_id,),
+            )
+            self._db.execute("DELETE FROM tasks WHERE workflow_id = ?", (workflow_id,))
+        return deleted > 0
+
+    def _iter_finished(self, status: Optional[TaskStatus],
+                       created_after: Optional[datetime]) -> Iterator[Dict[str, Any]]:
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status.value)
+        if created_after is not None:
+            conditions.append("created_at > ?")
+            params.append(created_after.timestamp())
+        # Keyset pagination so a listing never materialises every row
+        last_seen = None
+        while True:
+            page_conditions, page_params = list(conditions), list(params)
+            if last_seen is not None:
+                page_conditions.append("(created_at, id) > (?, ?)")
+                page_params.extend(last_seen)
+            query = "SELECT id, name, status, task_count, created_at FROM workflows"
+            if page_conditions:
+                query += " WHERE " + " AND ".join(page_conditions)
+            query += " ORDER BY created_at, id LIMIT ?"
+            page_params.append(self.PAGE_SIZE)
+            with self._lock:
+                rows = self._db.execute(query, page_params).fetchall()
+            for row in rows:
+                yield {"id": row[0], "name": row[1], "status": row[2], "task_count": row[3]}
+            if len(rows) < self.PAGE_SIZE:
+                return
+            last_seen = (rows[-1][4], rows[-1][0])
+
+    def list(self, status: Optional[TaskStatus] = None, offset: int = 0,
+             limit: Optional[int] = None, created_after: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Workflow summaries oldest first, including those running in other processes"""
+        stop = offset + limit if limit is not None else None
+        return list(itertools.islice(self._iter_finished(status, created_after), offset, stop))
+
+    def __len__(self) -> int:
+        with self._lock:
+            stored = self._db.execute("SELECT COUNT(*) FROM workflows").fetchone()[0]
+        # Live workflows not yet written are only known to this process
+        return stored + sum(1 for workflow_id in list(self._active) if not self._stored(workflow_id))
+
+    def _stored(self, workflow_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM workflows WHERE id = ?", (workflow_id,)).fetchone() is not None
+
+
+def create_store() -> WorkflowStore:
+    """Build the workflow store selected by the WORKFLOW_STORE* environment variables"""
+    backend = os.getenv("WORKFLOW_STORE", "memory")
+    if backend == "sqlite":
+        return SQLiteWorkflowStore(os.getenv("WORKFLOW_STORE_PATH", "workflows.db"))
+    if backend == "memory":
+        max_age = os.getenv("WORKFLOW_STORE_MAX_AGE")
+        return InMemoryWorkflowStore(
+            max_workflows=int(os.getenv("WORKFLOW_STORE_MAX", "10000")),
+            max_age=float(max_age) if max_age else None,
+        )
+    raise ValueError(f"Unknown workflow store {backend}")
+
+
+class AgentStore:
+    """Custom agent definitions, as the JSON-able dicts the API accepts and returns"""
+
+    def put(self, definition: Dict[str, Any]):
+        raise NotImplementedError
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete(self, agent_id: str) -> bool:
+        raise NotImplementedError
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Definitions in the order they were first added"""
+        raise NotImplementedError
+
+    def version(self) -> int:
+        """Counter bumped by every put and delete, so readers can cache listings"""
+        raise NotImplementedError
+
+
+class InMemoryAgentStore(AgentStore):
+    """Definitions held by this process only"""
+
+    def __init__(self):
+        self._definitions: Dict[str, Dict[str, Any]] = {}
+        self._version = 0
+
+    def put(self, definition: Dict[str, Any]):
+        self._definitions[definition["id"]] = definition
+        self._version += 1
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        return self._definitions.get(agent_id)
+
+    def delete(self, agent_id: str) -> bool:
+        if self._definitions.pop(agent_id, None) is None:
+            return False
+        self._version += 1
+        return True
+
+    def list(self) -> List[Dict[str, Any]]:
+        return list(self._definitions.values())
+
+    def version(self) -> int:
+        return self._version
+
+
+class SQLiteAgentStore(AgentStore):
+    """Definitions in SQLite, shared by every process using the same file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS custom_agents (
+                id TEXT PRIMARY KEY,
+                definition TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS custom_agents_version (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO custom_agents_version VALUES (0, 0);
+        """)
+        self._db.commit()
+
+    def _bump_version(self):
+        self._db.execute("UPDATE custom_agents_version SET version = version + 1")
+
+    def put(self, definition: Dict[str, Any]):
+        with self._lock, self._db:
+            # Redefining an agent keeps its place in the listing
+            self._db.execute(
+                "INSERT INTO custom_agents (id, definition, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET definition = excluded.definition",
+                (definition["id"], json.dumps(definition), datetime.now().timestamp()),
+            )
+            self._bump_version()
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT definition FROM custom_agents WHERE id = ?", (agent_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, agent_id: str) -> bool:
+        with self._lock, self._db:
+            if self._db.execute("DELETE FROM custom_agents WHERE id = ?", (agent_id,)).rowcount == 0:
+                return False
+            self._bump_version()
+            return True
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT definition FROM custom_agents ORDER BY created_at, id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def version(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT version FROM custom_agents_version").fetchone()[0]
+
+
+def create_agent_store() -> AgentStore:
+    """Build the custom agent store; it follows WORKFLOW_STORE and shares its SQLite file"""
+    backend = os.getenv("WORKFLOW_STORE", "memory")
+    if backend == "sqlite":
+        return SQLiteAgentStore(os.getenv("WORKFLOW_STORE_PATH", "workflows.db"))
+    if backend == "memory":
+        return InMemoryAgentStore()
+    raise ValueError(f"Unknown workflow store {backend}")
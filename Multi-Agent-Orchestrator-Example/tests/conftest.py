@@ -0,0 +1,35 @@
+"""
+Shared test setup
+A stub LLM server stands in for the provider for the whole session; the
+environment pointing the app at it is set before any app module is
+imported, since they read their configuration at import time.
+"""
+
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(TESTS_DIR, "..")
+sys.path[:0] = [APP_DIR, os.path.join(APP_DIR, "benchmarks")]
+
+import pytest
+
+from stub_llm import StubLLMServer
+
+_stub = StubLLMServer(latency=0.01).start()
+os.environ.update({
+    "LLM_BASE_URL": _stub.base_url,
+    "GROQ_API_KEY": "stub",
+    "LLM_RPM": "0",
+    "LLM_TPM": "0",
+    "LLM_CACHE_SIZE": "0",
+})
+
+
+def pytest_unconfigure(config):
+    _stub.stop()
+
+
+@pytest.fixture
+def stub_llm() -> StubLLMServer:
+    return _stub
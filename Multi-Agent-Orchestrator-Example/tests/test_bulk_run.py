@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import bulk_run
+
+
+def write_rows(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"row{i}", "player_name": f"Player {i}"}) + "\n")
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def run(input_path, output_path, *extra):
+    return bulk_run.main([str(input_path), str(output_path), "--concurrency", "2", "--progress-interval", "60",
+                          *extra])
+
+
+def test_resume_redoes_rows_written_after_the_checkpoint(stub_llm, tmp_path):
+    input_path, output_path = tmp_path / "rows.jsonl", tmp_path / "out.jsonl"
+    checkpoint_path = tmp_path / "out.jsonl.checkpoint"
+    write_rows(input_path, 3)
+    assert run(input_path, output_path) == 0
+    assert sorted(r["id"] for r in read_records(output_path)) == ["row0", "row1", "row2"]
+
+    # Crash after row 2's result was written but before the checkpoint recorded
+    # it, part-way through writing one more line
+    lines = output_path.read_bytes().splitlines(keepends=True)
+    kept = [line for line in lines if json.loads(line)["index"] != 2]
+    redone = [line for line in lines if line not in kept]
+    output_path.write_bytes(b"".join(kept + redone) + b'{"index": 2, "trunc')
+    state = json.loads(checkpoint_path.read_text())
+    state.update(watermark=2, done=[], output_bytes=sum(len(line) for line in kept), succeeded=2)
+    checkpoint_path.write_text(json.dumps(state))
+
+    assert run(input_path, output_path) == 0
+    records = read_records(output_path)
+    assert sorted(r["index"] for r in records) == [0, 1, 2]
+    assert all(r["status"] == "completed" for r in records)
+    assert json.loads(checkpoint_path.read_text())["watermark"] == 3
+
+
+def test_resume_refuses_an_output_shorter_than_the_checkpoint(stub_llm, tmp_path):
+    input_path, output_path = tmp_path / "rows.jsonl", tmp_path / "out.jsonl"
+    write_rows(input_path, 1)
+    assert run(input_path, output_path) == 0
+    output_path.write_text("")
+    with pytest.raises(SystemExit):
+        run(input_path, output_path)
+    # --restart starts over instead
+    assert run(input_path, output_path, "--restart") == 0
+    assert len(read_records(output_path)) == 1
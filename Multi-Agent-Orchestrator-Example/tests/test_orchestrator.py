@@ -0,0 +1,54 @@
+import asyncio
+
+from metrics import AGENT_RETRIES
+from models import TaskStatus
+from orchestrator import MultiAgentOrchestrator
+from policy import TaskPolicy
+
+
+class FlakyAgent:
+    """Fails the first call for each name in `flaky` with a retryable error"""
+
+    model = "stub-model"
+    preamble = ""
+
+    def __init__(self, flaky=()):
+        self.flaky = set(flaky)
+        self.calls = 0
+
+    async def report(self, player_name: str) -> str:
+        self.calls += 1
+        if player_name in self.flaky:
+            self.flaky.discard(player_name)
+            raise ConnectionError(f"dropped {player_name}")
+        return f"report for {player_name}"
+
+
+def run_map_task(orchestrator, agent_type, method, players, policy=None):
+    workflow_id = orchestrator.create_workflow("map")
+    task_id = orchestrator.add_task_to_workflow(workflow_id, agent_type, method, {"player_name": players},
+                                                map_over="player_name", policy=policy)
+    asyncio.run(orchestrator.execute_workflow(workflow_id))
+    return next(task for task in orchestrator.workflows[workflow_id].tasks if task.id == task_id)
+
+
+def test_map_node_without_retries_reports_one_attempt(stub_llm):
+    orchestrator = MultiAgentOrchestrator()
+    retries = AGENT_RETRIES.value("player", "report_performance")
+    task = run_map_task(orchestrator, "player", "report_performance", ["A", "B", "C"])
+    assert task.status == TaskStatus.COMPLETED
+    assert task.attempts == 1
+    assert AGENT_RETRIES.value("player", "report_performance") == retries
+
+
+def test_map_node_counts_retries_per_call():
+    orchestrator = MultiAgentOrchestrator()
+    orchestrator.agents["flaky"] = agent = FlakyAgent(flaky={"B", "D"})
+    retries = AGENT_RETRIES.value("flaky", "report")
+    task = run_map_task(orchestrator, "flaky", "report", ["A", "B", "C", "D"],
+                        TaskPolicy(max_retries=2, backoff=0.001))
+    assert task.status == TaskStatus.COMPLETED
+    assert agent.calls == 6
+    # Most attempts any single call took, and one retry for each flaky name
+    assert task.attempts == 2
+    assert AGENT_RETRIES.value("flaky", "report") == retries + 2
@@ -0,0 +1,49 @@
+import pytest
+
+from ratelimit import RateLimiter, parse_duration
+
+
+def test_parse_duration():
+    assert parse_duration("7") == 7.0
+    assert parse_duration("1m2.5s") == pytest.approx(62.5)
+    assert parse_duration("150ms") == pytest.approx(0.15)
+    assert parse_duration("soon") is None
+
+
+def test_429_blocks_for_retry_after():
+    limiter = RateLimiter(requests_per_minute=100)
+    limiter.update_from_headers({"Retry-After": "2"}, 429)
+    assert limiter.throttled == 1
+    assert limiter.try_acquire() == pytest.approx(2.0, abs=0.1)
+    assert limiter.acquired == 0
+
+
+def test_429_without_retry_after_blocks_for_a_second():
+    limiter = RateLimiter(requests_per_minute=100)
+    limiter.update_from_headers({}, 429)
+    assert limiter.try_acquire() == pytest.approx(1.0, abs=0.1)
+
+
+def test_remaining_lowers_bucket_but_never_raises_it():
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=10000)
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "5",
+                                 "x-ratelimit-remaining-tokens": "50000"}, 200)
+    assert limiter.requests.level == pytest.approx(5, abs=0.1)
+    assert limiter.tokens.level == pytest.approx(10000, abs=1)
+    assert limiter.throttled == 0
+
+
+def test_exhausted_bucket_blocks_until_reset():
+    limiter = RateLimiter(requests_per_minute=100)
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "0",
+                                 "x-ratelimit-reset-requests": "1m2.5s"}, 200)
+    assert limiter.try_acquire() == pytest.approx(62.5, abs=0.1)
+
+
+def test_headers_apply_without_local_buckets():
+    # The provider's limits still hold back callers when none are configured here
+    limiter = RateLimiter()
+    assert limiter.try_acquire() == 0.0
+    limiter.update_from_headers({"X-RateLimit-Remaining-Tokens": "0",
+                                 "X-RateLimit-Reset-Tokens": "150ms"}, 200)
+    assert limiter.try_acquire() == pytest.approx(0.15, abs=0.05)
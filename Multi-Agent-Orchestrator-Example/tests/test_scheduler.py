@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from admission import DeadlineExceededError, use_deadline
+from ratelimit import RateLimiter
+from scheduler import FairScheduler, Priority, use_call_class
+
+
+async def queue_behind_busy_slot(scheduler, calls, hold=0.0):
+    """Take the only slot, queue `calls` (name, priority, tenant) in order, then free it.
+
+    Returns the names in the order the calls were started.
+    """
+    started = []
+    blocker = await scheduler.acquire()
+
+    async def call(name, priority, tenant):
+        with use_call_class(priority, tenant):
+            acquired = await scheduler.acquire()
+        started.append(name)
+        await asyncio.sleep(hold)
+        scheduler.release(acquired)
+
+    tasks = []
+    for name, priority, tenant in calls:
+        tasks.append(asyncio.ensure_future(call(name, priority, tenant)))
+        await asyncio.sleep(0)
+    scheduler.release(blocker)
+    await asyncio.gather(*tasks)
+    return started
+
+
+def test_classes_start_in_priority_order():
+    scheduler = FairScheduler(slots=1, reserved_interactive=0, weights={})
+    started = asyncio.run(queue_behind_busy_slot(scheduler, [
+        ("bulk", Priority.BULK, "t"),
+        ("workflow", Priority.WORKFLOW, "t"),
+        ("interactive", Priority.INTERACTIVE, "t"),
+    ]))
+    assert started == ["interactive", "workflow", "bulk"]
+
+
+def test_tenants_share_a_class_fairly():
+    scheduler = FairScheduler(slots=1, reserved_interactive=0, weights={})
+    calls = [(f"a{i}", Priority.BULK, "a") for i in range(6)] + [(f"b{i}", Priority.BULK, "b") for i in range(2)]
+    started = asyncio.run(queue_behind_busy_slot(scheduler, calls))
+    # b queued last but is not stuck behind a's whole backlog
+    assert started[:4] == ["a0", "b0", "a1", "b1"]
+
+
+def test_tenant_weights():
+    scheduler = FairScheduler(slots=1, reserved_interactive=0, weights={"a": 2})
+    calls = [(f"a{i}", Priority.BULK, "a") for i in range(4)] + [(f"b{i}", Priority.BULK, "b") for i in range(2)]
+    started = asyncio.run(queue_behind_busy_slot(scheduler, calls))
+    assert started[:3] == ["a0", "a1", "b0"]
+
+
+def test_reserved_slots_are_interactive_only():
+    async def run():
+        scheduler = FairScheduler(slots=2, reserved_interactive=1, weights={})
+        bulk = await scheduler.acquire()
+        with use_call_class(Priority.BULK, "t"):
+            second = asyncio.ensure_future(scheduler.acquire())
+        with use_call_class(Priority.INTERACTIVE, "t"):
+            interactive = await asyncio.wait_for(scheduler.acquire(), 1)
+        await asyncio.sleep(0)
+        assert not second.done()
+        scheduler.release(interactive)
+        scheduler.release(bulk)
+        scheduler.release(await second)
+        assert scheduler.running == 0
+
+    asyncio.run(run())
+
+
+def test_rate_budget_goes_to_higher_priority_first():
+    async def run():
+        limiter = RateLimiter(requests_per_minute=2, period=0.2)
+        scheduler = FairScheduler(slots=4, reserved_interactive=0, weights={}, limiter=limiter)
+        started = []
+
+        async def call(name, priority):
+            with use_call_class(priority, name):
+                acquired = await scheduler.acquire()
+            started.append(name)
+            scheduler.release(acquired)
+
+        bulk = [asyncio.ensure_future(call(f"bulk{i}", Priority.BULK)) for i in range(4)]
+        await asyncio.sleep(0.02)
+        interactive = asyncio.ensure_future(call("chat", Priority.INTERACTIVE))
+        await asyncio.gather(interactive, *bulk)
+        return started, limiter
+
+    started, limiter = asyncio.run(run())
+    # Two calls fit the initial budget; the chat call takes the first refill
+    assert started[:3] == ["bulk0", "bulk1", "chat"]
+    assert limiter.acquired == 5
+
+
+def test_deadline_while_queued_does_not_leak_the_slot():
+    async def run():
+        scheduler = FairScheduler(slots=1, reserved_interactive=0, weights={})
+        blocker = await scheduler.acquire()
+        with use_deadline(0.05), pytest.raises(DeadlineExceededError):
+            await scheduler.acquire()
+        scheduler.release(blocker)
+        scheduler.release(await asyncio.wait_for(scheduler.acquire(), 1))
+        assert scheduler.running == 0
+        assert scheduler.stats()["classes"]["workflow"]["queued"] == 0
+
+    asyncio.run(run())
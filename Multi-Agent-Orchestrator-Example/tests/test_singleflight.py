@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from admission import DeadlineExceededError, use_deadline
+from singleflight import SingleFlight
+
+
+class SlowCall:
+    """Call that finishes once released, recording whether it was cancelled"""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = False
+        self.release = None
+
+    async def __call__(self):
+        self.started += 1
+        self.release = asyncio.Event()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return "result"
+
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flight, fn = SingleFlight(), SlowCall()
+        callers = [asyncio.ensure_future(flight.do("key", fn)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        fn.release.set()
+        return flight, fn, await asyncio.gather(*callers)
+
+    flight, fn, results = asyncio.run(run())
+    assert results == ["result"] * 3
+    assert fn.started == 1
+    assert flight.stats() == {"calls": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_one_caller_cancelling_keeps_the_call_for_the_rest():
+    async def run():
+        flight, fn = SingleFlight(), SlowCall()
+        first = asyncio.ensure_future(flight.do("key", fn))
+        second = asyncio.ensure_future(flight.do("key", fn))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        fn.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return fn, await second
+
+    fn, result = asyncio.run(run())
+    assert result == "result"
+    assert not fn.cancelled
+
+
+def test_last_caller_cancelling_cancels_the_call():
+    async def run():
+        flight, fn = SingleFlight(), SlowCall()
+        callers = [asyncio.ensure_future(flight.do("key", fn)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return flight, fn
+
+    flight, fn = asyncio.run(run())
+    assert fn.cancelled
+    assert flight.in_flight == 0
+
+
+def test_short_deadline_fails_only_its_own_caller():
+    async def run():
+        flight, fn = SingleFlight(), SlowCall()
+
+        async def impatient():
+            with use_deadline(0.02):
+                return await flight.do("key", fn)
+
+        patient = asyncio.ensure_future(flight.do("key", fn))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceededError):
+            await impatient()
+        fn.release.set()
+        return fn, await patient
+
+    fn, result = asyncio.run(run())
+    assert result == "result"
+    assert not fn.cancelled